@@ -2,9 +2,45 @@ from .. import Scaffold, logger
 
 Scaffold.init().load_db().load_rows().connect()
 
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+from pocketutils.core.exceptions import AlreadyUsedError
+
 from sauronlab.core.valar_singleton import *
 from sauronlab.core.tools import Tools
 from sauronlab.core.valar_tools import ValarTools
+from sauronlab.model.feature_writes import WellFeatureWriter
+from sauronlab.model.features import DerivedFeatures, FeatureTypes
+from sauronlab.model.wf_builders import WellFrameBuilder
+from sauronlab.model.wf_tools import WellFrameColumns, WellFrameMetaResolver
+
+
+class QueryCounter(logging.Handler):
+    """
+    Counts the SQL queries that peewee logs while in the context.
+    """
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.n = 0
+        self._peewee = logging.getLogger("peewee")
+        self._old_level = self._peewee.level
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.n += 1
+
+    def __enter__(self):
+        self._peewee.addHandler(self)
+        self._peewee.setLevel(logging.DEBUG)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._peewee.removeHandler(self)
+        self._peewee.setLevel(self._old_level)
 
 
 class TestMicro:
@@ -49,3 +85,136 @@ class TestMicro:
         assert {m.name for m in matches} == {"pos", "gen-", "gen+"}
         matches = ValarTools.controls_matching_any("pos", genetics_related=True)
         assert {m.name for m in matches} == {"pos", "gen-", "gen+"}
+
+
+class TestWellFrameMetaResolver:
+    def test_query_count(self):
+        wells = list(Wells.select().where(Wells.run_id == 1).order_by(Wells.well_index))
+        well_to_treatments = {
+            w: list(WellTreatments.select().where(WellTreatments.well_id == w.id)) for w in wells
+        }
+        resolver = WellFrameMetaResolver(dict(WellFrameColumns.required_fns))
+        with QueryCounter() as counter:
+            columns = resolver.resolve(well_to_treatments)
+        # runs, control types, variants, and batches -- independent of the number of wells
+        assert counter.n <= 4
+        assert columns["well_index"] == [1, 2, 3, 4, 5, 6]
+        assert columns["run"] == [1] * 6
+        assert columns["battery_id"] == [1] * 6
+        assert columns["person_plated"] == ["johnson"] * 6
+        assert columns["row"] == [1, 1, 1, 2, 2, 2]
+        assert columns["column"] == [1, 2, 3, 1, 2, 3]
+        assert [len(t.treatments) for t in columns["treatments"]] == [1, 2, 0, 0, 0, 0]
+
+
+class TestWellFrameBuilder:
+    def test_page(self):
+        first = WellFrameBuilder.runs(1).page(None, 4).build()
+        assert first["well_index"].tolist() == [1, 2, 3, 4]
+        fourth = Wells.select().where(Wells.run_id == 1).where(Wells.well_index == 4).first()
+        cursor = WellFrameBuilder.cursor_of(first)
+        assert cursor == (1, fourth.id)
+        second = WellFrameBuilder.runs(1).page(cursor, 4).build()
+        assert second["well_index"].tolist() == [5, 6]
+
+    def test_page_across_runs(self):
+        # the first page doesn't reach run 2, which is still required by runs()
+        first = WellFrameBuilder.runs([1, 2]).page(None, 4).build()
+        assert first["run"].tolist() == [1, 1, 1, 1]
+        assert first["well_index"].tolist() == [1, 2, 3, 4]
+        second = WellFrameBuilder.runs([1, 2]).page(WellFrameBuilder.cursor_of(first), 4).build()
+        assert list(zip(second["run"], second["well_index"])) == [(1, 5), (1, 6), (2, 1), (2, 2)]
+
+
+class TestWellFeatureWriter:
+    def test_write_run(self):
+        Scaffold.connect(write=True)
+        rand = np.random.RandomState(0)
+        arrays = {i: rand.random_sample(50).astype(np.float32) for i in range(1, 7)}
+        wells = {w.well_index: w.id for w in Wells.select().where(Wells.run_id == 1)}
+        try:
+            with QueryCounter() as counter:
+                n = WellFeatureWriter(FeatureTypes.cd_10).write_run(1, arrays)
+            assert n == 6
+            # the run, its wells, the existing-row check, and one insert (plus the transaction)
+            assert counter.n <= 6
+            for i, arr in arrays.items():
+                wf = WellFeatures.select().where(WellFeatures.well_id == wells[i]).first()
+                assert wf.type_id == FeatureTypes.cd_10.valar_feature.id
+                assert np.array_equal(Tools.blob_to_signed_floats(wf.floats), arr)
+                assert bytes(wf.sha1)[:20] == hashlib.sha1(wf.floats).digest()
+            with pytest.raises(AlreadyUsedError):
+                WellFeatureWriter(FeatureTypes.cd_10).write_run(1, {1: arrays[1]})
+            replaced = {1: np.zeros(50, dtype=np.float32)}
+            assert WellFeatureWriter(FeatureTypes.cd_10, replace=True).write_run(1, replaced) == 1
+            rows = list(WellFeatures.select().where(WellFeatures.well_id == wells[1]))
+            assert len(rows) == 1
+            assert np.array_equal(Tools.blob_to_signed_floats(rows[0].floats), replaced[1])
+        finally:
+            WellFeatures.delete().where(WellFeatures.well_id << list(wells.values())).execute()
+
+    def test_batches_in_one_transaction(self):
+        Scaffold.connect(write=True)
+        arrays = {i: np.full(50, i, dtype=np.float32) for i in range(1, 7)}
+        wells = {w.well_index: w.id for w in Wells.select().where(Wells.run_id == 1)}
+        # each batch holds one well, and the last row fails the foreign key
+        writer = WellFeatureWriter(FeatureTypes.cd_10, max_batch_bytes=1)
+        try:
+            with pytest.raises(Exception):
+                writer.write({**{wells[i]: arr for i, arr in arrays.items()}, 999999: arrays[1]})
+            assert (
+                WellFeatures.select().where(WellFeatures.well_id << list(wells.values())).count()
+                == 0
+            )
+        finally:
+            WellFeatures.delete().where(WellFeatures.well_id << list(wells.values())).execute()
+
+
+class TestDerivedFeatures:
+    def test_names(self):
+        feature = DerivedFeatures.of("threshold_zeros", FeatureTypes.cd_10, lower=0.5)
+        assert feature.internal_name == "threshold_zeros(lower=0.5)[cd(10)]v1"
+        assert FeatureTypes.of(feature.internal_name) == feature
+        nested = DerivedFeatures.of("smooth", feature, window_size=3, window_type=None)
+        assert FeatureTypes.of(nested.internal_name) == nested
+        assert nested.base == feature
+        assert nested != DerivedFeatures.of("smooth", feature)
+
+    def test_build(self):
+        Scaffold.connect(write=True)
+        rand = np.random.RandomState(0)
+        arrays = {i: rand.random_sample(50).astype(np.float32) for i in range(1, 7)}
+        wells = [w.id for w in Wells.select().where(Wells.run_id == 1)]
+        feature = DerivedFeatures.of("threshold_zeros", FeatureTypes.cd_10, lower=0.5)
+        try:
+            WellFeatureWriter(FeatureTypes.cd_10).write_run(1, arrays)
+            df = WellFrameBuilder.runs(1).with_feature(feature).build()
+            for i, values in zip(df["well_index"], df.values):
+                expected = arrays[i].copy()
+                expected[0] = 0
+                expected[expected < 0.5] = 0
+                assert np.array_equal(values, expected)
+        finally:
+            WellFeatures.delete().where(WellFeatures.well_id << wells).execute()
+
+    def test_build_nested(self):
+        Scaffold.connect(write=True)
+        rand = np.random.RandomState(1)
+        arrays = {i: rand.random_sample(50).astype(np.float32) for i in range(1, 7)}
+        wells = {w.well_index: w.id for w in Wells.select().where(Wells.run_id == 1)}
+        inner = DerivedFeatures.of("threshold_zeros", FeatureTypes.cd_10, lower=0.5)
+        feature = DerivedFeatures.of("smooth", inner, window_size=3, window_type=None)
+        try:
+            WellFeatureWriter(FeatureTypes.cd_10).write_run(1, arrays)
+            df = WellFrameBuilder.runs(1).with_feature(feature).build()
+            for i, values in zip(df["well_index"], df.values):
+                thresholded = arrays[i].copy()
+                thresholded[0] = 0
+                thresholded[thresholded < 0.5] = 0
+                expected = pd.Series(thresholded).rolling(3, min_periods=1).mean().values
+                assert np.allclose(values, expected)
+                # the single-well path agrees with the per-run path
+                wf = WellFeatures.select().where(WellFeatures.well_id == wells[i]).first()
+                assert np.allclose(feature.calc(wf, None, None, wells[i]), expected)
+        finally:
+            WellFeatures.delete().where(WellFeatures.well_id << list(wells.values())).execute()
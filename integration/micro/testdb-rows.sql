@@ -270,6 +270,17 @@ INSERT INTO wells(
 ) VALUES (
     1, 6, NULL, 1, 'a well group', 10, 7
 );
+-- wells in a second run, for paging across runs
+INSERT INTO wells(
+    run_id, well_index, control_type_id, variant_id, well_group, n, age
+) VALUES (
+    2, 1, 1, 1, NULL, 10, 7
+);
+INSERT INTO wells(
+    run_id, well_index, control_type_id, variant_id, well_group, n, age
+) VALUES (
+    2, 2, NULL, 1, NULL, 10, 7
+);
 
 INSERT INTO well_treatments(well_id, batch_id, micromolar_dose) VALUES (1, 1, 50.0);
 INSERT INTO well_treatments(well_id, batch_id, micromolar_dose) VALUES (2, 1, 50.0);
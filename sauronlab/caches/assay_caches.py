@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from sauronlab.caches.cache_codecs import CacheCodec, CacheCodecs
 from sauronlab.core.core_imports import *
 from sauronlab.model.cache_interfaces import AAssayCache
 from sauronlab.model.assay_frames import AssayFrame
@@ -14,12 +15,16 @@ class AssayFrameCache(AAssayCache):
     A cache for AssayFrameCaches.
     """
 
-    def __init__(self, cache_dir: PathLike = None):
+    def __init__(self, cache_dir: PathLike = None, codec: Union[None, str, CacheCodec] = None):
         """
 
         Args:
             cache_dir:
+            codec: The compression for new files; defaults to ``cache_codec.assays`` in the config, or lz4
         """
+        self.codec = (
+            CacheCodecs.for_cache("assays", "lz4") if codec is None else CacheCodec.of(codec)
+        )
         if cache_dir is None:
             cache_dir = DEFAULT_CACHE_DIR
         self._cache_dir = Tools.prepped_dir(cache_dir)
@@ -56,7 +61,8 @@ class AssayFrameCache(AAssayCache):
 
         """
         path = Path(path).relative_to(self.cache_dir)
-        return int(re.compile(r"^([0-9]+)\.csv$").fullmatch(path.name).group(1))
+        match = re.compile(r"^([0-9]+)\.feather$").fullmatch(path.name)
+        return None if match is None else int(match.group(1))
 
     @abcd.overrides
     def load(self, battery: BatteryLike) -> AssayFrame:
@@ -71,6 +77,7 @@ class AssayFrameCache(AAssayCache):
         """
         battery = Batteries.fetch(battery)
         self.download(battery)
+        self.manifest.touch(self.path_of(battery.id))
         return AssayFrame.read_feather(self.path_of(battery.id))
 
     @abcd.overrides
@@ -84,11 +91,19 @@ class AssayFrameCache(AAssayCache):
         """
         for battery in batteries:
             battery = Batteries.fetch(battery)
-            if battery not in self:
+            if battery.id in self:
+                continue
+            with self.lock(battery.id):
+                # another thread or process may have saved it while we waited
+                if battery.id in self:
+                    continue
                 logger.minor(f"Downloading AssayFrame for battery {battery.id}")
                 afs = AssayFrame.of(battery)
-                # noinspection PyTypeChecker
-                afs.reset_index().to_feather(self.path_of(battery.id))
+                path = self.path_of(battery.id)
+                with self._atomic(path) as tmp:
+                    # noinspection PyTypeChecker
+                    afs.reset_index().to_feather(str(tmp), **self.codec.feather_args())
+                self.manifest.add(path, n_rows=len(afs), n_columns=len(afs.columns))
 
     def __repr__(self):
         return f"{type(self).__name__}('{self.cache_dir}')"
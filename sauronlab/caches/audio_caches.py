@@ -46,7 +46,7 @@ class AudioStimulusCache(AnAudioStimulusCache):
         Returns:
 
         """
-        pass
+        return Path(path).stem
 
     @abcd.overrides
     def load(self, stimulus: StimulusLike) -> Path:
@@ -61,6 +61,7 @@ class AudioStimulusCache(AnAudioStimulusCache):
         """
         stimulus = Stimuli.fetch(stimulus)
         self.download(stimulus)
+        self.manifest.touch(self.path_of(stimulus))
         return self.path_of(stimulus)
 
     @abcd.overrides
@@ -74,24 +75,30 @@ class AudioStimulusCache(AnAudioStimulusCache):
         """
         for stimulus in keys:
             stimulus = Stimuli.fetch(stimulus)
-            tmpfile = self.path_of(stimulus)
-            logger.minor(f"Downloading audio for stimulus {stimulus}")
-            if tmpfile.exists():
-                return
+            if stimulus in self:
+                continue
             if stimulus.audio_file_id is None:
                 raise ValarLookupError(f"No audio file for {stimulus.name}")
-            audio_file = AudioFiles.fetch(stimulus.audio_file_id)
-            if audio_file.data is None:
-                raise DataIntegrityError(f"Audio file for stimulus {stimulus.name} has no data")
-            fmt_str = Path(audio_file.filename).suffix.lstrip(".")
-            try:
-                # TODO constant framerate
-                song = pydub.AudioSegment(
-                    data=audio_file.data, sample_width=2, frame_rate=44100, channels=1
-                )
-            except Exception:
-                raise DataIntegrityError(f"Audio file for stimulus {stimulus.name} is invalid")
-            song.export(tmpfile, format=fmt_str)
+            with self.lock(stimulus):
+                # another thread or process may have saved it while we waited
+                if stimulus in self:
+                    continue
+                logger.minor(f"Downloading audio for stimulus {stimulus}")
+                audio_file = AudioFiles.fetch(stimulus.audio_file_id)
+                if audio_file.data is None:
+                    raise DataIntegrityError(f"Audio file for stimulus {stimulus.name} has no data")
+                fmt_str = Path(audio_file.filename).suffix.lstrip(".")
+                try:
+                    # TODO constant framerate
+                    song = pydub.AudioSegment(
+                        data=audio_file.data, sample_width=2, frame_rate=44100, channels=1
+                    )
+                except Exception:
+                    raise DataIntegrityError(f"Audio file for stimulus {stimulus.name} is invalid")
+                path = self.path_of(stimulus)
+                with self._atomic(path) as tmp:
+                    song.export(str(tmp), format=fmt_str)
+                self.manifest.add(path)
 
     @abcd.overrides
     def load_pydub(self, stimulus: StimulusLike) -> pydub.AudioSegment:
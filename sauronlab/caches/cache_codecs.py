@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import tempfile
+
+from sauronlab.core.core_imports import *
+
+
+@dataclass(frozen=True)
+class CacheCodec:
+    """
+    The compression that a cache writes files with.
+    Written as ``<compression>`` or ``<compression>:<level>``, such as ``lz4``, ``zstd:3``, or ``uncompressed``.
+    Set per cache in the config as ``cache_codec.<name>``, where ``<name>`` is the cache's default directory
+    (``wells``, ``well-parquet``, ``batteries``, or ``assays``).
+    Use ``CacheCodecs.benchmark`` (or ``sauronlab bench-codecs``) to choose one for a disk.
+
+    Attributes:
+        compression: ``uncompressed``, ``lz4``, or ``zstd``
+        level: The compression level, or None for the library default
+    """
+
+    compression: str
+    level: Optional[int] = None
+
+    @classmethod
+    def of(cls, spec: Union[str, CacheCodec]) -> CacheCodec:
+        """
+        Parses a codec like ``zstd:3``.
+
+        Raises:
+            XValueError: If the compression is unknown or the level isn't an integer
+        """
+        if isinstance(spec, CacheCodec):
+            return spec
+        compression, _, level = spec.strip().lower().partition(":")
+        if compression not in {"uncompressed", "lz4", "zstd"}:
+            raise XValueError(f"Unknown cache codec {spec}; use uncompressed, lz4, or zstd")
+        if compression == "uncompressed" and level != "":
+            raise XValueError(f"Uncompressed codec {spec} can't have a level")
+        try:
+            return CacheCodec(compression, None if level == "" else int(level))
+        except ValueError:
+            raise XValueError(f"Level of cache codec {spec} is not an integer") from None
+
+    def feather_args(self) -> Mapping[str, Any]:
+        """The keyword arguments for ``to_feather`` (or ``pyarrow.feather.write_feather``)."""
+        if self.level is None:
+            return dict(compression=self.compression)
+        return dict(compression=self.compression, compression_level=self.level)
+
+    def parquet_args(self) -> Mapping[str, Any]:
+        """The keyword arguments for ``pyarrow.parquet.write_table``."""
+        compression = "none" if self.compression == "uncompressed" else self.compression
+        if self.level is None:
+            return dict(compression=compression)
+        return dict(compression=compression, compression_level=self.level)
+
+    def __str__(self):
+        return self.compression if self.level is None else f"{self.compression}:{self.level}"
+
+
+class CacheCodecs:
+    """
+    Looks up the codecs configured for caches, and measures codecs on a disk.
+    """
+
+    DEFAULT_BENCHMARK_CODECS = ["uncompressed", "lz4", "zstd:1", "zstd:3", "zstd:9"]
+
+    @classmethod
+    def for_cache(cls, name: str, fallback: str) -> CacheCodec:
+        """
+        Returns the codec set as ``cache_codec.<name>`` in the config, or ``fallback``.
+
+        Args:
+            name: The cache's default directory name, such as ``wells``
+            fallback: The codec to use if none is set
+        """
+        return CacheCodec.of(sauronlab_env.cache_codecs.get(name, fallback))
+
+    @classmethod
+    def benchmark(
+        cls,
+        codecs: Optional[Sequence[Union[str, CacheCodec]]] = None,
+        directory: Optional[PathLike] = None,
+        n_wells: int = 96,
+        n_frames: int = 100000,
+        n_repeats: int = 1,
+        seed: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Writes and reads a synthetic run as Feather with each codec, as ``WellCache`` does.
+        The features are float32 and about half zeros, roughly like motion features,
+        so the compression ratios are indicative but not exact.
+        Run it on the disk the cache will live on, since that decides the trade-off.
+        The file has one column per frame, like the files ``WellCache`` writes,
+        so it's dominated by per-column overhead and takes about a minute per codec at the default size.
+
+        Args:
+            codecs: The codecs to try; defaults to ``DEFAULT_BENCHMARK_CODECS``
+            directory: Where to write the temporary files; defaults to ``sauronlab_env.cache_dir``
+            n_wells: The number of wells (rows)
+            n_frames: The number of features (columns)
+            n_repeats: Time each codec this many times and keep the fastest
+            seed: The random seed for the synthetic features
+
+        Returns:
+            A DataFrame with columns ``codec``, ``n_bytes``, ``ratio`` (uncompressed size / file size),
+            ``write_mb_per_s``, and ``read_mb_per_s``, where the speeds are in uncompressed megabytes per second
+        """
+        codecs = [
+            CacheCodec.of(c) for c in (cls.DEFAULT_BENCHMARK_CODECS if codecs is None else codecs)
+        ]
+        if n_repeats < 1:
+            raise OutOfRangeError(f"n_repeats {n_repeats} is < 1")
+        df = cls._synthetic(n_wells, n_frames, seed)
+        raw_bytes = n_wells * n_frames * 4
+        directory = sauronlab_env.cache_dir if directory is None else Path(directory)
+        rows = []
+        with tempfile.TemporaryDirectory(prefix=".codec-benchmark-", dir=str(directory)) as tmp:
+            for codec in codecs:
+                path = Path(tmp) / f"{codec.compression}-{codec.level}.feather"
+                write_s, read_s = np.inf, np.inf
+                for _ in range(n_repeats):
+                    t0 = time.perf_counter()
+                    df.to_feather(str(path), version=2, **codec.feather_args())
+                    write_s = min(write_s, time.perf_counter() - t0)
+                    t0 = time.perf_counter()
+                    pd.read_feather(str(path))
+                    read_s = min(read_s, time.perf_counter() - t0)
+                n_bytes = path.stat().st_size
+                rows.append(
+                    pd.Series(
+                        dict(
+                            codec=str(codec),
+                            n_bytes=n_bytes,
+                            ratio=raw_bytes / n_bytes,
+                            write_mb_per_s=raw_bytes / 1e6 / write_s,
+                            read_mb_per_s=raw_bytes / 1e6 / read_s,
+                        )
+                    )
+                )
+                logger.info(
+                    f"{codec}: ratio {raw_bytes / n_bytes:.2f},"
+                    f" write {raw_bytes / 1e6 / write_s:.0f} MB/s, read {raw_bytes / 1e6 / read_s:.0f} MB/s"
+                )
+        return pd.DataFrame(rows)
+
+    @classmethod
+    def _synthetic(cls, n_wells: int, n_frames: int, seed: int) -> pd.DataFrame:
+        rand = np.random.RandomState(seed)
+        features = rand.exponential(20.0, size=(n_wells, n_frames)).astype(np.float32)
+        features[rand.random_sample((n_wells, n_frames)) < 0.5] = 0
+        df = pd.DataFrame(features, columns=[str(i) for i in range(n_frames)])
+        df.insert(0, "well", np.arange(n_wells))
+        return df
+
+
+__all__ = ["CacheCodec", "CacheCodecs"]
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import threading
+
+from sauronlab.core.core_imports import *
+from sauronlab.model.cache_locks import CacheLock
+from sauronlab.model.cache_manifests import CacheManifest
+
+
+class EvictionPolicy(SmartEnum):
+    """
+    How ``CacheEvictor`` picks what to delete first.
+
+    - LRU: The items loaded least recently
+    - LFU: The items loaded the fewest times, then the items loaded least recently
+    """
+
+    LRU = enum.auto()
+    LFU = enum.auto()
+
+
+@dataclass(frozen=True)
+class EvictionResult:
+    """
+    What ``CacheEvictor.evict`` deleted (or would have deleted).
+
+    Attributes:
+        n_items: The number of items (runs, batteries, etc.)
+        n_files: The number of files
+        n_bytes: The total size of the files
+    """
+
+    n_items: int
+    n_files: int
+    n_bytes: int
+
+    def __add__(self, other: EvictionResult) -> EvictionResult:
+        return EvictionResult(
+            self.n_items + other.n_items,
+            self.n_files + other.n_files,
+            self.n_bytes + other.n_bytes,
+        )
+
+
+@dataclass(frozen=True)
+class _Item:
+    manifest: CacheManifest
+    name: str
+    paths: Sequence[str]
+    n_bytes: int
+    accessed: datetime
+    hits: int
+
+
+class CacheEvictor:
+    """
+    Deletes cached files to keep the caches under a root directory within size budgets.
+    Finds every ``CacheManifest`` under the root and uses its sizes, access times, and hit counts,
+    so it never walks the cached files themselves.
+
+    The unit of eviction is an item: a file or directory directly under a cache directory,
+    such as ``wells/cd(10)/<run_id>.feather`` or ``sensors/<run_id>/``.
+    Items with any pinned path are never deleted (see ``ASauronlabCache.pin``),
+    and items that a download (or anything else) holds the ``CacheLock`` of are skipped.
+
+    Each cache has an optional budget, keyed by the name of its top-level directory
+    (ex ``wells`` covers every feature under ``<root>/wells``),
+    and all of the caches together have an optional global budget.
+    ``evict`` enforces each budget, then the global budget.
+    ``start`` calls it periodically in a background thread.
+
+    The defaults are read from ``sauronlab_env``.
+    """
+
+    def __init__(
+        self,
+        root: PathLike = sauronlab_env.cache_dir,
+        max_bytes: Optional[int] = sauronlab_env.cache_max_bytes,
+        budgets: Optional[Mapping[str, int]] = None,
+        policy: Union[str, EvictionPolicy] = sauronlab_env.cache_eviction_policy,
+    ):
+        """
+
+        Args:
+            root: The top-level cache directory
+            max_bytes: The maximum total size of all caches; None for unlimited
+            budgets: The maximum size of each cache, by top-level directory name;
+                     defaults to ``sauronlab_env.cache_budgets``
+            policy: An ``EvictionPolicy`` or its name
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.budgets = dict(sauronlab_env.cache_budgets if budgets is None else budgets)
+        self.policy = EvictionPolicy.of(policy)
+        self._lock = threading.Lock()
+        self._stop: Optional[threading.Event] = None
+
+    def manifests(self) -> Sequence[CacheManifest]:
+        """
+        Returns the manifest of every cache directory under the root.
+        Only looks up to 3 directories deep, and doesn't look inside cache directories.
+        """
+        found = []
+        if not self.root.is_dir():
+            return found
+        self._find(self.root, 0, found)
+        return [CacheManifest.of(d) for d in found]
+
+    def usage(self) -> Mapping[str, int]:
+        """
+        Returns the total size of the files in each cache, by top-level directory name.
+        """
+        usage = defaultdict(int)
+        for manifest in self.manifests():
+            usage[self._budget_name(manifest)] += manifest.n_bytes
+        return dict(usage)
+
+    def evict(self, dry_run: bool = False) -> EvictionResult:
+        """
+        Deletes items until every cache is within its budget and all are within the global budget.
+
+        Args:
+            dry_run: Only log and return what would be deleted
+
+        Returns:
+            What was deleted
+        """
+        with self._lock:
+            manifests = self.manifests()
+            result = EvictionResult(0, 0, 0)
+            for name, max_bytes in self.budgets.items():
+                within = [m for m in manifests if self._budget_name(m) == name]
+                result += self._evict(within, max_bytes, dry_run, name)
+            if self.max_bytes is not None:
+                result += self._evict(manifests, self.max_bytes, dry_run, "all caches")
+            return result
+
+    def start(self, interval_minutes: float) -> None:
+        """
+        Calls ``evict`` every ``interval_minutes`` in a daemon thread until ``stop`` is called.
+
+        Raises:
+            OutOfRangeError: If ``interval_minutes`` <= 0
+        """
+        if interval_minutes <= 0:
+            raise OutOfRangeError(f"Eviction interval {interval_minutes} min is <= 0")
+        self.stop()
+        self._stop = threading.Event()
+        thread = threading.Thread(
+            target=self._run, args=(self._stop, interval_minutes * 60), daemon=True
+        )
+        thread.start()
+        logger.info(f"Evicting from caches under {self.root} every {interval_minutes} min")
+
+    def stop(self) -> None:
+        """Stops the background thread, if it's running."""
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def _run(self, stop: threading.Event, interval_seconds: float) -> None:
+        while not stop.wait(interval_seconds):
+            try:
+                self.evict()
+            except Exception:
+                logger.exception(f"Failed to evict from caches under {self.root}")
+
+    def _evict(
+        self, manifests: Sequence[CacheManifest], max_bytes: int, dry_run: bool, label: str
+    ) -> EvictionResult:
+        items = [item for manifest in manifests for item in self._items(manifest)]
+        total = sum(m.n_bytes for m in manifests)
+        if total <= max_bytes:
+            return EvictionResult(0, 0, 0)
+        n_items, n_files, n_bytes = 0, 0, 0
+        for item in sorted(items, key=self._rank):
+            if total - n_bytes <= max_bytes:
+                break
+            if not dry_run and not self._delete(item):
+                continue
+            n_items += 1
+            n_files += len(item.paths)
+            n_bytes += item.n_bytes
+        verb = "Would evict" if dry_run else "Evicted"
+        logger.info(
+            f"{verb} {n_items} items ({n_bytes / 1024 ** 2:.1f} MiB) from {label}"
+            f" to fit in {max_bytes / 1024 ** 2:.1f} MiB"
+        )
+        if total - n_bytes > max_bytes:
+            logger.warning(
+                f"{label} still uses {(total - n_bytes) / 1024 ** 2:.1f} MiB"
+                f" > {max_bytes / 1024 ** 2:.1f} MiB; the rest is pinned or locked"
+            )
+        return EvictionResult(n_items, n_files, n_bytes)
+
+    def _items(self, manifest: CacheManifest) -> Sequence[_Item]:
+        pinned = {p.split("/", 1)[0] for p in manifest.pinned()}
+        grouped = defaultdict(list)
+        for entry in manifest.entries():
+            grouped[entry.path.split("/", 1)[0]].append(entry)
+        return [
+            _Item(
+                manifest,
+                name,
+                [e.path for e in entries],
+                sum(e.n_bytes for e in entries),
+                max(e.accessed for e in entries),
+                sum(e.hits for e in entries),
+            )
+            for name, entries in grouped.items()
+            if name not in pinned
+        ]
+
+    def _rank(self, item: _Item) -> Tup[Any, ...]:
+        if self.policy is EvictionPolicy.LFU:
+            return item.hits, item.accessed
+        return (item.accessed,)
+
+    def _delete(self, item: _Item) -> bool:
+        """
+        Deletes an item while holding the locks on its files, as ``ASauronlabCache.lock`` names them.
+        Returns False without deleting anything if any of them is held (ex by a download in progress).
+        """
+        held = []
+        try:
+            for path in item.paths:
+                lock = CacheLock.of(item.manifest.cache_dir, path.replace("/", "--"))
+                if not lock.acquire(blocking=False):
+                    logger.debug(
+                        f"Not evicting {item.manifest.cache_dir / item.name}: {path} is locked"
+                    )
+                    return False
+                held.append(lock)
+            logger.debug(f"Evicting {item.manifest.cache_dir / item.name}")
+            for path in item.paths:
+                full = item.manifest.cache_dir / path
+                if full.exists():
+                    full.unlink()
+                item.manifest.remove(path)
+        finally:
+            for lock in held:
+                lock.release()
+        directory = item.manifest.cache_dir / item.name
+        if directory.is_dir():
+            try:
+                directory.rmdir()
+            except OSError:
+                # it still has files that aren't in the manifest
+                pass
+        return True
+
+    def _budget_name(self, manifest: CacheManifest) -> str:
+        return manifest.cache_dir.absolute().relative_to(self.root.absolute()).parts[0]
+
+    def _find(self, directory: Path, depth: int, found: List[Path]) -> None:
+        if directory != self.root and (directory / ".manifest.sqlite").exists():
+            found.append(directory)
+            return
+        if depth >= 3:
+            return
+        for child in sorted(directory.iterdir()):
+            if child.is_dir() and not child.name.startswith("."):
+                self._find(child, depth + 1, found)
+
+
+cache_evictor = CacheEvictor()
+if sauronlab_env.cache_eviction_minutes > 0:
+    cache_evictor.start(sauronlab_env.cache_eviction_minutes)
+
+
+__all__ = ["EvictionPolicy", "EvictionResult", "CacheEvictor", "cache_evictor"]
@@ -121,18 +121,56 @@ class CachingWellFrameBuilder(WellFrameBuilder):
         Returns:
 
         """
-        query = WellFrameQuery().build(WellFrameQuery.no_fields())
-        for where in self._wheres:
-            query = query.where(where)
-        query = query.order_by(*WellFrameQuery.sort_order())
+        wells, run_ids = self._select_wells_and_runs()
+        logger.debug(f"Getting full cached WellFrame for {len(run_ids)} runs")
+        return self._load_wells(wells, run_ids)
+
+    def iter_chunks(self, n_runs: int) -> Iterator[WellFrame]:
+        """
+        Loads WellFrames for groups of runs from the cache, lazily.
+        See ``WellFrameBuilder.iter_chunks``.
+
+        Args:
+            n_runs: The maximum number of runs per WellFrame
+
+        Returns:
+            An iterator of sorted WellFrames, in order of run ID
+
+        """
+        if n_runs < 1:
+            raise OutOfRangeError(f"n_runs {n_runs} is < 1")
+        wells, run_ids = self._select_wells_and_runs()
+        run_ids = sorted(run_ids)
+        for i in range(0, len(run_ids), n_runs):
+            df = self._load_wells(wells, run_ids[i : i + n_runs])
+            if len(df) > 0:
+                yield df
+
+    def _select_wells_and_runs(self) -> Tup[Set[int], Set[int]]:
+        """
+        Finds the IDs of the matching wells and of their runs, in one query.
+        The caches only need the run IDs, so the runs themselves aren't fetched.
+        """
+        wheres = list(self._wheres)
+        if self._limit is not None:
+            wheres.append(Wells.id << self._select_page_well_ids())
         logger.debug(f"Running initial query in {self.__class__.__name__}")
-        query = list(query)
-        wells = {wt.well_id for wt in query}
-        runs = {wt.well.run for wt in query}
-        logger.debug(f"Getting full cached WellFrame for {len(runs)} runs")
-        df = self._cache.with_dtype(self._dtype).load_multiple(runs)
-        if not self._include_full_runs:
-            df = WellFrame.of(df[df["well"].isin(wells)])
+        pairs = list(WellFrameQueryPlanner(wheres).build())
+        wells = {w for w, r in pairs}
+        run_ids = {r for w, r in pairs}
+        return wells, run_ids
+
+    def _load_wells(self, wells: Set[int], run_ids: Collection[int]) -> WellFrame:
+        cache = self._cache.with_dtype(self._dtype)
+        # push the window and the wells down to the cache, which may skip reading the rest
+        frames = self._window_frames(set(run_ids)) if len(run_ids) > 0 else None
+        start, end = (None, None) if frames is None else frames
+        df = cache.load_multiple(
+            list(run_ids),
+            start=start,
+            end=end,
+            wells=None if self._include_full_runs else wells,
+        )
         if self._compound_namer is not None:
             df = df.with_new_compound_names(self._compound_namer)
         if self._namer is not None:
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import threading
+
+from sauronlab.calc.run_metadata import run_metadata
+from sauronlab.core.core_imports import *
+from sauronlab.model.cache_interfaces import AWellCache, ASensorCache
+from sauronlab.model.well_frames import *
+
+
+class _FrameStore:
+    """
+    The memory shared by a ``FrameFacade`` and its copies with other dtypes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.frames: OrderedDict[Tup[int, str], Tup[WellFrame, Tup[int, int], int]] = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.RLock()
+
+
+class FrameFacade(AWellCache):
+    """
+    An in-memory tier in front of any ``AWellCache``.
+    Holds the WellFrames of recently used runs, evicting the least-recently used runs
+    when their total size exceeds ``max_bytes``.
+    Each hit checks the modification time and size of the cached file (``path_of``),
+    and reloads the run if the file changed or is gone.
+
+    The frames held in memory are never handed out directly:
+        - ``load`` and ``load_multiple`` return copies, which callers can modify freely
+        - ``view`` returns a frame over the held, read-only feature array, without copying
+    """
+
+    def __init__(self, cache: AWellCache, max_bytes: Optional[int] = None):
+        """
+
+        Args:
+            cache: The cache to load from on misses
+            max_bytes: The maximum total size of the frames held; defaults to ``sauronlab_env.facade_max_bytes``
+        """
+        self._cache = cache
+        self._store = _FrameStore(
+            sauronlab_env.facade_max_bytes if max_bytes is None else max_bytes
+        )
+
+    @property
+    def cache(self) -> AWellCache:
+        """The underlying cache."""
+        return self._cache
+
+    @property
+    def feature(self) -> Optional[FeatureType]:
+        """The feature of the underlying cache."""
+        return self._cache.feature
+
+    @property
+    def cache_dir(self) -> Path:
+        """ """
+        return self._cache.cache_dir
+
+    @property
+    def max_bytes(self) -> int:
+        """The maximum total size of the frames held in memory."""
+        return self._store.max_bytes
+
+    @property
+    def memory_bytes(self) -> int:
+        """The total size of the frames currently held in memory."""
+        return self._store.n_bytes
+
+    @abcd.overrides
+    def path_of(self, run: RunLike) -> Path:
+        """
+
+
+        Args:
+            run: RunLike:
+
+        Returns:
+
+        """
+        return self._cache.path_of(run)
+
+    @abcd.overrides
+    def key_from_path(self, path: PathLike) -> RunLike:
+        """
+
+
+        Args:
+            path: PathLike:
+
+        Returns:
+
+        """
+        return self._cache.key_from_path(path)
+
+    @abcd.overrides
+    def contains(self, run: RunLike) -> bool:
+        """
+
+
+        Args:
+            run: RunLike:
+
+        Returns:
+
+        """
+        return self._cache.contains(run)
+
+    @abcd.overrides
+    def download(self, *runs: RunLike) -> None:
+        """
+
+
+        Args:
+            *runs: RunLike:
+
+        """
+        self._cache.download(*runs)
+
+    @abcd.overrides
+    def delete(self, run: RunLike) -> None:
+        """
+        Deletes a run from memory and from the underlying cache.
+
+        Args:
+            run: RunLike:
+
+        """
+        self.invalidate(run)
+        self._cache.delete(run)
+
+    @abcd.overrides
+    def with_dtype(self, dtype) -> FrameFacade:
+        """
+        Returns a copy over the underlying cache with dtype set, sharing the same memory.
+
+        Args:
+            dtype:
+
+        Returns:
+
+        """
+        facade = copy(self)
+        facade._cache = self._cache.with_dtype(dtype)
+        return facade
+
+    def with_sensor_cache(self, sensor_cache: Optional[ASensorCache] = None) -> FrameFacade:
+        """
+
+
+        Args:
+            sensor_cache:
+
+        Returns:
+
+        """
+        self._cache.with_sensor_cache(sensor_cache)
+        return self
+
+    @abcd.overrides
+    def load(
+        self, run: RunLike, start: Optional[int] = None, end: Optional[int] = None
+    ) -> WellFrame:
+        """
+        Returns a copy of the WellFrame for a run, loading it from the underlying cache if necessary.
+        Full runs are held in memory, so ``start`` and ``end`` only slice the copy.
+
+        Args:
+            run: RunLike:
+            start: The first feature column, inclusive; None for 0
+            end: The last feature column, exclusive; None for the end
+
+        Returns:
+
+        """
+        df = self._get(run_metadata.run_id(run))
+        if start is not None or end is not None:
+            df = df.subset(start, end)
+        return WellFrame(df.copy())
+
+    @abcd.overrides
+    def load_multiple(
+        self,
+        runs: RunsLike,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        wells: Optional[Collection[int]] = None,
+    ) -> WellFrame:
+        """
+        Full runs are held in memory, so ``wells``, ``start``, and ``end`` only select from them.
+
+        Args:
+            runs: RunsLike:
+            start: The first feature column, inclusive; None for 0
+            end: The last feature column, exclusive; None for the end
+            wells: Only return the wells with these IDs; None for all
+
+        Returns:
+
+        """
+        runs = run_metadata.run_ids(runs)
+        self.download(*[r for r in runs if self._key(r) not in self._store.frames])
+        dfs = [self._get(r) for r in runs]
+        if wells is not None:
+            dfs = [df[df["well"].isin(wells)] for df in dfs]
+        if start is not None or end is not None:
+            dfs = [df.subset(start, end) for df in dfs]
+        return WellFrame.concat(*dfs)
+
+    def view(self, run: RunLike) -> WellFrame:
+        """
+        Returns the WellFrame for a run without copying the features.
+        The features are read-only: writing into them (ex with ``iloc``) raises a ``ValueError``,
+        while replacing whole columns only changes the view. Use ``load`` to get a copy to modify.
+
+        Args:
+            run: RunLike:
+
+        Returns:
+
+        """
+        return WellFrame(self._get(run_metadata.run_id(run)).copy(deep=False))
+
+    def invalidate(self, *runs: RunLike) -> None:
+        """
+        Drops runs from memory (for every dtype).
+
+        Args:
+            *runs: RunLike:
+
+        """
+        run_ids = set(run_metadata.run_ids(runs))
+        with self._store.lock:
+            for key in [k for k in self._store.frames if k[0] in run_ids]:
+                self._pop(key)
+
+    def clear(self) -> None:
+        """Drops everything from memory. Does not touch the underlying cache."""
+        with self._store.lock:
+            self._store.frames.clear()
+            self._store.n_bytes = 0
+
+    def _get(self, run: int) -> WellFrame:
+        key = self._key(run)
+        path = self.path_of(run)
+        with self._store.lock:
+            if key in self._store.frames:
+                df, stamp, _ = self._store.frames[key]
+                if stamp == self._stamp(path):
+                    self._store.frames.move_to_end(key)
+                    return df
+                logger.debug(f"Cached file for r{run} changed; reloading")
+                self._pop(key)
+        df = self._freeze(self._cache.load(run))
+        # stat after loading, which may have downloaded
+        self._put(key, df, self._stamp(path))
+        return df
+
+    def _put(self, key: Tup[int, str], df: WellFrame, stamp: Optional[Tup[int, int]]) -> None:
+        if stamp is None:
+            return
+        n_bytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._store.lock:
+            if key in self._store.frames:
+                self._pop(key)
+            if n_bytes > self._store.max_bytes:
+                logger.debug(f"Not holding r{key[0]}: {n_bytes} bytes > {self._store.max_bytes}")
+                return
+            self._store.frames[key] = (df, stamp, n_bytes)
+            self._store.n_bytes += n_bytes
+            while self._store.n_bytes > self._store.max_bytes:
+                _, (_, _, evicted) = self._store.frames.popitem(last=False)
+                self._store.n_bytes -= evicted
+
+    def _pop(self, key: Tup[int, str]) -> None:
+        _, _, n_bytes = self._store.frames.pop(key)
+        self._store.n_bytes -= n_bytes
+
+    def _freeze(self, df: WellFrame) -> WellFrame:
+        values = df.values
+        values.flags.writeable = False
+        return WellFrame(pd.DataFrame(values, index=df.index, columns=df.columns, copy=False))
+
+    def _stamp(self, path: Path) -> Optional[Tup[int, int]]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _key(self, run: int) -> Tup[int, str]:
+        dtype = getattr(self._cache, "_dtype", None)
+        return run, "" if dtype is None else str(np.dtype(dtype))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._cache!r}, {self.memory_bytes}/{self.max_bytes})"
+
+    def __str__(self):
+        return repr(self)
+
+
+__all__ = ["FrameFacade"]
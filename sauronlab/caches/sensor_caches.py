@@ -1,5 +1,7 @@
 from PIL import Image
 
+from sauronlab.calc.run_metadata import run_metadata
+from sauronlab.calc.run_timing import run_timing_cache
 from sauronlab.core.core_imports import *
 from sauronlab.model.cache_interfaces import ASensorCache
 from sauronlab.model.sensors import *
@@ -28,6 +30,7 @@ class SensorCache(ASensorCache):
     def __init__(self, cache_dir: PathLike = DEFAULT_CACHE_DIR, cache_waveform: bool = True):
         self._cache_dir = Tools.prepped_dir(cache_dir)
         self.cache_waveform: bool = cache_waveform
+        run_timing_cache.register_dir(self._cache_dir, on_write=self.manifest.add)
 
     @property
     def cache_dir(self) -> Path:
@@ -46,7 +49,8 @@ class SensorCache(ASensorCache):
 
         """
         sensor, run = tup
-        return self.cache_dir / str(run.id) / (sensor.name.lower() + self._get_extension(sensor))
+        run_id = run_metadata.run_id(run)
+        return self.cache_dir / str(run_id) / (sensor.name.lower() + self._get_extension(sensor))
 
     @abcd.overrides
     def key_from_path(self, path: PathLike) -> Tup[SensorNames, RunLike]:
@@ -60,19 +64,29 @@ class SensorCache(ASensorCache):
 
         """
         path = Path(path).relative_to(self.cache_dir)
-        run = int(re.compile(r"^r([0-9]+)$").fullmatch(path.parent.name).group(1))
-        sensor = re.compile(r"^r([a-z0-9\-_]+)\..+$").fullmatch(path.name).group(1)
-        return SensorNames[sensor.upper()], run
+        run = re.compile(r"^([0-9]+)$").fullmatch(path.parent.name)
+        sensor = re.compile(r"^([a-z0-9\-_]+)\..+$").fullmatch(path.name)
+        if run is None or sensor is None or sensor.group(1).upper() not in SensorNames.__members__:
+            return None
+        return SensorNames[sensor.group(1).upper()], int(run.group(1))
 
     @abcd.overrides
     def download(self, *sensors: Iterable[Tup[SensorNames, RunLike]]) -> None:
         """
-
+        Downloads sensor data for several runs at once, using ``valar_pool``.
+        The sensors for any one run are downloaded in order by a single thread.
 
         Args:
             *sensors:
 
         """
+        by_run: Dict[int, List[Tup[SensorNames, Runs]]] = defaultdict(list)
+        for sensor, run in sensors:
+            run = run_metadata.run(run)
+            by_run[run.id].append((sensor, run))
+        valar_pool.map(self._download_all, by_run.values())
+
+    def _download_all(self, sensors: Sequence[Tup[SensorNames, Runs]]) -> None:
         for sensor, run in sensors:
             # doing this is SO much simpler
             # otherwise we'd have to duplicate the switch logic
@@ -81,7 +95,7 @@ class SensorCache(ASensorCache):
 
     def bt_data(self, run: RunLike) -> EmpiricalBatteryTimeData:
         """
-
+        Gets the empirical battery start and end, using the process-wide ``run_timing_cache``.
 
         Args:
           run: RunLike:
@@ -89,7 +103,7 @@ class SensorCache(ASensorCache):
         Returns:
 
         """
-        millis = self._download_raw(SensorNames.RAW_STIMULUS_MILLIS, run)
+        millis = run_timing_cache.stimulus_millis(run)
         return EmpiricalBatteryTimeData(run, millis[0], millis[-1])
 
     @abcd.overrides
@@ -179,7 +193,9 @@ class SensorCache(ASensorCache):
     @abcd.overrides
     def load(self, tup: Tup[SensorNames, RunLike]) -> SauronlabSensor:
         """
-
+        Loads a sensor, downloading its components if necessary.
+        Records the run's metadata (see ``run_metadata``), so that cached sensors load without Valar
+        when ``sauronlab_env.offline`` is set.
 
         Args:
             tup:
@@ -188,7 +204,9 @@ class SensorCache(ASensorCache):
 
         """
         sensor_name, run = tup
-        run = Runs.fetch(run)
+        run = run_metadata.run(run)
+        if not sauronlab_env.offline:
+            run_metadata.record(run)
         for component in sensor_name.components:
             logger.debug(f"Finding component {component} for {sensor_name}, run {run.id}")
             self._download_raw(component, run)
@@ -215,13 +233,16 @@ class SensorCache(ASensorCache):
     def _load_audio_waveform(self, run: Runs) -> MicrophoneWaveformSensor:
         path = self.path_of((SensorNames.MICROPHONE_WAVEFORM, run))
         if path.exists():
+            self.manifest.touch(path)
             return Tools.unpkl(path)
         mic = self._load_audio(run)
         t0 = time.monotonic()
         logger.debug(f"Making the waveform for the microphone recording of {run.id}")
         waveform_sensor = mic.waveform(1000)
         if self.cache_waveform:
-            Tools.pkl(waveform_sensor, str(path))
+            with self._atomic(path) as tmp:
+                Tools.pkl(waveform_sensor, str(tmp))
+            self.manifest.add(path)
         logger.debug(f"Made the waveform for {run.id}. Took {round(time.monotonic()-t0, 1)} s.")
         return waveform_sensor
 
@@ -273,20 +294,36 @@ class SensorCache(ASensorCache):
 
         """
         assert sensor_name.is_raw, sensor_name.name
-        run = Runs.fetch(run)
-        generation = ValarTools.generation_of(run)
-        sensor = Sensors.fetch(ValarTools.standard_sensor(sensor_name, generation))
+        run = run_metadata.run(run)
         path = self.path_of((sensor_name, run))
-        if path.exists():
-            logger.debug(f"Loading {sensor.name} from {path}, r{run.id}")
-            if sensor_name.is_image:
-                return Image.open(path)
-            elif sensor_name == SensorNames.RAW_MICROPHONE_RECORDING:
-                return path.read_bytes()
-            else:
-                return np.load(str(path))
-                # return ValarTools.convert_sensor_data_from_bytes(sensor, path.read_bytes())
-        Tools.prep_file(path, exist_ok=False)
+        if not path.exists():
+            if sauronlab_env.offline:
+                raise CacheLoadError(
+                    f"{sensor_name.name} for r{run.id} is not cached, and sauronlab is offline"
+                )
+            with self.lock((sensor_name, run)):
+                # another thread or process may have written it while we waited
+                if not path.exists():
+                    generation = run_metadata.generation(run)
+                    sensor = Sensors.fetch(ValarTools.standard_sensor(sensor_name, generation))
+                    return self._fetch_raw(sensor_name, sensor, run, path)
+        logger.debug(f"Loading {sensor_name.name} from {path}, r{run.id}")
+        self.manifest.touch(path)
+        if sensor_name.is_image:
+            return Image.open(path)
+        elif sensor_name == SensorNames.RAW_MICROPHONE_RECORDING:
+            return path.read_bytes()
+        else:
+            return np.load(str(path))
+            # return ValarTools.convert_sensor_data_from_bytes(sensor, path.read_bytes())
+
+    def _fetch_raw(
+        self, sensor_name: SensorNames, sensor: Sensors, run: Runs, path: Path
+    ) -> Union[None, np.array, bytes, str, Image.Image]:
+        """
+        Downloads sensor data and writes it atomically. Call only while holding the lock.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
         logger.debug(f"Downloading {sensor.name} for run r{run.id} from Valar...")
         data = (
             SensorData.select(SensorData)
@@ -297,12 +334,17 @@ class SensorCache(ASensorCache):
         if data is None:
             raise ValarLookupError(f"No data for sensor {sensor.id} on run r{run.name}")
         converted = ValarTools.convert_sensor_data_from_bytes(sensor, data.floats)
-        if sensor_name.is_image or sensor_name == SensorNames.RAW_MICROPHONE_RECORDING:
-            path.write_bytes(converted)
-        elif sensor_name.is_timing:
-            np.save(str(path), converted.astype(np.int32))
-        else:
-            np.save(str(path), converted)
+        if sensor_name.is_timing:
+            # return and hold the same array that's written, so a later load gives the same dtype
+            converted = converted.astype(np.int32)
+        with self._atomic(path) as tmp:
+            if sensor_name.is_image or sensor_name == SensorNames.RAW_MICROPHONE_RECORDING:
+                tmp.write_bytes(converted)
+            else:
+                np.save(str(tmp), converted)
+        self.manifest.add(path)
+        if sensor_name in [SensorNames.RAW_CAMERA_MILLIS, SensorNames.RAW_STIMULUS_MILLIS]:
+            run_timing_cache.put(run, sensor_name.json_name, converted)
         return converted
 
     def _get_extension(self, sensor: SensorNames) -> str:
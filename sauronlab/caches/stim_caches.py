@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from sauronlab.caches.cache_codecs import CacheCodec, CacheCodecs
+from sauronlab.calc.run_metadata import run_metadata
 from sauronlab.core.core_imports import *
 from sauronlab.model.audio import Waveform
 from sauronlab.model.cache_interfaces import AStimCache
@@ -20,14 +22,19 @@ class StimframeCache(AStimCache):
         self,
         cache_dir: PathLike = None,
         waveform_loader: Optional[Callable[[str], Waveform]] = None,
+        codec: Union[None, str, CacheCodec] = None,
     ):
         """
 
         Args:
             cache_dir:
             waveform_loader:
+            codec: The compression for new files; defaults to ``cache_codec.batteries`` in the config, or lz4
         """
         self.waveform_loader = waveform_loader
+        self.codec = (
+            CacheCodecs.for_cache("batteries", "lz4") if codec is None else CacheCodec.of(codec)
+        )
         if cache_dir is None:
             cache_dir = (
                 DEFAULT_EXPANDED_CACHE_DIR if self.is_expanded else DEFAULT_UNEXPANDED_CACHE_DIR
@@ -56,7 +63,7 @@ class StimframeCache(AStimCache):
 
         """
         if not isinstance(battery, int):  # avoid query
-            battery = Batteries.fetch(battery).id
+            battery = run_metadata.battery(battery).id
         return self.cache_dir / (str(battery) + ".feather")
 
     @abcd.overrides
@@ -71,7 +78,8 @@ class StimframeCache(AStimCache):
 
         """
         path = Path(path).relative_to(self.cache_dir)
-        return int(re.compile(r"^([0-9]+)\.csv\.gz").fullmatch(path.name).group(1))
+        match = re.compile(r"^([0-9]+)\.feather$").fullmatch(path.name)
+        return None if match is None else int(match.group(1))
 
     @abcd.overrides
     def load(self, battery: BatteryLike) -> BatteryStimFrame:
@@ -90,18 +98,28 @@ class StimframeCache(AStimCache):
     @abcd.overrides
     def download(self, *batteries: BatteryLike) -> None:
         """
-
+        Downloads the batteries that aren't already cached.
 
         Args:
             *batteries: BatteryLike:
 
-        Returns:
+        Raises:
+            CacheLoadError: If a battery isn't cached and sauronlab is offline
 
         """
         for battery in batteries:
-            battery = Batteries.fetch(battery)
+            battery = run_metadata.battery(battery)
+            if battery.id in self:
+                continue
+            if sauronlab_env.offline:
+                raise CacheLoadError(
+                    f"Battery {battery.id} is not cached, and sauronlab is offline"
+                )
             is_legacy = ValarTools.battery_is_legacy(battery)
-            if battery not in self:
+            with self.lock(battery.id):
+                # another thread or process may have saved it while we waited
+                if battery.id in self:
+                    continue
                 logger.minor(f"Downloading battery {battery.id} ({battery.name})")
                 stimframes = BatteryStimFrame.of(battery)
                 if self.is_expanded:
@@ -120,12 +138,13 @@ class StimframeCache(AStimCache):
         Returns:
 
         """
-        battery = Batteries.fetch(battery)
+        battery = run_metadata.battery(battery)
         try:
             logger.debug(f"Loading cached battery battery {battery.id}")
             df = pd.read_feather(self.path_of(battery.id))
         except Exception as e:
             raise CacheLoadError(f"Failed to load stimframes for battery {battery.id}") from e
+        self.manifest.touch(self.path_of(battery.id))
         return BatteryStimFrame._gen_from(battery).convert(df)
 
     def _save(self, battery, bsf) -> None:
@@ -141,9 +160,11 @@ class StimframeCache(AStimCache):
             with Tools.silenced(no_stderr=True, no_stdout=True):
                 saved_to = self.path_of(battery.id)
                 logger.info(f"Saving battery {battery.id} to {saved_to}")
-                bsf.reset_index().to_feather(str(saved_to))
+                with self._atomic(saved_to) as tmp:
+                    bsf.reset_index().to_feather(str(tmp), **self.codec.feather_args())
         except Exception as e:
             raise XValueError(f"Failed to save stimframes for battery {battery.id}") from e
+        self.manifest.add(saved_to, n_rows=len(bsf), n_columns=len(bsf.columns))
 
     def __repr__(self):
         return f"{type(self).__name__}('{self.cache_dir}'/{self.is_expanded})"
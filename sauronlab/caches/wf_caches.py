@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import threading
 import warnings
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sauronlab.caches.cache_codecs import CacheCodec, CacheCodecs
+from sauronlab.calc.run_metadata import run_metadata
 from sauronlab.core.core_imports import *
 from sauronlab.model.cache_interfaces import AWellCache, ASensorCache
 from sauronlab.model.well_frames import SerializedWellFrame
@@ -14,6 +20,8 @@ from sauronlab.model.treatments import Treatments
 FeatureTypeLike = Union[None, int, str, Features, FeatureType]
 
 DEFAULT_CACHE_DIR = sauronlab_env.cache_dir / "wells"
+DEFAULT_PARQUET_CACHE_DIR = sauronlab_env.cache_dir / "well-parquet"
+DEFAULT_MEMMAP_CACHE_DIR = sauronlab_env.cache_dir / "well-memmap"
 
 
 @abcd.auto_eq()
@@ -29,6 +37,7 @@ class WellCache(AWellCache):
         cache_dir: PathLike = DEFAULT_CACHE_DIR,
         dtype=None,
         sensor_cache: Optional[ASensorCache] = None,
+        codec: Union[None, str, CacheCodec] = None,
     ):
         """
 
@@ -36,8 +45,13 @@ class WellCache(AWellCache):
             feature:
             cache_dir:
             dtype:
+            sensor_cache:
+            codec: The compression for new files; defaults to ``cache_codec.wells`` in the config, or lz4
 
         """
+        self.codec = (
+            CacheCodecs.for_cache("wells", "lz4") if codec is None else CacheCodec.of(codec)
+        )
         self.feature = FeatureTypes.of(feature) if feature is not None else None
         cache_dir = Path(cache_dir) / ("-" if self.feature is None else self.feature.internal_name)
         self._cache_dir = Tools.prepped_dir(cache_dir)
@@ -70,7 +84,9 @@ class WellCache(AWellCache):
         Returns:
 
         """
-        return WellCache(self.feature, self._cache_dir, dtype)
+        cache = copy(self)
+        cache._dtype = dtype
+        return cache
 
     @property
     def cache_dir(self) -> Path:
@@ -88,8 +104,7 @@ class WellCache(AWellCache):
         Returns:
 
         """
-        run = Tools.run(run)
-        return self.cache_dir / (str(run.id) + ".feather")
+        return self.cache_dir / (str(run_metadata.run_id(run)) + ".feather")
 
     @abcd.overrides
     def key_from_path(self, path: PathLike) -> RunLike:
@@ -103,85 +118,173 @@ class WellCache(AWellCache):
 
         """
         path = Path(path).relative_to(self.cache_dir)
-        return int(re.compile(r"^([0-9]+)\.csv\.gz").fullmatch(path.name).group(1))
+        match = re.compile(r"^([0-9]+)\.feather$").fullmatch(path.name)
+        return None if match is None else int(match.group(1))
 
     @abcd.overrides
-    def load_multiple(self, runs: RunsLike) -> WellFrame:
+    def load(
+        self, run: RunLike, start: Optional[int] = None, end: Optional[int] = None
+    ) -> WellFrame:
         """
-
+        Loads a run, reading only the feature columns from ``start`` to ``end`` from disk.
+        The columns keep their indices, as in ``WellFrame.subset``.
 
         Args:
-            runs: RunsLike:
+            run: RunLike:
+            start: The first feature column, inclusive; None for 0
+            end: The last feature column, exclusive; None for the end
 
         Returns:
 
         """
-        runs = Tools.runs(runs)
-        self.download(*runs)
-        return WellFrame.concat(*[self.load(r) for r in runs])
+        run = run_metadata.run_id(run)
+        self.download(run)
+        return self._load(run, start=start, end=end)
 
     @abcd.overrides
-    def load(self, run: RunLike) -> WellFrame:
+    def download(self, *runs: RunsLike) -> None:
         """
-
+        Downloads the runs that aren't already cached. See ``prefetch``.
 
         Args:
-            run: RunLike:
-
-        Returns:
+            *runs: RunsLike:
 
         """
-        run = Tools.run(run)
-        self.download(run)
-        return self._load(run)
+        self.prefetch(runs)
 
-    @abcd.overrides
-    def download(self, *runs: RunsLike) -> None:
+    def prefetch(self, runs: RunsLike, batch_size: int = 10, n_jobs: Optional[int] = None) -> int:
         """
+        Downloads the runs that aren't already cached, in bulk.
+        The missing runs are split into batches of ``batch_size``,
+        and up to ``n_jobs`` batches are fetched at once (see ``ValarPool.map``).
+        Each batch makes one metadata query, then fetches its runs one at a time,
+        writing each run (atomically) as soon as it's ready.
+        Logs the progress and throughput after each run.
+
+        This is single-flight across threads and processes sharing the cache directory:
+        each run is locked (see ``lock``) until this call has downloaded all of the runs it claimed,
+        and runs that another caller is already downloading are waited for instead of fetched again.
 
+        Also records the metadata of every run in ``run_metadata``, so that they can be loaded offline later.
+        If ``sauronlab_env.offline`` is set, cached runs are loaded without querying Valar at all.
 
         Args:
-            *runs: RunsLike:
+            runs: The runs to cache
+            batch_size: The maximum number of runs per batch
+            n_jobs: The maximum number of batches to fetch at once; defaults as in ``ValarPool.map``
+
+        Returns:
+            The number of runs downloaded by this call
+
+        Raises:
+            CacheLoadError: If a run isn't cached and sauronlab is offline
 
         """
-        # TODO this is broken!!!
-        runs = {r for r in Tools.runs(runs) if r not in self}
-        if len(runs) > 10:
-            for r in runs:
-                self.download(r)
-        elif len(runs) > 0:
-            wf = (
-                WellFrameBuilder.runs(runs)
-                .with_sensor_cache(self._sensor_cache)
-                .with_feature(self.feature, self._dtype)
-                .with_names(WellNamers.well())
-                .build()
-            )
+        if batch_size < 1:
+            raise OutOfRangeError(f"Batch size {batch_size} is < 1")
+        run_ids = run_metadata.run_ids(runs)
+        missing = sorted({r for r in run_ids if r not in self})
+        if sauronlab_env.offline:
+            if len(missing) > 0:
+                raise CacheLoadError(f"Runs {missing} are not cached, and sauronlab is offline")
+            return 0
+        run_metadata.record(*run_ids)
+        if len(missing) == 0:
+            return 0
+        runs = Tools.runs(missing)
+        locks = {r.id: self.lock(r) for r in runs}
+        claimed = [r for r in runs if locks[r.id].acquire(blocking=False)]
+        try:
+            # another caller may have finished a run between the check and the lock
+            mine = [r for r in claimed if r not in self]
+            self._download_runs(mine, batch_size, n_jobs)
+        finally:
+            for r in claimed:
+                locks[r.id].release()
+        n_downloaded = len(mine)
+        for r in runs:
+            if r not in claimed:
+                logger.debug(f"Waiting for another download of r{r.id} to {self.path_of(r)}")
+                with locks[r.id]:
+                    # it's only still missing if that download failed
+                    if r not in self:
+                        self._download_runs([r], batch_size, n_jobs)
+                        n_downloaded += 1
+        return n_downloaded
+
+    def _download_runs(
+        self,
+        runs: Sequence[Runs],
+        batch_size: int,
+        n_jobs: Optional[int],
+    ) -> None:
+        if len(runs) == 0:
+            return
+        batches = [runs[i : i + batch_size] for i in range(0, len(runs), batch_size)]
+        progress = _DownloadProgress(len(runs))
+        # when several batches are fetched at once, don't also parallelize within each
+        fetch = partial(
+            self._download_batch,
+            progress=progress,
+            n_jobs=1 if len(batches) > 1 else None,
+        )
+        valar_pool.map(fetch, batches, n_jobs=n_jobs)
+
+    def _download_batch(
+        self,
+        runs: Sequence[Runs],
+        progress: _DownloadProgress,
+        n_jobs: Optional[int],
+    ) -> None:
+        builder = (
+            WellFrameBuilder.runs(runs)
+            .with_sensor_cache(self._sensor_cache)
+            .with_feature(self.feature, self._dtype)
+            .with_names(WellNamers.well())
+        )
+        if n_jobs is not None:
+            builder = builder.with_n_jobs(n_jobs)
+        run_of = {r.id: r for r in runs}
+        for wf in builder.iter_runs():
             # with warnings.catch_warnings():
             #    warnings.simplefilter("ignore")
             #    with Tools.silenced(no_stderr=True, no_stdout=False):
             self._save(wf)
+            for run in wf["run"].unique():
+                progress.update(run, self.path_of(run_of[run]).stat().st_size)
 
-    def _load(self, runs: RunsLike) -> WellFrame:
+    def _load(
+        self, runs: RunsLike, start: Optional[int] = None, end: Optional[int] = None
+    ) -> WellFrame:
         """
 
 
         Args:
             runs: RunsLike:
+            start:
+            end:
 
         Returns:
 
         """
-        runs = ValarTools.runs(runs)
+        runs = run_metadata.run_ids(runs)
 
         def read(r):
             """"""
+            path = self.path_of(r)
             try:
                 # just use plain pd.read_feather right now
                 # we'll deserialize at the end
-                return SerializedWellFrame.read_feather(self.path_of(r))
+                if start is None and end is None:
+                    df = SerializedWellFrame.read_feather(path)
+                else:
+                    names = pa.ipc.open_file(str(path)).schema.names
+                    columns = self._feature_columns(names, start, end)
+                    df = SerializedWellFrame(pd.read_feather(str(path), columns=columns))
             except Exception:
                 raise CacheSaveError(f"Failed to load run {str(r)} from cache at {self.path_of(r)}")
+            self.manifest.touch(self.path_of(r))
+            return df
 
         df = WellFrame.deseralize(pd.concat([read(r) for r in runs], sort=False))
         df = df.with_new_names(df["well"])
@@ -202,9 +305,317 @@ class WellCache(AWellCache):
             saved_to = self.path_of(run)
             logger.minor(f"Saving run {run} to {saved_to}")
             try:
-                dfc.serialize().to_feather(str(saved_to), version=2, compression="lz4")
+                with self._atomic(saved_to) as tmp:
+                    dfc.serialize().to_feather(str(tmp), version=2, **self.codec.feather_args())
             except Exception:
                 raise CacheSaveError(f"Failed to save run {str(run)} to cache at {saved_to}")
+            self._record(saved_to, dfc)
+
+    def _feature_columns(
+        self, names: Sequence[str], start: Optional[int], end: Optional[int]
+    ) -> List[str]:
+        """
+        Returns the stored columns to read: all of the metadata, then the features from ``start`` to ``end``.
+        """
+        meta = [c for c in names if not c.isdigit()]
+        features = {c for c in names if c.isdigit()}
+        start = 0 if start is None else start
+        end = len(features) if end is None else end
+        return meta + [str(i) for i in range(start, end) if str(i) in features]
+
+    def _record(self, path: Path, df: WellFrame) -> None:
+        """
+        Adds a file that was just written to the manifest.
+        """
+        self.manifest.add(
+            path,
+            feature=None if self.feature is None else self.feature.internal_name,
+            dtype=str(df.dtypes.iloc[0]) if len(df.columns) > 0 else None,
+            n_rows=len(df),
+            n_columns=len(df.columns),
+        )
+
+
+@abcd.auto_eq()
+@abcd.auto_repr_str()
+class ParquetWellCache(WellCache):
+    """
+    A cache for WellFrames that stores a Parquet dataset partitioned by feature and run,
+    as ``<cache_dir>/<feature>/run=<run_id>/wells.parquet``.
+    The wells are sorted by ID and written in row groups of ``row_group_size`` wells,
+    so ``load_multiple`` can skip the row groups (and feature columns) that weren't requested
+    instead of reading whole runs.
+    """
+
+    def __init__(
+        self,
+        feature: FeatureTypeLike,
+        cache_dir: PathLike = DEFAULT_PARQUET_CACHE_DIR,
+        dtype=None,
+        sensor_cache: Optional[ASensorCache] = None,
+        row_group_size: int = 96,
+        codec: Union[None, str, CacheCodec] = None,
+    ):
+        """
+
+        Args:
+            feature:
+            cache_dir:
+            dtype:
+            sensor_cache:
+            row_group_size: The number of wells per Parquet row group
+            codec: The compression for new files; defaults to ``cache_codec.well-parquet`` in the config, or zstd
+
+        """
+        if codec is None:
+            codec = CacheCodecs.for_cache("well-parquet", "zstd")
+        super().__init__(feature, cache_dir, dtype, sensor_cache, codec)
+        if row_group_size < 1:
+            raise OutOfRangeError(f"Row group size {row_group_size} is < 1")
+        self.row_group_size = row_group_size
+
+    @abcd.overrides
+    def path_of(self, run: RunLike) -> Path:
+        """
+
+
+        Args:
+            run: RunLike:
+
+        Returns:
+
+        """
+        return self.cache_dir / f"run={run_metadata.run_id(run)}" / "wells.parquet"
+
+    @abcd.overrides
+    def key_from_path(self, path: PathLike) -> RunLike:
+        """
+
+
+        Args:
+            path: PathLike:
+
+        Returns:
+
+        """
+        path = Path(path).relative_to(self.cache_dir)
+        match = re.compile(r"^run=([0-9]+)$").fullmatch(path.parent.name)
+        if match is None or path.name != "wells.parquet":
+            return None
+        return int(match.group(1))
+
+    @abcd.overrides
+    def load_multiple(
+        self,
+        runs: RunsLike,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        wells: Optional[Collection[int]] = None,
+    ) -> WellFrame:
+        """
+        Loads runs, optionally reading only some wells and a range of feature columns.
+
+        Args:
+            runs: RunsLike:
+            start: The first feature column to read
+            end: One past the last feature column to read
+            wells: Only read the wells with these IDs; the reader skips row groups without them
+
+        Returns:
+
+        """
+        runs = run_metadata.run_ids(runs)
+        self.download(*runs)
+        return self._load(runs, wells, start, end)
+
+    def _load(
+        self,
+        runs: RunsLike,
+        wells: Optional[Collection[int]] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> WellFrame:
+        runs = run_metadata.run_ids(runs)
+        filters = None if wells is None else [("well", "in", sorted(wells))]
+
+        def read(r):
+            """"""
+            path = self.path_of(r)
+            try:
+                table = pq.read_table(
+                    str(path), columns=self._columns(path, start, end), filters=filters
+                )
+            except Exception:
+                raise CacheLoadError(f"Failed to load run {str(r)} from cache at {path}")
+            self.manifest.touch(path)
+            return table.to_pandas()
+
+        df = WellFrame.deseralize(
+            SerializedWellFrame(pd.concat([read(r) for r in runs], sort=False))
+        )
+        df = df.with_new_names(df["well"])
+        if self._dtype is not None:
+            df = df.astype(self._dtype)
+        return df
+
+    def _columns(self, path: Path, start: Optional[int], end: Optional[int]) -> Optional[List[str]]:
+        if start is None and end is None:
+            return None
+        return self._feature_columns(pq.read_schema(str(path)).names, start, end)
+
+    def _save(self, df: WellFrame) -> None:
+        """
+        Saves a well-by-well dataframe as one Parquet file per run.
+
+        Args:
+            df:
+
+        """
+        for run in df["run"].unique():
+            dfc = WellFrame(df[df["run"] == run]).sort_values("well")
+            saved_to = self.path_of(run)
+            saved_to.parent.mkdir(parents=True, exist_ok=True)
+            logger.minor(f"Saving run {run} to {saved_to}")
+            try:
+                table = pa.Table.from_pandas(dfc.serialize(), preserve_index=False)
+                with self._atomic(saved_to) as tmp:
+                    pq.write_table(
+                        table,
+                        str(tmp),
+                        row_group_size=self.row_group_size,
+                        **self.codec.parquet_args(),
+                    )
+            except Exception:
+                raise CacheSaveError(f"Failed to save run {str(run)} to cache at {saved_to}")
+            self._record(saved_to, dfc)
+
+
+@abcd.auto_eq()
+@abcd.auto_repr_str()
+class MemmapWellCache(WellCache):
+    """
+    A cache for WellFrames that stores the features of each run as an uncompressed float32 ``.npy`` block,
+    as ``<cache_dir>/<feature>/<run_id>/features.npy``, next to the metadata in ``meta.feather``.
+    ``load`` maps the block copy-on-write (``np.load(mmap_mode="c")``) and wraps it without copying,
+    so loading the same run in several processes shares the OS page cache.
+    ``load_multiple`` has to concatenate the runs, which copies them.
+    Setting a dtype other than float32 also copies.
+    """
+
+    def __init__(
+        self,
+        feature: FeatureTypeLike,
+        cache_dir: PathLike = DEFAULT_MEMMAP_CACHE_DIR,
+        dtype=None,
+        sensor_cache: Optional[ASensorCache] = None,
+    ):
+        # the features are mapped directly, so they're never compressed
+        super().__init__(feature, cache_dir, dtype, sensor_cache, CacheCodec("uncompressed"))
+
+    @abcd.overrides
+    def path_of(self, run: RunLike) -> Path:
+        """
+        Returns the path to the features; the metadata is in ``meta.feather`` in the same directory.
+
+        Args:
+            run: RunLike:
+
+        Returns:
+
+        """
+        return self.cache_dir / str(run_metadata.run_id(run)) / "features.npy"
+
+    @abcd.overrides
+    def key_from_path(self, path: PathLike) -> RunLike:
+        """
+
+
+        Args:
+            path: PathLike:
+
+        Returns:
+
+        """
+        path = Path(path).relative_to(self.cache_dir)
+        match = re.compile(r"^([0-9]+)$").fullmatch(path.parent.name)
+        if match is None or path.name != "features.npy":
+            return None
+        return int(match.group(1))
+
+    def _load(
+        self, runs: RunsLike, start: Optional[int] = None, end: Optional[int] = None
+    ) -> WellFrame:
+        runs = run_metadata.run_ids(runs)
+        dfs = [self._load_one(r, start, end) for r in runs]
+        df = dfs[0] if len(dfs) == 1 else WellFrame.concat(*dfs)
+        if self._dtype is not None and np.dtype(self._dtype) != np.float32:
+            df = df.astype(self._dtype)
+        return df
+
+    def _load_one(self, run: int, start: Optional[int], end: Optional[int]) -> WellFrame:
+        path = self.path_of(run)
+        try:
+            meta = SerializedWellFrame.read_feather(path.parent / "meta.feather")
+            features = np.load(str(path), mmap_mode="c")
+        except Exception:
+            raise CacheLoadError(f"Failed to load run {str(run)} from cache at {path}")
+        self.manifest.touch(path)
+        meta = WellFrame.deseralize(meta)
+        meta = meta.with_new_names(meta["well"])
+        # slicing the map only pages in the columns needed
+        columns = pd.RangeIndex(features.shape[1])[start:end]
+        features = features[:, columns.start : columns.stop]
+        return WellFrame(pd.DataFrame(features, index=meta.index, columns=columns, copy=False))
+
+    def _save(self, df: WellFrame) -> None:
+        """
+        Saves a well-by-well dataframe as a float32 block and a metadata table per run.
+
+        Args:
+            df:
+
+        """
+        for run in df["run"].unique():
+            dfc = WellFrame(df[df["run"] == run])
+            saved_to = self.path_of(run)
+            saved_to.parent.mkdir(parents=True, exist_ok=True)
+            logger.minor(f"Saving run {run} to {saved_to}")
+            try:
+                # the features are written last, since their file determines whether the run is cached
+                with self._atomic(saved_to.parent / "meta.feather") as tmp:
+                    dfc.meta().serialize().to_feather(str(tmp))
+                with self._atomic(saved_to) as tmp:
+                    np.save(str(tmp), np.ascontiguousarray(dfc.values, dtype=np.float32))
+            except Exception:
+                raise CacheSaveError(f"Failed to save run {str(run)} to cache at {saved_to}")
+            self._record(saved_to.parent / "meta.feather", dfc.meta())
+            self._record(saved_to, dfc.astype(np.float32))
+
+
+class _DownloadProgress:
+    """
+    Counts the runs and bytes written by ``WellCache.prefetch`` across threads, and logs the throughput.
+    """
+
+    def __init__(self, n_runs: int):
+        self.n_runs = n_runs
+        self.n_done = 0
+        self.n_bytes = 0
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, run: int, n_bytes: int) -> None:
+        with self._lock:
+            self.n_done += 1
+            self.n_bytes += n_bytes
+            elapsed = max(time.monotonic() - self._t0, 1e-9)
+            rate = self.n_done / elapsed
+            eta = (self.n_runs - self.n_done) / rate
+            logger.info(
+                f"Cached r{run} ({self.n_done}/{self.n_runs} runs)."
+                f" {round(rate * 60, 1)} runs/min, {round(self.n_bytes / elapsed / 1024 ** 2, 1)} MiB/s;"
+                f" about {round(eta / 60, 1)} min left."
+            )
 
 
-__all__ = ["WellCache"]
+__all__ = ["WellCache", "ParquetWellCache", "MemmapWellCache"]
@@ -1,5 +1,4 @@
-import scipy.interpolate as interp
-
+from sauronlab.calc.run_timing import run_timing_cache
 from sauronlab.core.core_imports import *
 
 
@@ -22,12 +21,14 @@ class InterpolationFailedError(AlgorithmError):
 class FeatureTimestampMismatchError(InterpolationFailedError):
     """"""
 
-    def __init__(self, feature: str, well: int, n_features: int, n_timestamps: int, n_ideal: int):
+    def __init__(
+        self, feature: str, well: Optional[int], n_features: int, n_timestamps: int, n_ideal: int
+    ):
         """
 
         Args:
             feature:
-            well:
+            well: The well, or None if the features of a whole run were being interpolated
             n_features:
             n_timestamps:
             n_ideal:
@@ -40,8 +41,33 @@ class FeatureTimestampMismatchError(InterpolationFailedError):
         self.n_ideal = n_ideal
 
 
+@dataclass(frozen=True)
+class FeatureWindow:
+    """
+    A contiguous part of a frame-by-frame feature array that was fetched without the rest.
+
+    Attributes:
+        offset: The index in the full array of the first value that was fetched
+        n_total: The length of the full array
+        start: The first index of the output; for interpolated features, this is in ideal frames
+        end: One past the last index of the output, or None to go to the end
+    """
+
+    offset: int
+    n_total: int
+    start: int
+    end: Optional[int]
+
+
 class FeatureInterpolation:
-    """"""
+    """
+    Aligns frame-by-frame features to an ideal time grid using the camera timestamps.
+    Each ideal frame takes the value of the last raw frame at or before it,
+    as ``scipy.interpolate.interp1d(kind="previous")`` would, and is NaN outside the raw frames.
+
+    All wells in a run share the timestamps, so ``interpolate_run`` computes the mapping once
+    and applies it to every well at once; ``interpolate`` is the single-well version.
+    """
 
     def __init__(self, feature: Features):
         self.feature = feature
@@ -49,10 +75,11 @@ class FeatureInterpolation:
     def interpolate(
         self,
         feature_arr: np.array,
-        frame_timestamps: np.array,
-        stim_timestamps: np.array,
+        frame_timestamps: Optional[np.array],
+        stim_timestamps: Optional[np.array],
         well: Union[int, Wells],
         stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
     ) -> np.array:
         """
         Interpolates a time-dependent, frame-by-frame feature for a well using timestamps.
@@ -62,27 +89,95 @@ class FeatureInterpolation:
 
         Args:
             feature_arr: The array of the feature; not affected
-            frame_timestamps:
-            stim_timestamps:
-            well: The well instance or ID
+            frame_timestamps: The raw camera millis; if None, gets them from ``run_timing_cache``
+            stim_timestamps: The raw stimulus millis; if None, gets them from ``run_timing_cache``
+            well: The well instance or ID; an instance avoids a query
             stringent: Raise exceptions for small errors
+            window: If ``feature_arr`` is only part of the full array, describes which part
 
         Returns:
             The interpolated features
 
         """
-        run = InternalTools.well(well).run
-        ideal_framerate = ValarTools.frames_per_second(run)
-        battery = run.experiment.battery
+        run = well.run_id if isinstance(well, Wells) else InternalTools.well(well).run.id
+        well = well.id if isinstance(well, Wells) else well
+        return self._interpolate_matrix(
+            feature_arr[np.newaxis, :],
+            frame_timestamps,
+            stim_timestamps,
+            run,
+            well,
+            stringent,
+            window,
+        )[0]
+
+    def interpolate_run(
+        self,
+        matrix: np.array,
+        frame_timestamps: Optional[np.array],
+        stim_timestamps: Optional[np.array],
+        run: RunLike,
+        stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
+        lengths: Optional[Sequence[int]] = None,
+    ) -> np.array:
+        """
+        Interpolates a time-dependent, frame-by-frame feature for many wells of one run at once.
+        Finds the raw frame for each ideal frame once (with ``np.searchsorted``),
+        then gathers those columns from the whole matrix in one step.
+        Gives the same values as calling ``interpolate`` on the first ``lengths[i]`` values of each row.
+
+        Args:
+            matrix: A wells-by-frames array of the feature, with shorter rows padded (ex with NaN);
+                    not affected
+            frame_timestamps: The raw camera millis; if None, gets them from ``run_timing_cache``
+            stim_timestamps: The raw stimulus millis; if None, gets them from ``run_timing_cache``
+            run: The run ID or instance
+            stringent: Raise exceptions for small errors
+            window: If the rows are only part of the full arrays, describes which part
+            lengths: The number of values in each row, before the padding; None if no row is padded
+
+        Returns:
+            A float32 wells-by-ideal-frames array
+
+        """
+        return self._interpolate_matrix(
+            np.atleast_2d(matrix),
+            frame_timestamps,
+            stim_timestamps,
+            run,
+            None,
+            stringent,
+            window,
+            lengths,
+        )
+
+    def _interpolate_matrix(
+        self,
+        matrix: np.array,
+        frame_timestamps: Optional[np.array],
+        stim_timestamps: Optional[np.array],
+        run: RunLike,
+        well: Optional[int],
+        stringent: bool,
+        window: Optional[FeatureWindow],
+        lengths: Optional[Sequence[int]] = None,
+    ) -> np.array:
+        if frame_timestamps is None:
+            frame_timestamps = run_timing_cache.frame_millis(run)
+        if stim_timestamps is None:
+            stim_timestamps = run_timing_cache.stimulus_millis(run)
+        ideal_framerate = run_timing_cache.frames_per_second(run)
+        battery_length = run_timing_cache.battery_length(run)
         actual_battery_start_ms, actual_battery_stop_ms = stim_timestamps[0], stim_timestamps[-1]
-        expected_stop_ms = actual_battery_start_ms + battery.length
+        expected_stop_ms = actual_battery_start_ms + battery_length
         # differs by >= than 2 frames
         if abs(actual_battery_stop_ms - expected_stop_ms) >= 2 * 1000 / ideal_framerate:
             msg = "Run {} has recorded stop time {} but start time + battery length = {} + {} = {} (diff {}ms)".format(
                 run,
                 actual_battery_stop_ms,
                 actual_battery_start_ms,
-                battery.length,
+                battery_length,
                 expected_stop_ms,
                 actual_battery_stop_ms - expected_stop_ms,
             )
@@ -90,36 +185,80 @@ class FeatureInterpolation:
                 raise RefusingRequestError(msg)
             else:
                 logger.debug(msg)
-        frames_ms = frame_timestamps[
-            (frame_timestamps >= actual_battery_start_ms) & (frame_timestamps <= expected_stop_ms)
-        ]
+        frames_ms = self._battery_frames(
+            frame_timestamps, actual_battery_start_ms, expected_stop_ms
+        )
         return self._interpolate(
-            feature_arr,
+            matrix,
             frames_ms,
             actual_battery_start_ms,
             expected_stop_ms,
             ideal_framerate,
             well,
             stringent,
+            window,
+            lengths,
+        )
+
+    def raw_frame_range(
+        self, run: RunLike, start: int, end: Optional[int], margin: int = 0
+    ) -> Tup[int, Optional[int]]:
+        """
+        Finds the part of the raw (frame-by-frame) feature array needed to interpolate a range of ideal frames.
+        Uses the timestamps in ``run_timing_cache``.
+
+        Args:
+            run: A run ID or instance
+            start: The first ideal frame
+            end: One past the last ideal frame, or None to go to the end
+            margin: A number of extra raw frames to include on each side
+
+        Returns:
+            The start and end indices into the raw array; the end is None if ``end`` is None
+
+        """
+        frame_timestamps = run_timing_cache.frame_millis(run)
+        battery_start_ms = run_timing_cache.stimulus_millis(run)[0]
+        expected_stop_ms = battery_start_ms + run_timing_cache.battery_length(run)
+        ideal_step = 1000 / run_timing_cache.frames_per_second(run)
+        frames_ms = self._battery_frames(frame_timestamps, battery_start_ms, expected_stop_ms)
+        # kind='previous' takes the last raw frame at or before each ideal frame
+        raw_start = np.searchsorted(frames_ms, battery_start_ms + start * ideal_step, side="right")
+        raw_start = max(0, int(raw_start) - 1 - margin)
+        if end is None:
+            return raw_start, None
+        raw_end = np.searchsorted(
+            frames_ms, battery_start_ms + (end - 1) * ideal_step, side="right"
         )
+        return raw_start, int(raw_end) + margin
+
+    def _battery_frames(
+        self, frame_timestamps: np.array, battery_start_ms: int, battery_stop_ms: int
+    ) -> np.array:
+        return frame_timestamps[
+            (frame_timestamps >= battery_start_ms) & (frame_timestamps <= battery_stop_ms)
+        ]
 
     def _interpolate(
         self,
-        feature_arr: np.array,
+        matrix: np.array,
         frames_ms: np.array,
         battery_start_ms: int,
         battery_stop_ms: int,
         ideal_framerate: int,
-        well: int,
+        well: Optional[int],
         stringent: bool,
+        window: Optional[FeatureWindow] = None,
+        lengths: Optional[Sequence[int]] = None,
     ) -> np.array:
         """
         Interpolates a time-dependent, frame-by-frame feature using timestamps.
-        See exterior_interpolate_features for a simpler way to call this and for more info.
-        Interpolates using scipy.interpolate.interp1d with kind='previous', fill_value='extrapolate', bounds_error=False, and assume_sorted=True
+        See ``interpolate`` and ``interpolate_run`` for simpler ways to call this and for more info.
+        For each row, equivalent to scipy.interpolate.interp1d on its first ``lengths[i]`` values
+        with kind='previous', fill_value=(NaN, NaN), bounds_error=False, and assume_sorted=True
 
         Args:
-            feature_arr: The array of the feature; not affected
+            matrix: The wells-by-frames array of the feature; not affected
             frames_ms: The millisecond timestamps, which can be float-typed.
                        This is NOT set to start with the battery start.
                        However, the milliseconds for battery_start, battery_end,
@@ -129,10 +268,14 @@ class FeatureInterpolation:
             battery_stop_ms: The millisecond at which the battery finished (see `frames_ms`)
             ideal_framerate: The framerate that was set in the camera config.
                              The interpolation will use this to determine the resulting number of frames.
-            well: int:
+            well: The well, or None for a whole run; only used in errors
             stringent: bool:
+            window: If set, ``feature_arr`` starts at ``window.offset`` and only the ideal frames
+                    from ``window.start`` to ``window.end`` are returned
+            lengths: The number of values in each row, before the padding; None if no row is padded
 
         Returns:
+            A float32 wells-by-ideal-frames array
 
         """
         # Later we want to have logic that checks that it makes sense to interpolate--we don't want to interpolate if there are problematic gaps
@@ -141,34 +284,52 @@ class FeatureInterpolation:
         ideal_step = 1000 / ideal_framerate
         new_time = np.arange(start=battery_start_ms, stop=battery_stop_ms, step=ideal_step)
 
-        # if len(new_time) == len(feature_arr):
-        #     return feature_arr
-        if abs(len(frames_ms) - len(feature_arr)) > (0 if stringent else 100 * ideal_step):
-            raise FeatureTimestampMismatchError(
-                self.feature, well, len(feature_arr), len(frames_ms), len(new_time)
+        # if len(new_time) == matrix.shape[1]:
+        #     return matrix
+        if lengths is None:
+            lengths = np.full(matrix.shape[0], matrix.shape[1])
+        lengths = np.asarray(lengths, dtype=np.int64)
+        # the length of the full array of each row
+        n_features = lengths if window is None else np.full(len(lengths), window.n_total)
+        for n in np.unique(n_features):
+            if abs(len(frames_ms) - n) > (0 if stringent else 100 * ideal_step):
+                raise FeatureTimestampMismatchError(
+                    self.feature, well, int(n), len(frames_ms), len(new_time)
+                )
+        # if it's off by 1, let's trim either to fix it
+        frames_ms = frames_ms[: np.max(n_features, initial=matrix.shape[1])]
+        if window is not None:
+            frames_ms = frames_ms[window.offset : window.offset + matrix.shape[1]]
+            new_time = new_time[window.start : window.end]
+        if len(frames_ms) == 0:
+            raise InterpolationFailedError(
+                f"No frames to interpolate {self.feature} from for well {well}", self.feature, well
             )
-        elif abs(len(frames_ms) - len(feature_arr)) > 0:
-            # if it's off by 1, let's trim either to fix it
-            if len(frames_ms) < len(feature_arr):
-                feature_arr = feature_arr[: len(frames_ms)]
-            else:
-                frames_ms = frames_ms[: len(feature_arr)]
-
-        # this breaks with linear interpolation!
-        try:
-            feature_interp = interp.interp1d(
-                frames_ms,
-                feature_arr,
-                kind="previous",
-                fill_value=(np.NaN, np.NaN),
-                bounds_error=False,
-                assume_sorted=True,
+        # the last raw frame at or before each ideal frame; this breaks with linear interpolation!
+        indices = np.searchsorted(frames_ms, new_time, side="right") - 1
+        outside = (indices < 0) | (new_time > frames_ms[-1])
+        interpolated = np.take(
+            matrix[:, : len(frames_ms)].astype(np.float32, copy=False),
+            np.clip(indices, 0, None),
+            axis=1,
+        )
+        interpolated[:, outside] = np.NaN
+        # a shorter row ends at its own last frame, not at the last frame of the longest row
+        n_frames = np.minimum(lengths, len(frames_ms))
+        short = np.flatnonzero(n_frames < len(frames_ms))
+        if len(short) > 0:
+            last_ms = np.where(
+                n_frames[short] > 0, frames_ms[np.maximum(n_frames[short] - 1, 0)], -np.inf
             )
-        except BaseException as e:
-            raise InterpolationFailedError(
-                f"Failed calling interp1d on {self.feature} for well {well}", self.feature, well
-            ) from e
-        return feature_interp(new_time)
+            interpolated[short] = np.where(
+                new_time[np.newaxis, :] > last_ms[:, np.newaxis], np.NaN, interpolated[short]
+            )
+        return interpolated
 
 
-__all__ = ["FeatureInterpolation", "InterpolationFailedError", "FeatureTimestampMismatchError"]
+__all__ = [
+    "FeatureInterpolation",
+    "FeatureWindow",
+    "InterpolationFailedError",
+    "FeatureTimestampMismatchError",
+]
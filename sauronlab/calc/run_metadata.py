@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+
+from sauronlab.core.core_imports import *
+
+DEFAULT_CACHE_DIR = sauronlab_env.cache_dir / "runs"
+
+
+@dataclass(frozen=True)
+class RunMetadata:
+    """
+    The facts about a run that loading cached data needs, so that cached runs can be used offline.
+
+    Attributes:
+        run_id: The run ID
+        name: The run name
+        tag: The run tag
+        submission: The submission hash, or None for legacy runs
+        datetime_run: When the run was started
+        experiment_id: The experiment ID
+        plate_id: The plate ID
+        sauron_config_id: The sauron_config ID
+        config_file_id: The config_file ID, or None for legacy runs
+        generation: The name of the run's ``DataGeneration``
+        fps: The ideal framerate (see ``ValarTools.frames_per_second``)
+        battery_id: The battery ID
+        battery_name: The battery name
+        battery_length: The length of the battery in stimframes
+        plate_type_id: The plate type ID, or None if the plate has no type
+    """
+
+    run_id: int
+    name: str
+    tag: str
+    submission: Optional[str]
+    datetime_run: datetime
+    experiment_id: int
+    plate_id: int
+    sauron_config_id: int
+    config_file_id: Optional[int]
+    generation: str
+    fps: int
+    battery_id: int
+    battery_name: str
+    battery_length: int
+    plate_type_id: Optional[int]
+
+    def as_run(self) -> Runs:
+        """
+        Returns a ``Runs`` row with the columns recorded here, without querying.
+        ``run.experiment.battery``, ``run.plate``, and ``run.submission`` are filled in
+        with only their recorded columns (the submission has only its hash);
+        following any other foreign key queries Valar.
+        """
+        return Runs(
+            id=self.run_id,
+            name=self.name,
+            tag=self.tag,
+            datetime_run=self.datetime_run,
+            experiment=Experiments(id=self.experiment_id, battery=self.as_battery()),
+            plate=Plates(id=self.plate_id, plate_type_id=self.plate_type_id),
+            sauron_config_id=self.sauron_config_id,
+            config_file_id=self.config_file_id,
+            submission=(
+                None if self.submission is None else Submissions(lookup_hash=self.submission)
+            ),
+        )
+
+    def as_battery(self) -> Batteries:
+        """
+        Returns a ``Batteries`` row with the ID, name, and length, without querying.
+        """
+        return Batteries(id=self.battery_id, name=self.battery_name, length=self.battery_length)
+
+    def to_json(self) -> str:
+        """"""
+        data = dataclasses.asdict(self)
+        data["datetime_run"] = self.datetime_run.isoformat()
+        return json.dumps(data, indent=2)
+
+    @classmethod
+    def from_json(cls, text: str) -> RunMetadata:
+        """"""
+        data = json.loads(text)
+        data["datetime_run"] = datetime.fromisoformat(data["datetime_run"])
+        return RunMetadata(**data)
+
+
+class RunMetadataCache:
+    """
+    A process-wide cache of ``RunMetadata``, persisted as ``<cache_dir>/<run_id>.json``.
+    The caches record the metadata of each run they download or load,
+    so that anything cached can later be loaded without Valar.
+
+    Metadata are looked up in order from:
+        1. Memory
+        2. The JSON files
+        3. Valar, after which the JSON file is written
+
+    When ``sauronlab_env.offline`` is set, step 3 raises a ``CacheLoadError`` instead,
+    and runs given by name, tag, or submission hash are matched against the JSON files.
+    Set ``offline`` in the config, or ``sauronlab_env.offline`` at runtime.
+    """
+
+    def __init__(self, cache_dir: PathLike = DEFAULT_CACHE_DIR):
+        """
+
+        Args:
+            cache_dir: The directory of JSON files
+        """
+        self._cache_dir = Tools.prepped_dir(cache_dir)
+        self._metadata: Dict[int, RunMetadata] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def cache_dir(self) -> Path:
+        """"""
+        return self._cache_dir
+
+    @property
+    def offline(self) -> bool:
+        """Whether Valar is off-limits."""
+        return sauronlab_env.offline
+
+    def get(self, run: RunLike) -> RunMetadata:
+        """
+        Gets the metadata of a run, fetching and recording them if necessary.
+
+        Args:
+            run: A run ID, name, tag, instance, or submission hash or instance
+
+        Raises:
+            CacheLoadError: If the run isn't recorded and sauronlab is offline
+        """
+        run_id = self.run_id(run)
+        with self._lock:
+            if run_id in self._metadata:
+                return self._metadata[run_id]
+        meta = self._from_disk(run_id)
+        if meta is None:
+            meta = self._from_valar(run if isinstance(run, Runs) else run_id)
+        with self._lock:
+            self._metadata[run_id] = meta
+        return meta
+
+    def record(self, *runs: RunLike) -> None:
+        """
+        Makes sure the metadata of runs are recorded on disk, fetching them if necessary.
+        """
+        for run in runs:
+            self.get(run)
+
+    def run_id(self, run: RunLike) -> int:
+        """
+        Gets a run ID without querying if possible.
+        IDs and ``Runs`` instances never need a query;
+        names, tags, and submission hashes do, unless offline.
+
+        Raises:
+            CacheLoadError: If offline and no recorded run matches
+        """
+        if isinstance(run, (int, np.integer)):
+            return int(run)
+        if isinstance(run, float):
+            return int(run)
+        if isinstance(run, Runs):
+            return run.id
+        if not self.offline:
+            return Tools.run(run).id
+        key = run.lookup_hash if isinstance(run, Submissions) else str(run)
+        for meta in self._all():
+            if key in {meta.name, meta.tag, meta.submission}:
+                return meta.run_id
+        raise CacheLoadError(f"No cached run matches {key}, and sauronlab is offline")
+
+    def run_ids(self, runs: RunsLike) -> Sequence[int]:
+        """
+        Gets run IDs in the same order, without querying if possible (see ``run_id``).
+        """
+        runs = runs if Tools.is_true_iterable(runs) else [runs]
+        if self.offline or all(isinstance(r, (int, float, np.integer, Runs)) for r in runs):
+            return [self.run_id(r) for r in runs]
+        return [r.id for r in Tools.runs(runs)]
+
+    def run(self, run: RunLike) -> Runs:
+        """
+        Gets a ``Runs`` row: from Valar if online, or from the recorded metadata if offline.
+        """
+        if isinstance(run, Runs):
+            return run
+        if self.offline:
+            return self.get(run).as_run()
+        return Tools.run(run)
+
+    def battery(self, battery: Union[Batteries, int, str]) -> Batteries:
+        """
+        Gets a ``Batteries`` row: from Valar if online,
+        or from the metadata of any recorded run on that battery if offline.
+
+        Raises:
+            CacheLoadError: If offline and no recorded run used the battery
+        """
+        if isinstance(battery, Batteries) or not self.offline:
+            return Batteries.fetch(battery)
+        for meta in self._all():
+            if battery in {meta.battery_id, meta.battery_name}:
+                return meta.as_battery()
+        raise CacheLoadError(f"No cached run used battery {battery}, and sauronlab is offline")
+
+    def generation(self, run: RunLike) -> DataGeneration:
+        """Memoized ``ValarTools.generation_of``."""
+        return DataGeneration.of(self.get(run).generation)
+
+    def frames_per_second(self, run: RunLike) -> int:
+        """Memoized ``ValarTools.frames_per_second``."""
+        return self.get(run).fps
+
+    def battery_length(self, run: RunLike) -> int:
+        """Returns the length of the run's battery in stimframes, memoized."""
+        return self.get(run).battery_length
+
+    def path_of(self, run_id: int) -> Path:
+        """"""
+        return self.cache_dir / (str(run_id) + ".json")
+
+    def clear(self) -> None:
+        """Empties the in-memory cache. Does not touch files on disk."""
+        with self._lock:
+            self._metadata.clear()
+
+    def _all(self) -> Sequence[RunMetadata]:
+        for path in self.cache_dir.glob("[0-9]*.json"):
+            # skip anything else, such as the temp files of writers in other processes
+            if not path.stem.isdigit():
+                continue
+            run_id = int(path.stem)
+            if run_id not in self._metadata:
+                meta = self._from_disk(run_id)
+                if meta is not None:
+                    with self._lock:
+                        self._metadata[run_id] = meta
+        with self._lock:
+            return list(self._metadata.values())
+
+    def _from_disk(self, run_id: int) -> Optional[RunMetadata]:
+        path = self.path_of(run_id)
+        if not path.exists():
+            return None
+        try:
+            return RunMetadata.from_json(path.read_text(encoding="utf8"))
+        except (ValueError, TypeError, KeyError):
+            logger.warning(f"Ignoring unreadable run metadata at {path}")
+            return None
+
+    def _from_valar(self, run: Union[int, Runs]) -> RunMetadata:
+        run_id = self.run_id(run)
+        if self.offline:
+            raise CacheLoadError(f"Run r{run_id} is not cached, and sauronlab is offline")
+        logger.debug(f"Fetching metadata for run r{run_id} from Valar...")
+        run = (
+            Runs.select(Runs, Submissions, Experiments, Batteries, Plates)
+            .join(Submissions, JOIN.LEFT_OUTER)
+            .switch(Runs)
+            .join(Experiments)
+            .join(Batteries)
+            .switch(Runs)
+            .join(Plates)
+            .where(Runs.id == run_id)
+            .first()
+        )
+        if run is None:
+            raise ValarLookupError(f"No run r{run_id}")
+        battery = run.experiment.battery
+        meta = RunMetadata(
+            run_id=run.id,
+            name=run.name,
+            tag=run.tag,
+            submission=None if run.submission is None else run.submission.lookup_hash,
+            datetime_run=run.datetime_run,
+            experiment_id=run.experiment_id,
+            plate_id=run.plate_id,
+            sauron_config_id=run.sauron_config_id,
+            config_file_id=run.config_file_id,
+            generation=ValarTools.generation_of(run).name,
+            fps=ValarTools.frames_per_second(run),
+            battery_id=battery.id,
+            battery_name=battery.name,
+            battery_length=battery.length,
+            plate_type_id=run.plate.plate_type_id,
+        )
+        path = self.path_of(meta.run_id)
+        # write and rename so that readers in other processes never see a partial file
+        tmp = path.with_name(f".{os.getpid()}-{threading.get_ident()}.{path.name}")
+        tmp.write_text(meta.to_json(), encoding="utf8")
+        os.replace(str(tmp), str(path))
+        return meta
+
+
+run_metadata = RunMetadataCache()
+
+
+__all__ = ["RunMetadata", "RunMetadataCache", "run_metadata"]
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import threading
+
+from sauronlab.calc.run_metadata import run_metadata
+from sauronlab.core.core_imports import *
+
+
+class RunTimingCache:
+    """
+    A process-wide, size-bounded cache of the timing data for runs.
+    Holds the raw camera and stimulus millisecond arrays; the ideal framerate and battery length come from ``run_metadata``.
+    All wells in a run share these, so they only need to be fetched once per run.
+
+    Timestamp arrays are looked up in order from:
+        1. Memory, evicting the least-recently used arrays when ``max_bytes`` is exceeded
+        2. The ``.npy`` files that ``SensorCache`` writes, under any registered directory
+        3. Valar, after which the array is also written under the first registered directory
+           (and passed to its ``on_write``), unless ``sauronlab_env.offline`` is set
+
+    The keys for the arrays are the ``generations.json`` sensor names, such as ``camera_millis``.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2):
+        """
+
+        Args:
+            max_bytes: The maximum total number of bytes of timestamp arrays to hold in memory
+        """
+        self.max_bytes = max_bytes
+        self._arrays: OrderedDict[Tup[int, str], np.array] = OrderedDict()
+        self._n_bytes = 0
+        # the directories in the order they were registered, with their on_write callbacks
+        self._dirs: Dict[Path, Optional[Callable[[Path], None]]] = {}
+        self._lock = threading.RLock()
+
+    def register_dir(
+        self, path: PathLike, on_write: Optional[Callable[[Path], None]] = None
+    ) -> None:
+        """
+        Adds a directory laid out like ``SensorCache``, as in ``<dir>/<run_id>/raw_<name>.npy``.
+
+        Args:
+            path: The directory
+            on_write: Called with the path of each file written under it,
+                      such as to record the file in the cache's manifest;
+                      replaces the callback from an earlier registration of the same directory
+        """
+        path = Path(path)
+        with self._lock:
+            if path not in self._dirs or on_write is not None:
+                self._dirs[path] = on_write
+
+    def frame_millis(self, run: RunLike) -> np.array:
+        """Returns the raw camera (frame) timestamps of a run in milliseconds."""
+        return self.get(run, "camera_millis")
+
+    def stimulus_millis(self, run: RunLike) -> np.array:
+        """Returns the raw stimulus timestamps of a run in milliseconds."""
+        return self.get(run, "stimulus_millis")
+
+    def get(self, run: RunLike, name: str) -> np.array:
+        """
+        Gets a timing array, fetching it if necessary.
+
+        Args:
+            run: A run ID or instance; other types require a query
+            name: The sensor name in ``generations.json``, such as ``camera_millis``
+
+        Returns:
+            A 1D Numpy array; do not modify it
+
+        """
+        run_id = self._run_id(run)
+        with self._lock:
+            if (run_id, name) in self._arrays:
+                self._arrays.move_to_end((run_id, name))
+                return self._arrays[(run_id, name)]
+        arr = self._from_disk(run_id, name)
+        if arr is None:
+            arr = self._from_valar(run_id, name)
+        self.put(run_id, name, arr)
+        return arr
+
+    def put(self, run: RunLike, name: str, arr: np.array) -> None:
+        """
+        Adds a timing array that was fetched elsewhere, such as by ``SensorCache``.
+
+        Args:
+            run: A run ID or instance
+            name: The sensor name in ``generations.json``, such as ``camera_millis``
+            arr: The array
+        """
+        key = (self._run_id(run), name)
+        with self._lock:
+            if key in self._arrays:
+                self._n_bytes -= self._arrays.pop(key).nbytes
+            self._arrays[key] = arr
+            self._n_bytes += arr.nbytes
+            while self._n_bytes > self.max_bytes and len(self._arrays) > 1:
+                _, evicted = self._arrays.popitem(last=False)
+                self._n_bytes -= evicted.nbytes
+
+    def frames_per_second(self, run: RunLike) -> int:
+        """Memoized ``ValarTools.frames_per_second``; see ``RunMetadataCache``."""
+        return run_metadata.frames_per_second(run)
+
+    def battery_length(self, run: RunLike) -> int:
+        """Returns the length of the run's battery in stimframes, memoized; see ``RunMetadataCache``."""
+        return run_metadata.battery_length(run)
+
+    def clear(self) -> None:
+        """Empties the in-memory cache. Does not touch files on disk."""
+        with self._lock:
+            self._arrays.clear()
+            self._n_bytes = 0
+
+    @property
+    def n_bytes(self) -> int:
+        """The number of bytes of timestamp arrays currently held."""
+        return self._n_bytes
+
+    def _path_in(self, directory: Path, run_id: int, name: str) -> Path:
+        return directory / str(run_id) / ("raw_" + name + ".npy")
+
+    def _from_disk(self, run_id: int, name: str) -> Optional[np.array]:
+        for directory in list(self._dirs):
+            path = self._path_in(directory, run_id, name)
+            if path.exists():
+                logger.debug(f"Loading {name} for r{run_id} from {path}")
+                return np.load(str(path))
+        return None
+
+    def _from_valar(self, run_id: int, name: str) -> np.array:
+        if sauronlab_env.offline:
+            raise CacheLoadError(f"No cached {name} for r{run_id}, and sauronlab is offline")
+        generation = run_metadata.generation(run_id)
+        sensor = ValarTools.standard_sensor(name, generation)
+        logger.debug(f"Downloading {sensor.name} for run r{run_id} from Valar...")
+        data = (
+            SensorData.select(SensorData.floats)
+            .where(SensorData.sensor_id == sensor.id)
+            .where(SensorData.run_id == run_id)
+            .first()
+        )
+        if data is None:
+            raise ValarLookupError(f"No data for sensor {sensor.id} on run r{run_id}")
+        arr = ValarTools.convert_sensor_data_from_bytes(sensor, data.floats)
+        with self._lock:
+            first = next(iter(self._dirs.items()), None)
+        if first is not None:
+            directory, on_write = first
+            path = self._path_in(directory, run_id, name)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # write and rename so that readers in other processes never see a partial file
+                tmp = path.with_name(f".{os.getpid()}-{threading.get_ident()}.{path.name}")
+                np.save(str(tmp), arr)
+                os.replace(str(tmp), str(path))
+                if on_write is not None:
+                    on_write(path)
+        return arr
+
+    def _run_id(self, run: RunLike) -> int:
+        return run_metadata.run_id(run)
+
+
+run_timing_cache = RunTimingCache()
+
+
+__all__ = ["RunTimingCache", "run_timing_cache"]
@@ -196,6 +196,23 @@ class Commands:
             cache.download(arg)
         logger.notice(f"Downloaded {n_exists} videos.")
 
+    @staticmethod
+    @cli.command()
+    def bench_codecs(codecs: List[str] = typer.Argument(None), directory: str = None) -> None:
+        """
+        Compares cache codecs by writing and reading a synthetic run.
+        Set the winner as ``cache_codec.<name>`` in sauronlab.config.
+
+        Args:
+            codecs: Codecs like ``lz4`` or ``zstd:3``; defaults to a standard set
+            directory: Where to write the temporary files; defaults to the cache directory
+
+        """
+        from sauronlab.caches.cache_codecs import CacheCodecs
+
+        df = CacheCodecs.benchmark(codecs if codecs else None, directory)
+        typer.echo(df.to_string(index=False))
+
 
 if __name__ == "__main__":
     cli()
@@ -30,5 +30,6 @@ from sauronlab.core._tools import *
 from sauronlab.core.data_generations import DataGeneration
 from sauronlab.core.environment import *
 from sauronlab.core.tools import *
+from sauronlab.core.valar_pool import *
 from sauronlab.core.valar_singleton import *
 from sauronlab.core.valar_tools import *
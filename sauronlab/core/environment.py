@@ -54,6 +54,9 @@ class PropSet:
     def int_nullable(self, key: str, fallback: Optional[str] = None) -> Optional[int]:
         return int(self.str_nullable(key, fallback))
 
+    def with_prefix(self, prefix: str) -> Mapping[str, str]:
+        return {k[len(prefix) :]: v for k, v in self._props.items() if k.startswith(prefix)}
+
     def bool(self, key: str, fallback: bool) -> bool:
         return CommonTools.parse_bool(self._props.get(key, fallback))
 
@@ -100,6 +103,15 @@ class SauronlabEnvironment:
         - global_log_level: The log level recommended to be used for logging statements globally; set up by jupyter.py
         - viz_file: Path to sauronlab-specific visualization options in the style of Matplotlib RC
         - n_cores: Default number of cores for some jobs, including with parallelize()
+        - feature_chunk_size: Number of wells whose feature blobs WellFrameBuilder fetches per query; 384 by default
+        - db_pool_size: If > 0, queries go through a pool of up to this many connections (see ``ValarPool``); 0 by default
+        - cache_max_bytes: Read from ``cache_max_gib``; the total size of the caches, enforced by ``CacheEvictor``; unlimited by default
+        - cache_budgets: Read from ``cache_max_gib.<name>``; the size of each cache under ``cache_dir``, by directory name (ex ``cache_max_gib.wells``)
+        - cache_eviction_policy: ``lru`` (least-recently used) or ``lfu`` (least-frequently used); ``lru`` by default
+        - cache_eviction_minutes: If > 0, evict in a background thread this often; 0 by default
+        - cache_codecs: Read from ``cache_codec.<name>``; the compression for each cache, such as ``zstd:3`` (see ``CacheCodec``)
+        - facade_max_bytes: Read from ``facade_max_gib``; the size of the WellFrames that a ``FrameFacade`` holds in memory; 1 GiB by default
+        - offline: Serve only what's cached, using the run metadata recorded by the caches, and never query Valar for it; false by default
         - jupyter_template: Path to a Jupyter template text file
 
     """
@@ -125,6 +137,15 @@ class SauronlabEnvironment:
         self.use_multicore_tsne       = props.bool("multicore_tsne", False)
         self.joblib_compression_level = props.int("joblib_compression_level", 3)
         self.n_cores                  = props.int("n_cores", 1)
+        self.feature_chunk_size       = props.int("feature_chunk_size", 384)
+        self.db_pool_size             = props.int("db_pool_size", 0)
+        self.cache_max_bytes          = self._gib_to_bytes(props.str_nullable("cache_max_gib", None))
+        self.cache_budgets            = {k: self._gib_to_bytes(v) for k, v in props.with_prefix("cache_max_gib.").items()}
+        self.cache_eviction_policy    = props.str("cache_eviction_policy", "lru")
+        self.cache_eviction_minutes   = props.int("cache_eviction_minutes", 0)
+        self.cache_codecs             = props.with_prefix("cache_codec.")
+        self.facade_max_bytes         = self._gib_to_bytes(props.str("facade_max_gib", "1"))
+        self.offline                  = props.bool("offline", False)
         self.jupyter_template         = props.file("jupyter_template", props.resource("templates", "jupyter.txt"))
         self.matplotlib_style         = props.file("matplotlib_style", props.resource("styles", "default.mplstyle"))
         self.sauronlab_style          = props.file("viz_file", props.resource("styles", "default.properties"))
@@ -143,6 +164,9 @@ class SauronlabEnvironment:
             f"Set {len(props)} sauronlab config items. Run 'print(sauronlab_env.info())' for details."
         )
 
+    def _gib_to_bytes(self, gib: Optional[str]) -> Optional[int]:
+        return None if gib is None else int(float(gib) * 1024 ** 3)
+
     def _adjust_logging(self):
         """ """
         logger.setLevel(self.sauronlab_log_level)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import joblib
+import peewee
+import valarpy.model as _valar_model
+from playhouse.pool import PooledMySQLDatabase
+
+from sauronlab.core._imports import *
+from sauronlab.core.environment import sauronlab_env
+from sauronlab.core.valar_singleton import *
+
+I = TypeVar("I")
+V = TypeVar("V")
+
+
+class ValarPool:
+    """
+    An optional pool of connections to Valar, shared by threads.
+    While open, every valarpy model is bound to a ``PooledMySQLDatabase``
+    instead of the single connection in ``VALAR``, so each thread gets its own connection.
+    Set ``db_pool_size`` in the config file to open the pool on import.
+
+    ``map`` runs a function over items on a bounded thread pool,
+    returning each connection to the pool when its task finishes.
+    It works without the pool too, in which case each thread opens and closes its own connection.
+    """
+
+    def __init__(self, config: Mapping[str, Any], max_connections: int):
+        """
+
+        Args:
+            config: The valarpy connection config, with ``database`` and MySQL connection arguments
+            max_connections: The maximum number of open connections
+        """
+        self.config = dict(config)
+        self.max_connections = max_connections
+        self._database: Optional[PooledMySQLDatabase] = None
+        self._previous: Dict[Type[peewee.Model], peewee.Database] = {}
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the models are bound to the pool."""
+        return self._database is not None
+
+    def open(self) -> ValarPool:
+        """
+        Creates the pool and binds all valarpy models to it. Does nothing if it's already open.
+
+        Returns:
+            This pool
+
+        Raises:
+            OutOfRangeError: If ``max_connections`` < 1
+        """
+        if self.is_open:
+            return self
+        if self.max_connections < 1:
+            raise OutOfRangeError(f"Max connections {self.max_connections} is < 1")
+        args = dict(self.config)
+        database = args.pop("database", "valar")
+        self._database = PooledMySQLDatabase(
+            database,
+            max_connections=self.max_connections,
+            stale_timeout=300,
+            timeout=60,
+            **args,
+        )
+        for model in self._models():
+            self._previous[model] = model._meta.database
+            model.bind(self._database, bind_refs=False, bind_backrefs=False)
+        logger.info(f"Opened a pool of up to {self.max_connections} connections to {database}")
+        return self
+
+    def close(self) -> None:
+        """Closes every pooled connection and binds the models back to their original database."""
+        if not self.is_open:
+            return
+        for model, previous in self._previous.items():
+            model.bind(previous, bind_refs=False, bind_backrefs=False)
+        self._previous.clear()
+        self._database.close_all()
+        self._database = None
+
+    def map(
+        self, function: Callable[[I], V], things: Iterable[I], n_jobs: Optional[int] = None
+    ) -> List[V]:
+        """
+        Calls a function on each item on a pool of threads, each with its own connection.
+        The results are in the same order as ``things``, and the first error raised is re-raised unchanged.
+
+        Args:
+            function: A function that may query Valar
+            things: The items
+            n_jobs: The maximum number of threads; defaults to ``max_connections`` if the pool is open,
+                    otherwise to ``sauronlab_env.n_cores``; is capped at ``max_connections`` if the pool is open
+
+        Returns:
+            The results
+        """
+        things = list(things)
+        if n_jobs is None:
+            n_jobs = self.max_connections if self.is_open else sauronlab_env.n_cores
+        if self.is_open:
+            n_jobs = min(n_jobs, self.max_connections)
+        n_jobs = max(1, min(n_jobs, len(things)))
+        if n_jobs == 1:
+            return [function(thing) for thing in things]
+        return joblib.Parallel(n_jobs=n_jobs, prefer="threads")(
+            joblib.delayed(self._call)(function, thing) for thing in things
+        )
+
+    def _call(self, function: Callable[[I], V], thing: I) -> V:
+        # a worker thread gets its own connection; close it so it returns to the pool
+        database = Runs._meta.database
+        was_closed = database.is_closed()
+        try:
+            return function(thing)
+        finally:
+            if was_closed and not database.is_closed():
+                database.close()
+
+    def _models(self) -> Sequence[Type[peewee.Model]]:
+        return [
+            v
+            for v in vars(_valar_model).values()
+            if isinstance(v, type) and issubclass(v, peewee.Model) and v is not peewee.Model
+        ]
+
+    def __enter__(self) -> ValarPool:
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+valar_pool = ValarPool(sauronlab_env.valarpy_data, sauronlab_env.db_pool_size)
+if sauronlab_env.db_pool_size > 0:
+    valar_pool.open()
+
+
+__all__ = ["ValarPool", "valar_pool"]
@@ -70,7 +70,8 @@ class VideoCache(AVideoCache):
 
         """
         path = Path(path).relative_to(self.cache_dir)
-        return int(re.compile(r"^([0-9]+)\..+$").fullmatch(path.name).group(1))
+        match = re.compile(r"^([0-9]+)\..+$").fullmatch(path.name)
+        return None if match is None else int(match.group(1))
 
     @abcd.overrides
     def load(self, run: RunLike) -> SauronxVideo:
@@ -108,6 +109,8 @@ class VideoCache(AVideoCache):
                 )
                 remote_path = self.shire_store / VideoCore.get_remote_path(run)
                 self._copy_from_shire(remote_path, video_path)
+                self.manifest.add(video_path, sha1=False)
+                self.manifest.add(str(video_path) + ".sha256")
                 # TODO check for properties file
                 logger.notice(
                     f"Downloaded video of r{run.id}. Took {round(time.monotonic() - t0, 1)}s."
@@ -124,6 +127,7 @@ class VideoCache(AVideoCache):
           A SauronxVideo
 
         """
+        self.manifest.touch(self.path_of(run))
         return SauronxVideos.of(self.path_of(run), run)
 
     def validate(self, run: RunLike) -> None:
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import threading
+
 import pydub
 
+from sauronlab.calc.run_metadata import run_metadata
+from sauronlab.calc.run_timing import run_timing_cache
 from sauronlab.core.core_imports import *
 from sauronlab.core.valar_singleton import *
 from sauronlab.model.audio import *
 from sauronlab.model.sensors import *
 from sauronlab.model.assay_frames import AssayFrame
+from sauronlab.model.cache_locks import CacheLock
+from sauronlab.model.cache_manifests import CacheManifest
 from sauronlab.model.stim_frames import BatteryStimFrame
 from sauronlab.model.well_frames import *
 
@@ -75,9 +81,48 @@ class ASauronlabCache(Generic[KEY, VALUE], metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
-    def contains(self, key: KEY) -> bool:
+    @property
+    def manifest(self) -> CacheManifest:
+        """
+        The index of the files in ``cache_dir``, which is shared by all caches on the directory.
+        """
+        return CacheManifest.of(self.cache_dir)
+
+    @property
+    def n_bytes(self) -> int:
+        """
+        The total size of the files in the cache, according to the manifest.
+        """
+        return self.manifest.n_bytes
+
+    def pin(self, *keys: KEY) -> None:
+        """
+        Protects items from eviction, whether or not they've been downloaded.
+        For example, ``cache.pin(*df.unique_runs())`` keeps the runs of a dataset.
+
+        Args:
+            *keys:
+
+        """
+        for key in keys:
+            self.manifest.pin(self.path_of(key))
+
+    def unpin(self, *keys: KEY) -> None:
+        """
+        Removes the pins on items, if any.
+
+        Args:
+            *keys:
+
         """
+        for key in keys:
+            self.manifest.unpin(self.path_of(key))
 
+    def contains(self, key: KEY) -> bool:
+        """
+        Checks the manifest, then that the file still exists.
+        If it was deleted outside of this cache (ex by hand, or by another process's evictor),
+        its entry is removed, so that the next download fetches it again.
 
         Args:
             key:
@@ -85,21 +130,30 @@ class ASauronlabCache(Generic[KEY, VALUE], metaclass=ABCMeta):
         Returns:
 
         """
-        return self.path_of(key).exists()
+        path = self.path_of(key)
+        if path not in self.manifest:
+            return False
+        if not path.exists():
+            logger.debug(f"{path} is in the manifest but is gone; removing it")
+            self.manifest.remove(path)
+            return False
+        return True
 
     def contents(self) -> Sequence[KEY]:
         """
+        Lists the keys from the manifest, without touching the directory.
 
         Returns:
 
         """
-        lst = []
-        for path in self.cache_dir.iterdir():
+        # a key can have more than one file, so keep the first of each
+        keys = {}
+        for path in self.manifest.paths():
             k = self.key_from_path(path)
             ## it might not be a relevant file (ex thumbs.db)
             if k is not None:
-                lst.append(k)
-        return lst
+                keys.setdefault(k, None)
+        return list(keys)
 
     def delete(self, key: KEY) -> None:
         """
@@ -112,9 +166,40 @@ class ASauronlabCache(Generic[KEY, VALUE], metaclass=ABCMeta):
 
         """
         # TOD delete directories
-        path = self.path_of(key).relative_to(self.cache_dir).parts
+        path = self.path_of(key)
         if self.contains(key):
-            self.path_of(key).unlink()
+            if path.exists():
+                path.unlink()
+            self.manifest.remove(path)
+
+    def lock(self, key: KEY) -> CacheLock:
+        """
+        Returns a lock on a key, shared by every thread and process using this cache directory.
+        Downloads hold it so that concurrent callers wait for the download in flight instead of repeating it.
+
+        Args:
+            key:
+
+        Returns:
+
+        """
+        name = self.path_of(key).relative_to(self.cache_dir).as_posix().replace("/", "--")
+        return CacheLock.of(self.cache_dir, name)
+
+    @contextmanager
+    def _atomic(self, path: Path) -> Generator[Path, None, None]:
+        """
+        Yields a temporary path in the same directory, then renames it to ``path``.
+        Readers never see a partial file, and concurrent writers just replace each other's complete files.
+        Keeps the suffix so that writers like ``np.save`` don't append another.
+        """
+        tmp = path.with_name(f".{os.getpid()}-{threading.get_ident()}.{path.name}")
+        try:
+            yield tmp
+            os.replace(str(tmp), str(path))
+        finally:
+            if tmp.exists():
+                tmp.unlink()
 
     def __contains__(self, key: KEY) -> bool:
         return self.contains(key)
@@ -129,17 +214,65 @@ class ASauronlabCache(Generic[KEY, VALUE], metaclass=ABCMeta):
 class AWellCache(ASauronlabCache[RunLike, WellFrame], metaclass=ABCMeta):
     """"""
 
-    def load_multiple(self, runs: RunsLike) -> WellFrame:
+    def load_multiple(
+        self,
+        runs: RunsLike,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        wells: Optional[Collection[int]] = None,
+    ) -> WellFrame:
         """
+        Loads runs, reading only the feature columns from ``start`` to ``end`` (by index), if possible.
+        The columns keep their indices, as in ``WellFrame.subset``.
+        By default, downloads the runs, calls ``load`` on each, and keeps only ``wells``;
+        caches that can skip wells while reading (ex ``ParquetWellCache``) override this.
 
+        Args:
+            runs:
+            start: The first feature column, inclusive; None for 0
+            end: The last feature column, exclusive; None for the end
+            wells: Only return the wells with these IDs; None for all
+
+        Returns:
+
+        """
+        runs = run_metadata.run_ids(runs)
+        self.download(*runs)
+        df = WellFrame.concat(*[self.load(r, start=start, end=end) for r in runs])
+        if wells is not None:
+            df = WellFrame.of(df[df["well"].isin(wells)])
+        return df
+
+    def load_ms(
+        self,
+        runs: RunsLike,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        fps: Optional[int] = None,
+    ) -> WellFrame:
+        """
+        Loads runs, reading only the features between two times.
+        Converts to frames exactly as ``WellFrame.slice_ms`` does, then calls ``load_multiple``.
 
         Args:
             runs:
+            start_ms: The milliseconds to start at, or None to mean 0
+            end_ms: The milliseconds to end at, or None to mean the end
+            fps: The framerate; by default, the ideal framerate of the runs, which must all be the same
 
         Returns:
 
         """
-        raise NotImplementedError()
+        runs = run_metadata.run_ids(runs)
+        if fps is None and (start_ms is not None or end_ms is not None):
+            fps = Tools.only(
+                {run_timing_cache.frames_per_second(r) for r in runs}, name="framerates"
+            )
+        return self.load_multiple(
+            runs,
+            start=None if start_ms is None else int(np.floor(start_ms * fps / 1000)),
+            end=None if end_ms is None else int(np.ceil(end_ms * fps / 1000)),
+        )
 
     def with_dtype(self, dtype) -> AWellCache:
         """
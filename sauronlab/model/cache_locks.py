@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from sauronlab.core.core_imports import *
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CacheLock:
+    """
+    An exclusive lock on one cache key, shared by threads and processes through a lock file.
+    Uses ``flock`` (or ``msvcrt.locking`` on Windows), so the operating system releases it
+    if the process holding it dies, and a lock file left behind is harmless.
+    Lock files are never deleted, since deleting one that another process has open would break the lock.
+
+    Example:
+        Single-flight population of a cache::
+
+            with CacheLock.of(cache_dir, "123"):
+                if not path.exists():
+                    download_to(path)
+    """
+
+    def __init__(self, path: PathLike):
+        """
+
+        Args:
+            path: The lock file, which is created if needed
+        """
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def of(cls, cache_dir: PathLike, name: str) -> CacheLock:
+        """
+        Returns a lock for a key in ``<cache_dir>/.locks``.
+
+        Args:
+            cache_dir: The cache directory
+            name: A name for the key that's unique in the directory and safe as a filename
+        """
+        return CacheLock(Path(cache_dir) / ".locks" / (name + ".lock"))
+
+    @property
+    def is_held(self) -> bool:
+        """Whether this instance holds the lock."""
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Acquires the lock.
+
+        Args:
+            blocking: Wait for the lock if another thread or process holds it
+            timeout: If blocking, the maximum number of seconds to wait; None to wait indefinitely
+
+        Returns:
+            Whether the lock was acquired
+
+        Raises:
+            AlreadyUsedError: If this instance already holds the lock
+        """
+        if self._fd is not None:
+            raise AlreadyUsedError(f"Already holding {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if blocking and timeout is None and fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._fd = fd
+                return True
+            t0 = time.monotonic()
+            while not self._try_lock(fd):
+                if not blocking or timeout is not None and time.monotonic() - t0 > timeout:
+                    os.close(fd)
+                    return False
+                time.sleep(0.1)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        """Releases the lock. Does nothing if this instance doesn't hold it."""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def __enter__(self) -> CacheLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self.path}', held={self.is_held})"
+
+    def __str__(self):
+        return repr(self)
+
+
+__all__ = ["CacheLock"]
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+from sauronlab.core.core_imports import *
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """
+    A file recorded in a ``CacheManifest``.
+
+    Attributes:
+        path: The path relative to the cache directory
+        feature: The feature name, for caches of features
+        dtype: The dtype of the values, if known
+        n_bytes: The size of the file
+        n_rows: The number of rows, for tables
+        n_columns: The number of columns, for tables
+        sha1: The SHA-1 hex digest of the file, or None if the manifest was rebuilt from the directory
+        created: When the file was written
+        accessed: When the file was last loaded (or written)
+        hits: The number of times the file was loaded since it was written
+    """
+
+    path: str
+    feature: Optional[str]
+    dtype: Optional[str]
+    n_bytes: int
+    n_rows: Optional[int]
+    n_columns: Optional[int]
+    sha1: Optional[str]
+    created: datetime
+    accessed: datetime
+    hits: int
+
+
+_COLUMNS = "path, feature, dtype, n_bytes, n_rows, n_columns, sha1, created, accessed, hits"
+_SLOTS = ",".join("?" * len(_COLUMNS.split(", ")))
+
+
+class CacheManifest:
+    """
+    An index of the files in a cache directory, stored in ``<cache_dir>/.manifest.sqlite``.
+    Caches record each file when they write it and touch it when they load it,
+    so listing the contents, checking membership, and totaling sizes don't need to walk the directory.
+    If the manifest doesn't exist yet, it's built once from the files in the directory.
+    Files changed outside of the caches aren't seen until ``rebuild`` is called.
+    Paths can also be pinned, which protects them from eviction (see ``CacheEvictor``);
+    pins are kept even if the file doesn't exist yet.
+
+    Use ``CacheManifest.of`` to share one instance (and connection) per directory.
+    """
+
+    _instances: Dict[Path, CacheManifest] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cache_dir: PathLike):
+        """
+
+        Args:
+            cache_dir: The cache directory
+        """
+        self.cache_dir = Path(cache_dir)
+        self.path = self.cache_dir / ".manifest.sqlite"
+        existed = self.path.exists()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    path TEXT PRIMARY KEY,
+                    feature TEXT,
+                    dtype TEXT,
+                    n_bytes INTEGER NOT NULL,
+                    n_rows INTEGER,
+                    n_columns INTEGER,
+                    sha1 TEXT,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+                """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pins (path TEXT PRIMARY KEY)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+            if "hits" not in columns:
+                self._conn.execute("ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        if not existed:
+            self.rebuild()
+
+    @classmethod
+    def of(cls, cache_dir: PathLike) -> CacheManifest:
+        """
+        Returns the manifest for a directory, creating it on first use.
+        """
+        cache_dir = Path(cache_dir).absolute()
+        with cls._instances_lock:
+            if cache_dir not in cls._instances:
+                cls._instances[cache_dir] = CacheManifest(cache_dir)
+            return cls._instances[cache_dir]
+
+    def add(
+        self,
+        path: PathLike,
+        feature: Optional[str] = None,
+        dtype: Optional[str] = None,
+        n_rows: Optional[int] = None,
+        n_columns: Optional[int] = None,
+        sha1: bool = True,
+    ) -> CacheEntry:
+        """
+        Records a file that was just written, replacing any previous entry.
+
+        Args:
+            path: The file, absolute or relative to the cache directory
+            feature: The feature name, if any
+            dtype: The dtype of the values, if any
+            n_rows: The number of rows, if a table
+            n_columns: The number of columns, if a table
+            sha1: Compute the SHA-1 digest of the file
+
+        Returns:
+            The new entry
+        """
+        key = self._key(path)
+        full = self.cache_dir / key
+        now = time.time()
+        digest = self._sha1(full) if sha1 else None
+        row = (
+            key,
+            feature,
+            dtype,
+            full.stat().st_size,
+            n_rows,
+            n_columns,
+            digest,
+            now,
+            now,
+            0,
+        )
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO entries ({_COLUMNS}) VALUES ({_SLOTS})", row
+            )
+        return self._entry(row)
+
+    def touch(self, path: PathLike) -> None:
+        """Sets the last access time of a file to now and counts a hit."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET accessed = ?, hits = hits + 1 WHERE path = ?",
+                (time.time(), self._key(path)),
+            )
+
+    def remove(self, path: PathLike) -> None:
+        """Removes the entry for a file, if there is one. Does not delete the file."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE path = ?", (self._key(path),))
+
+    def get(self, path: PathLike) -> Optional[CacheEntry]:
+        """Returns the entry for a file, or None if it's not recorded."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM entries WHERE path = ?", (self._key(path),)
+            ).fetchone()
+        return None if row is None else self._entry(row)
+
+    def entries(self) -> Sequence[CacheEntry]:
+        """Returns every entry, ordered by path."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM entries ORDER BY path").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def pin(self, path: PathLike) -> None:
+        """Protects a file from eviction. The file doesn't need to exist yet."""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO pins VALUES (?)", (self._key(path),))
+
+    def unpin(self, path: PathLike) -> None:
+        """Removes the pin on a file, if there is one."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pins WHERE path = ?", (self._key(path),))
+
+    def pinned(self) -> Set[str]:
+        """Returns the pinned paths, relative to the cache directory."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT path FROM pins")}
+
+    def paths(self) -> Sequence[Path]:
+        """Returns the absolute paths of every recorded file, ordered by path."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM entries ORDER BY path").fetchall()
+        return [self.cache_dir / row[0] for row in rows]
+
+    @property
+    def n_bytes(self) -> int:
+        """The total size of the recorded files."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(n_bytes), 0) FROM entries").fetchone()[0]
+
+    def rebuild(self) -> None:
+        """
+        Replaces the entries with the files currently in the directory.
+        Only records sizes and modification times; the digests, dtypes, and shapes are left empty.
+        Pins are kept.
+        """
+        logger.info(f"Building the cache manifest for {self.cache_dir}")
+        rows = []
+        for root, dirs, files in os.walk(str(self.cache_dir)):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if name.startswith("."):
+                    continue
+                full = Path(root, name)
+                stat = full.stat()
+                key = self._key(full)
+                mtime = stat.st_mtime
+                rows.append((key, None, None, stat.st_size, None, None, None, mtime, mtime, 0))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM entries")
+            self._conn.executemany(f"INSERT INTO entries ({_COLUMNS}) VALUES ({_SLOTS})", rows)
+            self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        """Closes the connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _key(self, path: PathLike) -> str:
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(self.cache_dir)
+            except ValueError:
+                # e.g. through a symlink
+                path = path.resolve().relative_to(self.cache_dir.resolve())
+        return path.as_posix()
+
+    def _sha1(self, path: Path) -> str:
+        h = hashlib.sha1()
+        with path.open("rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def _entry(self, row) -> CacheEntry:
+        return CacheEntry(
+            *row[:7],
+            created=datetime.fromtimestamp(row[7]),
+            accessed=datetime.fromtimestamp(row[8]),
+            hits=row[9],
+        )
+
+    def __contains__(self, path: PathLike) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM entries WHERE path = ?", (self._key(path),)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self.cache_dir}')"
+
+    def __str__(self):
+        return repr(self)
+
+
+__all__ = ["CacheEntry", "CacheManifest"]
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from sauronlab.core.core_imports import *
+from sauronlab.model.features import DerivedFeature, FeatureType, FeatureTypes
+from sauronlab.model.well_frames import *
+
+
+class WellFeatureWriter:
+    """
+    Writes feature arrays to ``well_features`` in bulk, such as to backfill a newly derived feature.
+    All of the rows for a call are written in one transaction, with multi-row inserts,
+    so a run (or frame) is written completely or not at all.
+    Requires write access (``VALAR.backend.enable_write()``).
+
+    Examples:
+        Backfilling a feature for every well of a run::
+
+            writer = WellFeatureWriter(FeatureTypes.cd_10)
+            writer.write_run(1234, {i: arr for i, arr in zip(well_indices, arrays)})
+    """
+
+    def __init__(
+        self,
+        feature: Union[FeatureType, str],
+        replace: bool = False,
+        max_batch_bytes: int = 16 * 1024 * 1024,
+    ):
+        """
+
+        Args:
+            feature: The feature type (or its internal name) to write; must not be interpolated or derived
+            replace: Replace existing rows for the same wells and feature;
+                     otherwise, finding any raises an ``AlreadyUsedError``
+            max_batch_bytes: The approximate maximum size of the blobs in each INSERT statement;
+                             keep this under the server's ``max_allowed_packet``
+
+        Raises:
+            XValueError: If the feature is interpolated or derived, since ``well_features`` holds the raw values
+        """
+        feature = FeatureTypes.of(feature)
+        if isinstance(feature, DerivedFeature):
+            raise XValueError(f"Can't write derived feature {feature}; it's cached, not stored")
+        if feature.is_interpolated:
+            raise XValueError(f"Can't write interpolated feature {feature}; write the raw values")
+        self._feature = feature
+        self._replace = replace
+        self._max_batch_bytes = max_batch_bytes
+
+    @property
+    def feature(self) -> FeatureType:
+        """"""
+        return self._feature
+
+    def write_run(self, run: RunLike, arrays: Mapping[int, np.array]) -> int:
+        """
+        Writes the features of wells in a run, in one transaction.
+
+        Args:
+            run: A run ID, name, tag, instance, or submission hash or instance
+            arrays: A mapping from well indices (starting at 1) to the feature arrays
+
+        Returns:
+            The number of rows written
+
+        Raises:
+            ValarLookupError: If a well index isn't in the run
+        """
+        run = Tools.run(run)
+        well_ids = {
+            w.well_index: w.id
+            for w in Wells.select(Wells.id, Wells.well_index).where(Wells.run_id == run.id)
+        }
+        missing = [i for i in arrays.keys() if i not in well_ids]
+        if len(missing) > 0:
+            raise ValarLookupError(f"Well indices {missing} are not in run r{run.id}")
+        return self.write({well_ids[i]: arr for i, arr in arrays.items()})
+
+    def write_frame(self, df: WellFrame) -> int:
+        """
+        Writes the features of every well in a WellFrame, in one transaction.
+        Each row is written in full, so trailing NaN padding would be written too.
+
+        Args:
+            df: A WellFrame with a ``well`` column of well IDs
+
+        Returns:
+            The number of rows written
+        """
+        return self.write(dict(zip(df["well"].values, df.values)))
+
+    def write(self, arrays: Mapping[Union[Wells, int], np.array]) -> int:
+        """
+        Writes the features of any wells, in one transaction.
+        The arrays are converted to float32 (if needed) and encoded with ``FeatureType.to_blob``.
+
+        Args:
+            arrays: A mapping from wells or their IDs to the feature arrays
+
+        Returns:
+            The number of rows written
+
+        Raises:
+            AlreadyUsedError: If ``replace`` is False and any of the wells already has the feature
+        """
+        rows = [
+            self._row(int(well.id if isinstance(well, Wells) else well), arr)
+            for well, arr in arrays.items()
+        ]
+        if len(rows) == 0:
+            return 0
+        well_ids = [r["well"] for r in rows]
+        type_id = self._feature.valar_feature.id
+        existing = (
+            WellFeatures.select(WellFeatures.id)
+            .where(WellFeatures.type_id == type_id)
+            .where(WellFeatures.well_id << well_ids)
+        )
+        with WellFeatures._meta.database.atomic():
+            if self._replace:
+                n_deleted = (
+                    WellFeatures.delete()
+                    .where(WellFeatures.type_id == type_id)
+                    .where(WellFeatures.well_id << well_ids)
+                    .execute()
+                )
+                logger.debug(f"Deleted {n_deleted} existing {self._feature} rows")
+            elif existing.exists():
+                raise AlreadyUsedError(
+                    f"{existing.count()} of the wells already have feature {self._feature}"
+                )
+            for batch in self._batches(rows):
+                WellFeatures.insert_many(batch).execute()
+        logger.info(f"Wrote {self._feature} for {len(rows)} wells")
+        return len(rows)
+
+    def _row(self, well_id: int, arr: np.array) -> Mapping[str, Any]:
+        blob = self._feature.to_blob(np.asarray(arr).astype(np.float32, copy=False))
+        return dict(
+            well=well_id,
+            type=self._feature.valar_feature.id,
+            floats=blob,
+            sha1=hashlib.sha1(blob).digest(),  # nosec
+        )
+
+    def _batches(self, rows: Sequence[Mapping[str, Any]]) -> Iterator[Sequence[Mapping[str, Any]]]:
+        batch, n_bytes = [], 0
+        for row in rows:
+            if len(batch) > 0 and n_bytes + len(row["floats"]) > self._max_batch_bytes:
+                yield batch
+                batch, n_bytes = [], 0
+            batch.append(row)
+            n_bytes += len(row["floats"])
+        if len(batch) > 0:
+            yield batch
+
+
+__all__ = ["WellFeatureWriter"]
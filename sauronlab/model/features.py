@@ -1,3 +1,4 @@
+import inspect
 from dataclasses import dataclass
 from sauronlab.calc.feature_interpolation import *
 from sauronlab.core.core_imports import *
@@ -41,24 +42,22 @@ class FeatureType:
         stim_timestamps: Optional[np.array],
         well: Union[Wells, int],
         stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
     ) -> np.array:
         """
 
 
         Args:
             wf: WellFeatures:
-            frame_timestamps: Required if is_interpolated
-            stim_timestamps: Required if is_interpolated
+            frame_timestamps: Used if is_interpolated; if None, gets them from ``run_timing_cache``
+            stim_timestamps: Used if is_interpolated; if None, gets them from ``run_timing_cache``
             well:
             stringent:
+            window: Set if ``wf.floats`` holds only part of the array (see ``FeatureWindow``)
 
         Returns:
 
         """
-        if self.is_interpolated and (frame_timestamps is None or stim_timestamps is None):
-            raise ValueError(
-                f"frame_timestamps and stim_timestamps must be non-None for interpolated feature ${self.internal_name}"
-            )
         if well is None and wf is not None:
             well = wf.well
         elif well is not None and wf is None:
@@ -71,7 +70,7 @@ class FeatureType:
             if wf is None:
                 raise ValarLookupError(f"No feature {self.valar_feature.name} for well {well}")
         return self.from_blob(
-            wf.floats, frame_timestamps, stim_timestamps, well, stringent=stringent
+            wf.floats, frame_timestamps, stim_timestamps, well, stringent=stringent, window=window
         )
 
     @abcd.abstractmethod
@@ -93,6 +92,7 @@ class FeatureType:
         stim_timestamps: np.array,
         well: Union[Wells, int],
         stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
     ):
         """
 
@@ -103,12 +103,61 @@ class FeatureType:
             frame_timestamps:
             stim_timestamps:
             stringent:
+            window:
 
         Returns:
 
         """
         raise NotImplementedError()
 
+    @abcd.abstractmethod
+    def decode(
+        self, blob: bytes, well: Union[Wells, int], window: Optional[FeatureWindow] = None
+    ) -> np.array:
+        """
+        Decodes a blob into the raw, frame-by-frame values, without interpolating.
+
+        Args:
+            blob: bytes:
+            well:
+            window:
+
+        Returns:
+
+        """
+        raise NotImplementedError()
+
+    @abcd.abstractmethod
+    def decode_many(
+        self, blobs: Sequence[bytes], wells: Sequence[Union[Wells, int]], offset: int = 0
+    ) -> Tup[np.array, np.array]:
+        """
+        Decodes many blobs at once into the raw, frame-by-frame values, without interpolating.
+
+        Args:
+            blobs: The blobs
+            wells: The wells or their IDs, in the same order
+            offset: The index of the first value in each blob (see ``FeatureWindow.offset``)
+
+        Returns:
+            A tuple of (matrix, lengths) (see ``Tools.blobs_to_signed_floats``)
+
+        """
+        raise NotImplementedError()
+
+    def transform(self, matrix: np.array) -> np.array:
+        """
+        Transforms the decoded (and interpolated) wells-by-frames matrix of one run.
+        Returns the matrix unchanged, except for derived features (see ``DerivedFeature``).
+
+        Args:
+            matrix: The NaN-padded features, with one row per well
+
+        Returns:
+
+        """
+        return matrix
+
     def __repr__(self):
         return self.valar_feature.name + ("[⌇]" if self.is_interpolated else "")
 
@@ -132,6 +181,7 @@ class _ConsecutiveFrameFeature(FeatureType, metaclass=abcd.ABCMeta):
         stim_timestamps: Optional[np.array],
         well: Union[Wells, int],
         stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
     ) -> np.array:
         """
 
@@ -142,25 +192,61 @@ class _ConsecutiveFrameFeature(FeatureType, metaclass=abcd.ABCMeta):
             frame_timestamps:
             stim_timestamps:
             stringent:
+            window: Set if ``blob`` holds only part of the array;
+                    non-interpolated features are returned as-is
 
         Returns:
 
         """
-        well = Wells.fetch(well)
-        if len(blob) == 0:
-            logger.warning(f"Empty {self.valar_feature.name} feature array for well {well.id}")
-            return np.empty(0, dtype=np.float32)
-        floats = Tools.blob_to_signed_floats(blob)
-        floats.setflags(write=1)  # blob_to_floats gets read-only arrays
-        # Previously, MI at t=0 was defined to be 0. Since Valar2, it's defined to be NaN.
-        # This won't affect visualization but could affect analysis, so let's always set it to be NaN.
-        floats[0] = 0.0
-        if self.is_interpolated:
+        floats = self.decode(blob, well, window)
+        if self.is_interpolated and len(floats) > 0:
             return FeatureInterpolation(self.valar_feature).interpolate(
-                floats, frame_timestamps, stim_timestamps, well, stringent=stringent
+                floats, frame_timestamps, stim_timestamps, well, stringent=stringent, window=window
             )
         return floats
 
+    def decode(
+        self, blob: bytes, well: Union[Wells, int], window: Optional[FeatureWindow] = None
+    ) -> np.array:
+        """
+        Decodes a blob into the raw, frame-by-frame values, without interpolating.
+
+        Args:
+            blob: bytes:
+            well: The well or its ID; only used in the warning for an empty blob
+            window: Set if ``blob`` holds only part of the array
+
+        Returns:
+
+        """
+        matrix, lengths = self.decode_many([blob], [well], 0 if window is None else window.offset)
+        return matrix[0, : lengths[0]]
+
+    def decode_many(
+        self, blobs: Sequence[bytes], wells: Sequence[Union[Wells, int]], offset: int = 0
+    ) -> Tup[np.array, np.array]:
+        """
+        Decodes many blobs at once into the raw, frame-by-frame values, without interpolating.
+
+        Args:
+            blobs: The blobs
+            wells: The wells or their IDs, in the same order; only used in the warning for empty blobs
+            offset: The index of the first value in each blob (see ``FeatureWindow.offset``)
+
+        Returns:
+            A tuple of (matrix, lengths) (see ``Tools.blobs_to_signed_floats``)
+
+        """
+        matrix, lengths = Tools.blobs_to_signed_floats(blobs)
+        for i in np.flatnonzero(lengths == 0):
+            well = wells[i].id if isinstance(wells[i], Wells) else wells[i]
+            logger.warning(f"Empty {self.valar_feature.name} feature array for well {well}")
+        # Previously, MI at t=0 was defined to be 0. Since Valar2, it's defined to be NaN.
+        # This won't affect visualization but could affect analysis, so let's always set it to be NaN.
+        if offset == 0 and matrix.shape[1] > 0:
+            matrix[lengths > 0, 0] = 0.0
+        return matrix, lengths
+
 
 class _Mi(_ConsecutiveFrameFeature):
     """"""
@@ -211,6 +297,172 @@ class _Diff(_ConsecutiveFrameFeature):
         return Tools.array_to_blob(arr, np.float32)
 
 
+@dataclass(frozen=True)
+class Derivation:
+    """
+    A registered way to derive a feature (see ``DerivedFeatures.register``).
+
+    Attributes:
+        name: A name that is unique among derivations, made of word characters only
+        version: The version of the code; bump it whenever the results change, to rebuild caches
+        function: Maps a wells-by-frames matrix of one run and keyword parameters to a new matrix
+                  with the same number of rows; rows are NaN-padded to the same length
+        defaults: The default values of the keyword parameters
+    """
+
+    name: str
+    version: int
+    function: Callable[..., np.array]
+    defaults: Mapping[str, Any]
+
+    def params(self, **params) -> Tup[Tup[str, Any], ...]:
+        """
+        Fills in the defaults and puts the parameters in a canonical order.
+
+        Raises:
+            XTypeError: If a parameter is unknown or isn't an int, float, str, bool, or None
+            XValueError: If a string parameter contains characters that can't go in a name
+        """
+        unknown = set(params.keys()) - set(self.defaults.keys())
+        if len(unknown) > 0:
+            raise XTypeError(f"Unknown parameter(s) {unknown} for derivation {self.name}")
+        params = {**self.defaults, **params}
+        for k, v in params.items():
+            if v is not None and not isinstance(v, (int, float, str, bool)):
+                raise XTypeError(f"Parameter {k}={v} of {self.name} is a {type(v)}")
+            if isinstance(v, str) and not re.fullmatch(r"[\w.+\-]*", v):
+                raise XValueError(f"Parameter {k}={v} of {self.name} has disallowed characters")
+        return tuple(sorted(params.items()))
+
+
+@dataclass(frozen=True, eq=False, repr=False)
+class DerivedFeature(FeatureType):
+    """
+    A feature computed from a base ``FeatureType`` by a registered ``Derivation``.
+    It can be used anywhere that a ``FeatureType`` can:
+    ``WellFrameBuilder`` fetches the base feature and derives from each run's matrix at once,
+    and a ``WellCache`` stores the results in a directory named by ``internal_name``,
+    which includes the base feature, the parameters, and the version of the code.
+    So each run is derived once per cache directory, and bumping the version starts afresh.
+    Get instances with ``DerivedFeatures.of``.
+
+    Attributes:
+        base: The feature derived from
+        derivation: The registered derivation
+        params: The parameters in canonical order (see ``Derivation.params``)
+    """
+
+    base: FeatureType
+    derivation: Derivation
+    params: Tup[Tup[str, Any], ...]
+
+    @property
+    def internal_name(self):
+        params = ",".join(f"{k}={v}" for k, v in self.params)
+        return (
+            f"{self.derivation.name}({params})[{self.base.internal_name}]v{self.derivation.version}"
+        )
+
+    @property
+    def external_name(self):
+        params = ",".join(f"{k}={v}" for k, v in self.params)
+        return f"{self.derivation.name}({params})[{self.base.external_name}]"
+
+    def to_blob(self, arr: np.array) -> None:
+        """
+        Derived features are cached locally, not stored in Valar.
+
+        Raises:
+            UnsupportedOpError: Always
+        """
+        raise UnsupportedOpError(f"Derived feature {self} is not stored in Valar")
+
+    def from_blob(
+        self,
+        blob: bytes,
+        frame_timestamps: Optional[np.array],
+        stim_timestamps: Optional[np.array],
+        well: Union[Wells, int],
+        stringent: bool = False,
+        window: Optional[FeatureWindow] = None,
+    ) -> np.array:
+        """
+        Computes the root feature from a blob of it, then derives from the one well.
+        Prefer ``WellFrameBuilder`` (or a cache), which derives from each run at once.
+
+        Args:
+            blob: The blob of the root feature
+            frame_timestamps:
+            stim_timestamps:
+            well:
+            stringent:
+            window:
+
+        Returns:
+
+        """
+        arr = self.root.from_blob(
+            blob, frame_timestamps, stim_timestamps, well, stringent=stringent, window=window
+        )
+        if len(arr) == 0:
+            return arr
+        return self.transform(arr[np.newaxis, :])[0]
+
+    def decode(
+        self, blob: bytes, well: Union[Wells, int], window: Optional[FeatureWindow] = None
+    ) -> np.array:
+        """
+        Decodes a blob of the base feature, without deriving.
+        """
+        return self.base.decode(blob, well, window)
+
+    def decode_many(
+        self, blobs: Sequence[bytes], wells: Sequence[Union[Wells, int]], offset: int = 0
+    ) -> Tup[np.array, np.array]:
+        """
+        Decodes blobs of the base feature, without deriving.
+        """
+        return self.base.decode_many(blobs, wells, offset)
+
+    def transform(self, matrix: np.array) -> np.array:
+        """
+        Derives from the wells-by-frames matrix of one run.
+
+        Args:
+            matrix: The root (non-derived) feature, with one row per well
+
+        Returns:
+            The derived matrix, with the same number of rows
+
+        Raises:
+            LengthMismatchError: If the derivation changed the number of rows
+        """
+        # a nested derived feature derives from its base's results
+        derived = np.asarray(
+            self.derivation.function(self.base.transform(matrix), **dict(self.params))
+        )
+        if derived.ndim != 2 or derived.shape[0] != matrix.shape[0]:
+            raise LengthMismatchError(
+                f"Derivation {self.derivation.name} returned shape {derived.shape} from {matrix.shape}"
+            )
+        return derived
+
+    @property
+    def root(self) -> FeatureType:
+        """The non-derived feature at the bottom of any nesting."""
+        return self.base.root if isinstance(self.base, DerivedFeature) else self.base
+
+    def __repr__(self):
+        return self.external_name
+
+    def __eq__(self, other):
+        # the internal name includes the base, the parameters, and the version
+        return isinstance(other, DerivedFeature) and other.internal_name == self.internal_name
+
+    def __hash__(self):
+        return hash(self.internal_name)
+
+
 class FeatureTypes:
     """
     The feature types in valar.features.
@@ -228,7 +480,8 @@ class FeatureTypes:
         Fetches a feature from its **internal** name.
 
         Args:
-            f: A value in FeatureType.internal_name in one of the FeatureType entries in ``FeatureTypes.known``
+            f: A value in FeatureType.internal_name in one of the FeatureType entries in ``FeatureTypes.known``,
+               or the internal name of a ``DerivedFeature``
 
         Returns:
             The FeatureType
@@ -245,7 +498,152 @@ class FeatureTypes:
         for v in FeatureTypes.known:
             if v.internal_name == f:
                 return v
+        derived = DerivedFeatures.parse(f)
+        if derived is not None:
+            return derived
         raise ValarLookupError(f"No feature {f}")
 
 
-__all__ = ["FeatureType", "FeatureTypes"]
+class DerivedFeatures:
+    """
+    The registry of derivations, which turn base features into ``DerivedFeature`` instances.
+
+    Examples:
+        Registering a derivation and using it in place of a ``FeatureType``::
+
+            @DerivedFeatures.register("clip", version=1)
+            def clip(matrix: np.array, upper: float = 1.0) -> np.array:
+                return np.minimum(matrix, upper)
+
+            feature = DerivedFeatures.of("clip", FeatureTypes.MI, upper=0.5)
+            df = WellCache(feature).load(1234)
+    """
+
+    _derivations: Dict[str, Derivation] = {}
+    _pattern = re.compile(r"^(\w+)\(([^()\[\]]*)\)\[(.+)\]v([0-9]+)$")
+
+    @classmethod
+    def register(cls, name: str, version: int = 1) -> Callable[[Callable], Callable]:
+        """
+        Returns a decorator that registers a function as a derivation.
+        The function's first argument is the wells-by-frames matrix of a run;
+        every other argument is a parameter and must have a default.
+
+        Args:
+            name: A unique name, made of word characters only
+            version: The version of the code; bump it whenever the results change
+
+        Raises:
+            AlreadyUsedError: If a different function is registered with the same name
+        """
+
+        def decorator(function: Callable) -> Callable:
+            if not re.fullmatch(r"\w+", name):
+                raise XValueError(f"Derivation name {name} must be word characters only")
+            if name in cls._derivations and cls._derivations[name].function is not function:
+                raise AlreadyUsedError(f"Derivation {name} is already registered")
+            parameters = list(inspect.signature(function).parameters.values())[1:]
+            missing = [p.name for p in parameters if p.default is inspect.Parameter.empty]
+            if len(missing) > 0:
+                raise XValueError(f"Parameters {missing} of derivation {name} have no defaults")
+            defaults = {p.name: p.default for p in parameters}
+            cls._derivations[name] = Derivation(name, version, function, defaults)
+            return function
+
+        return decorator
+
+    @classmethod
+    def names(cls) -> Sequence[str]:
+        """Returns the names of the registered derivations."""
+        return list(cls._derivations.keys())
+
+    @classmethod
+    def get(cls, name: str) -> Derivation:
+        """
+        Returns a registered derivation.
+
+        Raises:
+            ValarLookupError: If it isn't registered
+        """
+        if name not in cls._derivations:
+            raise ValarLookupError(f"No derivation {name}; registered are {cls.names()}")
+        return cls._derivations[name]
+
+    @classmethod
+    def of(cls, name: str, base: Union[FeatureType, str], **params) -> DerivedFeature:
+        """
+        Gets a derived feature.
+
+        Args:
+            name: The name of a registered derivation
+            base: The feature to derive from, or its internal name; may itself be derived
+            params: Parameters to the derivation; the rest take their defaults
+
+        Returns:
+
+        """
+        derivation = cls.get(name)
+        base = FeatureTypes.of(base)
+        return DerivedFeature(
+            base.valar_feature,
+            base.time_dependent,
+            base.stride_in_bytes,
+            base.recommended_scale,
+            base.recommended_unit,
+            base.is_interpolated,
+            base.generations,
+            base,
+            derivation,
+            derivation.params(**params),
+        )
+
+    @classmethod
+    def parse(cls, internal_name: str) -> Optional[DerivedFeature]:
+        """
+        Gets a derived feature from its internal name, such as ``smooth(window_size=10,window_type=triang)[MI]v1``.
+
+        Returns:
+            The feature, or None if the name isn't in the form of a derived feature
+
+        Raises:
+            ValarLookupError: If the derivation isn't registered, or is registered with a different version
+        """
+        match = cls._pattern.fullmatch(internal_name)
+        if match is None:
+            return None
+        name, params, base, version = match.groups()
+        if int(version) != cls.get(name).version:
+            raise ValarLookupError(
+                f"{internal_name} is from version {version} of {name}, but the code is at {cls.get(name).version}"
+            )
+        params = dict(p.split("=", 1) for p in params.split(",") if p != "")
+        return cls.of(name, base, **{k: cls._parse_value(v) for k, v in params.items()})
+
+    @classmethod
+    def _parse_value(cls, value: str) -> Any:
+        if value in {"None", "True", "False"}:
+            return {"None": None, "True": True, "False": False}[value]
+        for t in [int, float]:
+            try:
+                return t(value)
+            except ValueError:
+                pass
+        return value
+
+
+@DerivedFeatures.register("smooth", version=1)
+def _smooth(
+    matrix: np.array, window_size: int = 10, window_type: Optional[str] = "triang"
+) -> np.array:
+    # as in WellFrame.smooth with the default mean; rolling down the transpose does all wells at once
+    rolling = pd.DataFrame(matrix.T).rolling(window_size, min_periods=1, win_type=window_type)
+    return rolling.mean().values.T
+
+
+@DerivedFeatures.register("threshold_zeros", version=1)
+def _threshold_zeros(matrix: np.array, lower: float = 0.0) -> np.array:
+    # as in WellFrame.threshold_zeros; NaN padding stays NaN
+    return (np.abs(matrix) >= lower) * matrix
+
+
+__all__ = ["FeatureType", "FeatureTypes", "Derivation", "DerivedFeature", "DerivedFeatures"]
@@ -3,6 +3,7 @@ from __future__ import annotations
 from PIL import Image, ImageDraw
 from scipy.interpolate import interp1d
 
+from sauronlab.calc.run_metadata import run_metadata
 from sauronlab.core.core_imports import *
 from sauronlab.core.valar_singleton import *
 from sauronlab.model.audio import *
@@ -32,7 +33,7 @@ class _AbsBatteryTimeData(metaclass=abc.ABCMeta):
             start_ms: From the stimulus_millis sensor: specifically ``stimulus_millis[0]``
             end_ms:From the stimulus_millis sensor: specifically ``stimulus_millis[-1]``
         """
-        self.run, self.start_ms, self.end_ms = Tools.run(run), int(start_ms), int(end_ms)
+        self.run, self.start_ms, self.end_ms = run_metadata.run(run), int(start_ms), int(end_ms)
 
     @property
     def start_dt(self) -> datetime:
@@ -103,7 +104,7 @@ class SauronlabSensor:
 
         """
         self._sensor_data = sensor_data
-        self._run = Runs.fetch(run)
+        self._run = run_metadata.run(run)
 
     @property
     def run(self) -> Runs:
@@ -155,7 +156,7 @@ class TimeDataSensor(SauronlabSensor, metaclass=abc.ABCMeta):
 
     def __init__(self, run: RunLike, battery_data: np.array):
         super().__init__(run, battery_data)
-        self.planned_battery_n_ms = run.experiment.battery.length
+        self.planned_battery_n_ms = run_metadata.battery_length(run)
 
     def timestamps(self) -> Sequence[datetime]:
         """ """
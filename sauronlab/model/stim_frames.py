@@ -149,21 +149,25 @@ class StimFrame(TypedDf, metaclass=abc.ABCMeta):
 
     @classmethod
     def _slice_stim(
-        cls, stimframes, name: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None
+        cls,
+        stimframes,
+        battery: Union[Batteries, str],
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
     ) -> StimFrame:
         """
 
 
         Args:
             stimframes:
-            name: str:
+            battery: A battery instance, which avoids a query, or name
             start_ms:
             end_ms:
 
         Returns:
 
         """
-        stimframes_per_ms = 25 / 1000 if ValarTools.battery_is_legacy(name) else 1
+        stimframes_per_ms = 25 / 1000 if ValarTools.battery_is_legacy(battery) else 1
         start_ms = 0 if start_ms is None else start_ms
         end_ms = len(stimframes) / stimframes_per_ms if end_ms is None else end_ms
         # return stimframes[int(np.floor(stimframes_per_ms * start_ms)) : int(np.ceil(stimframes_per_ms * end_ms))]
@@ -208,9 +212,9 @@ class StimFrame(TypedDf, metaclass=abc.ABCMeta):
             start_index = fdf.start.loc[idx]
             assay_frames = fdf.frames.loc[idx]
             stim_name = fdf.stimulus.loc[idx]
-            empty_df.loc[
-                start_index : start_index + len(assay_frames) - 1, stim_name
-            ] = assay_frames
+            empty_df.loc[start_index : start_index + len(assay_frames) - 1, stim_name] = (
+                assay_frames
+            )
         stimframes = empty_df.fillna(0)
         stimframes.index.name = "ms"
         if fps_for_sampling is not None:
@@ -244,7 +248,8 @@ class BatteryStimFrame(StimFrame):
         Returns:
 
         """
-        battery = battery if isinstance(battery, str) else Batteries.fetch(battery).name
+        if not isinstance(battery, (Batteries, str)):
+            battery = Batteries.fetch(battery)
         rdf = StimFrame._slice_stim(self, battery, start_ms, end_ms)
         rdf.__class__ = self.__class__
         # noinspection PyTypeChecker
@@ -282,7 +287,7 @@ class BatteryStimFrame(StimFrame):
         """
         battery = Batteries.fetch(battery)  # type: Batteries
         stimframes = StimFrame._generate_stimframes(battery, None)
-        stimframes = StimFrame._slice_stim(stimframes, battery.name, start_ms, end_ms)
+        stimframes = StimFrame._slice_stim(stimframes, battery, start_ms, end_ms)
 
         return cls._gen_from(battery)(stimframes)
 
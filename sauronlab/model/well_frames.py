@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pandas.core.groupby import GroupBy
 
+from sauronlab.calc.run_metadata import run_metadata
 from sauronlab.core.core_imports import *
 from sauronlab.model.compound_names import *
 from sauronlab.model.treatments import *
@@ -39,12 +40,14 @@ class AbsWellFrame(TypedDf):
         # Feather requires str column names
         df.columns = df.columns.astype(int)
         df = df.reset_index()
-        df["treatments"] = df["treatments"].map(Treatments.deserialize)
+        # these are dictionary-encoded, so only decode each distinct value once
+        tools = WellFrameColumnTools
+        df["treatments"] = tools.decode_distinct(df["treatments"], Treatments.deserialize)
         # full width vertical bar (｜, U+FF5C)
-        for c in WellFrameColumnTools._o_tuple_int_cols:
-            df[c] = df[c].map(WellFrameColumnTools.deserialize_oint_tuple)
-        for c in WellFrameColumnTools._o_tuple_str_cols:
-            df[c] = df[c].map(WellFrameColumnTools.deserialize_ostr_tuple)
+        for c in tools._o_tuple_int_cols:
+            df[c] = tools.decode_distinct(df[c], tools.deserialize_oint_tuple)
+        for c in tools._o_tuple_str_cols:
+            df[c] = tools.decode_distinct(df[c], tools.deserialize_ostr_tuple)
         return cls.convert(df)
 
     def serialize(self) -> SerializedWellFrame:
@@ -52,11 +55,15 @@ class AbsWellFrame(TypedDf):
         df.__class__ = pd.DataFrame
         # Feather requires str column names
         df.columns = df.columns.astype(str)
-        df["treatments"] = df["treatments"].map(Treatments.serialize)
-        for c in WellFrameColumnTools._o_tuple_int_cols:
-            df[c] = df[c].map(WellFrameColumnTools.serialize_oint_tuple)
-        for c in WellFrameColumnTools._o_tuple_str_cols:
-            df[c] = df[c].map(WellFrameColumnTools.serialize_ostr_tuple)
+        # a run has only a few distinct values, so store them once and a code per well
+        tools = WellFrameColumnTools
+        df["treatments"] = tools.encode_distinct(
+            df["treatments"], Treatments.serialize, key=lambda t: tuple(t.treatments)
+        )
+        for c in tools._o_tuple_int_cols:
+            df[c] = tools.encode_distinct(df[c], tools.serialize_oint_tuple)
+        for c in tools._o_tuple_str_cols:
+            df[c] = tools.encode_distinct(df[c], tools.serialize_ostr_tuple)
         return SerializedWellFrame(df)
 
     def meta(self) -> __qualname__:
@@ -235,7 +242,7 @@ class AbsWellFrame(TypedDf):
         """
         if override_fps is None:
             fps = Tools.only(
-                {ValarTools.frames_per_second(r) for r in self["run"].unique()}, name="framerates"
+                {run_metadata.frames_per_second(r) for r in self["run"].unique()}, name="framerates"
             )
         else:
             fps = override_fps
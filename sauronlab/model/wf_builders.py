@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+from sauronlab.calc.feature_interpolation import FeatureInterpolation, FeatureWindow
+from sauronlab.calc.run_timing import run_timing_cache
 from sauronlab.core.core_imports import *
 from sauronlab.model.compound_names import *
-from sauronlab.model.features import FeatureType, FeatureTypes
+from sauronlab.model.features import DerivedFeature, FeatureType, FeatureTypes
 from sauronlab.model.treatments import Treatments as Treatments
 from sauronlab.model.well_frames import *
 from sauronlab.model.well_names import WellNamer, WellNamers
-from sauronlab.model.sensor_names import SensorNames
 from sauronlab.model.wf_tools import *
 from sauronlab.model.cache_interfaces import ASensorCache
 
@@ -102,6 +103,105 @@ class WellFrameQuery:
         )
 
 
+class WellFrameQueryPlanner:
+    """
+    Builds small queries for (well ID, run ID) tuples, joining only the tables that WHERE expressions use.
+    The joins are the same as in ``WellFrameQuery``, but start from ``Wells``.
+    If an expression contains something the planner can't analyze, it falls back to every join.
+    """
+
+    # each table, with the table it's joined from; parents come before their children
+    joins = [
+        (WellTreatments, Wells, JOIN.LEFT_OUTER),
+        (Batches, WellTreatments, JOIN.LEFT_OUTER),
+        (Compounds, Batches, JOIN.LEFT_OUTER),
+        (Refs, Batches, JOIN.LEFT_OUTER),
+        (ControlTypes, Wells, JOIN.LEFT_OUTER),
+        (GeneticVariants, Wells, JOIN.LEFT_OUTER),
+        (Runs, Wells, JOIN.INNER),
+        (Plates, Runs, JOIN.INNER),
+        (PlateTypes, Plates, JOIN.LEFT_OUTER),
+        (Users, Runs, JOIN.LEFT_OUTER),
+        (Submissions, Runs, JOIN.LEFT_OUTER),
+        (SubmissionRecords, Submissions, JOIN.LEFT_OUTER),
+        (SauronConfigs, Runs, JOIN.LEFT_OUTER),
+        (Saurons, SauronConfigs, JOIN.LEFT_OUTER),
+        (Experiments, Runs, JOIN.INNER),
+        (Projects, Experiments, JOIN.LEFT_OUTER),
+        (ProjectTypes, Projects, JOIN.LEFT_OUTER),
+        (Batteries, Experiments, JOIN.INNER),
+        (TemplatePlates, Experiments, JOIN.LEFT_OUTER),
+    ]
+
+    def __init__(self, wheres: Sequence[ExpressionLike]):
+        self.wheres = list(wheres)
+
+    def build(self) -> peewee.Query:
+        """
+        Returns a query for distinct (well ID, run ID) tuples, ordered by run ID, then well ID.
+        """
+        tables = self.tables()
+        if tables is None:
+            logger.debug("Can't plan the query; using all joins")
+            query = WellFrameQuery().build(WellFrameQuery.no_fields())
+        else:
+            query = Wells.select(*WellFrameQuery.no_fields())
+            for table, parent, join_type in self.joins:
+                if table in tables:
+                    query = query.switch(parent).join(table, join_type)
+        for where in self.wheres:
+            query = query.where(where)
+        return query.distinct().order_by(*WellFrameQuery.sort_order()).tuples()
+
+    def tables(self) -> Optional[Set[Type[peewee.Model]]]:
+        """
+        Returns the tables that need to be joined, including those needed to reach them,
+        or None if the WHERE expressions can't be analyzed.
+        """
+        parent_of = {table: parent for table, parent, _ in self.joins}
+        needed = set()
+        for where in self.wheres:
+            found = self._tables_in(where)
+            if found is None:
+                return None
+            for table in found:
+                while table is not Wells:
+                    if table not in parent_of:
+                        return None
+                    needed.add(table)
+                    table = parent_of[table]
+        return needed
+
+    def _tables_in(self, node) -> Optional[Set[Type[peewee.Model]]]:
+        if isinstance(node, peewee.Field):
+            return {node.model}
+        if isinstance(node, (peewee.Value, peewee.SQL, peewee.SelectBase)):
+            # a subquery is self-contained
+            return set()
+        if isinstance(node, peewee.Expression):
+            children = [node.lhs, node.rhs]
+        elif isinstance(node, peewee.Function):
+            children = node.arguments
+        elif isinstance(node, peewee.NodeList):
+            children = node.nodes
+        elif isinstance(node, peewee.WrappedNode):
+            children = [node.node]
+        elif isinstance(node, peewee.Node):
+            return None
+        elif isinstance(node, (list, tuple, set, frozenset)):
+            children = node
+        else:
+            # a plain value
+            return set()
+        tables = set()
+        for child in children:
+            found = self._tables_in(child)
+            if found is None:
+                return None
+            tables |= found
+        return tables
+
+
 class AbstractWellFrameBuilder:
     """"""
 
@@ -146,10 +246,12 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         self._compound_namer = None
         self._generation: Optional[DataGeneration] = None
         self._limit: Optional[int] = None
+        self._after: Optional[Tup[int, int]] = None
         self._dtype = None
         self._sensor_cache = None
-        self._frame_timestamp_map: Dict[Runs, np.array] = {}
-        self._stim_timestamp_map: Dict[Runs, np.array] = {}
+        self._chunk_size: Optional[int] = sauronlab_env.feature_chunk_size
+        self._n_jobs: int = sauronlab_env.n_cores
+        self._window_ms: Optional[Tup[int, Optional[int]]] = None
 
     @classmethod
     def wells(
@@ -185,8 +287,61 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         wfb._required_runs = runs
         return wfb
 
-    def with_sensor_cache(self, sensor_cache: ASensorCache) -> WellFrameBuilder:
+    def with_sensor_cache(self, sensor_cache: Optional[ASensorCache]) -> WellFrameBuilder:
+        """
+        Shares the sensor cache's timestamp files with ``run_timing_cache``, which interpolated features use.
+
+        Args:
+            sensor_cache: A sensor cache, or None
+
+        Returns:
+            This builder
+
+        """
         self._sensor_cache = sensor_cache
+        if sensor_cache is not None:
+            run_timing_cache.register_dir(
+                sensor_cache.cache_dir, on_write=sensor_cache.manifest.add
+            )
+        return self
+
+    def with_chunk_size(self, n_wells: Optional[int]) -> WellFrameBuilder:
+        """
+        Sets the number of wells whose features are fetched in each query.
+        Each chunk is decoded into the feature matrix before the next is fetched,
+        so the peak memory is about one chunk of blobs plus the final matrix.
+
+        Args:
+            n_wells: The number of wells per chunk, or None to fetch every well in one query;
+                     defaults to ``sauronlab_env.feature_chunk_size``
+
+        Returns:
+            This builder
+
+        """
+        if n_wells is not None and n_wells < 1:
+            raise OutOfRangeError(f"Chunk size {n_wells} is < 1")
+        self._chunk_size = n_wells
+        return self
+
+    def with_n_jobs(self, n_jobs: int) -> WellFrameBuilder:
+        """
+        Sets the number of threads that fetch and decode (and interpolate) features.
+        Each thread queries one chunk of wells (see ``with_chunk_size``) on its own connection,
+        so the round-trips overlap; set ``db_pool_size`` in the config to reuse connections (see ``ValarPool``).
+        The results are placed in a fixed order.
+        Any error raised by a worker, such as ``FeatureTimestampMismatchError``, is re-raised unchanged.
+
+        Args:
+            n_jobs: The number of threads; 1 disables parallelism; defaults to ``sauronlab_env.n_cores``
+
+        Returns:
+            This builder
+
+        """
+        if n_jobs < 1:
+            raise OutOfRangeError(f"n_jobs {n_jobs} is < 1")
+        self._n_jobs = n_jobs
         return self
 
     def where(self, where: ExpressionsLike) -> WellFrameBuilder:
@@ -209,19 +364,89 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
 
     def limit_to(self, limit: Optional[int]) -> WellFrameBuilder:
         """
-        Gets the first `limit` rows/wells, ordered by run ID, then well index
+        Gets the first `limit` wells, ordered by run ID, then well ID.
+        Equivalent to ``page(None, limit)``.
 
         Args:
-            limit:
+            limit: The maximum number of wells, or None for no limit
 
         Returns:
+            This builder
+
+        """
+        if limit is not None:
+            self.page(None, limit)
+        return self
+
+    def page(self, after: Optional[Tup[int, int]], size: int) -> WellFrameBuilder:
+        """
+        Gets one page of wells, ordered by run ID, then well ID.
+        Uses keyset pagination: the wells matching the WHERE clauses are found first,
+        starting just after ``after`` and limited to ``size`` wells (not treatment rows).
+        Pass ``WellFrameBuilder.cursor_of`` of a page to get the next page.
+        Past the last page, ``build`` raises an ``EmptyCollectionError``.
+
+        Example:
+            Iterating over wells 100 at a time::
+
+                after = None
+                while True:
+                    try:
+                        df = WellFrameBuilder.runs(runs).with_feature("MI").page(after, 100).build()
+                    except EmptyCollectionError:
+                        break
+                    after = WellFrameBuilder.cursor_of(df)
+
+        Args:
+            after: A (run ID, well ID) pair to start after, exclusive; None to start at the beginning
+            size: The maximum number of wells
+
+        Returns:
+            This builder
 
         """
         if self._limit is not None:
             raise ContradictoryRequestError(f"Limit {self._limit} already set")
-        if limit is not None:
-            logger.warning(f"Setting limit {limit} in WellFrameBuilder. This may not always work.")
-            self._limit = limit
+        if size < 1:
+            raise OutOfRangeError(f"Page size {size} is < 1")
+        self._after = after
+        self._limit = size
+        return self
+
+    @classmethod
+    def cursor_of(cls, df: WellFrame) -> Tup[int, int]:
+        """
+        Returns the (run ID, well ID) of the last well in a page, for ``page(after=...)``.
+        """
+        if len(df) == 0:
+            raise EmptyCollectionError("Cannot get the cursor of an empty WellFrame")
+        return max(zip(df["run"].map(int), df["well"].map(int)))
+
+    def with_window(self, start_ms: int, end_ms: Optional[int] = None) -> WellFrameBuilder:
+        """
+        Fetches only the features between two times, like ``WellFrame.slice_ms`` but in the query.
+        The milliseconds are converted to frames using the battery's framerate,
+        and only that part of each feature blob is transferred (via ``SUBSTR``).
+        For interpolated features, the raw frames needed are found from the timestamps,
+        with a margin of 1 second of frames on each side.
+        The feature columns keep their indices; e.g. at 100 fps, ``with_window(1000, 2000)`` gives columns 100–199.
+        All of the runs must have the same framerate.
+
+        Args:
+            start_ms: The millisecond to start at, inclusive
+            end_ms: The millisecond to end at, exclusive; None to go to the end
+
+        Returns:
+            This builder
+
+        """
+        if self._window_ms is not None:
+            raise ContradictoryRequestError(f"Window {self._window_ms} already set")
+        if start_ms < 0:
+            raise OutOfRangeError(f"Start {start_ms}ms is < 0")
+        if end_ms is not None and end_ms <= start_ms:
+            raise OutOfRangeError(f"End {end_ms}ms is <= start {start_ms}ms")
+        self._window_ms = (start_ms, end_ms)
         return self
 
     def with_feature(self, feature: Union[None, str, FeatureType], dtype=None) -> WellFrameBuilder:
@@ -229,7 +454,7 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
 
 
         Args:
-            feature:
+            feature: A FeatureType (which may be a ``DerivedFeature``) or its internal name
             dtype:
 
         Returns:
@@ -310,6 +535,54 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         query = self._select_query()  # takes no time
         return self._build_outer(query)
 
+    def iter_runs(self) -> Iterator[WellFrame]:
+        """
+        Builds one WellFrame per run, lazily. Equivalent to ``iter_chunks(1)``.
+
+        Returns:
+            An iterator of WellFrames in order of run ID
+
+        """
+        return self.iter_chunks(1)
+
+    def iter_chunks(self, n_runs: int) -> Iterator[WellFrame]:
+        """
+        Builds WellFrames for groups of runs, lazily.
+        Performs the metadata query once, then fetches the features for each group only when it's requested,
+        so only one group needs to be held in memory.
+        Applies the same namer, dtype, and generation restriction as ``build``.
+        Note that the namer is applied to each group separately.
+        A group is skipped if the generation restriction removes all of its wells.
+
+        Args:
+            n_runs: The maximum number of runs per WellFrame
+
+        Returns:
+            An iterator of sorted WellFrames, in order of run ID
+
+        """
+        if n_runs < 1:
+            raise OutOfRangeError(f"n_runs {n_runs} is < 1")
+        well_to_treatments = self._select_treatments(self._select_query())
+        by_run: Dict[int, Dict[Wells, List[WellTreatments]]] = defaultdict(dict)
+        for well, treatments in well_to_treatments.items():
+            by_run[well.run_id][well] = treatments
+        run_ids = sorted(by_run.keys())
+        for i in range(0, len(run_ids), n_runs):
+            group = {
+                well: treatments
+                for run_id in run_ids[i : i + n_runs]
+                for well, treatments in by_run[run_id].items()
+            }
+            t0 = time.monotonic()
+            df = self._build_wells(group)
+            logger.debug(
+                f"Built WellFrame for run(s) {Tools.join(run_ids[i : i + n_runs], ',', prefix='r')}."
+                f" Took {round(time.monotonic() - t0, 1)}s."
+            )
+            if len(df) > 0:
+                yield df
+
     def _build_outer(self, query) -> WellFrame:
         """
 
@@ -354,6 +627,20 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
 
         Returns:
 
+        """
+        well_to_treatments = self._select_treatments(query)
+        return self._build_wells(well_to_treatments)
+
+    def _select_treatments(self, query) -> Dict[Wells, List[WellTreatments]]:
+        """
+        Runs the metadata query, mapping each well to its treatments.
+
+        Args:
+            query: The query from ``_select_query``
+
+        Returns:
+            A dict mapping every matched well to its list of WellTreatments with non-null batches
+
         """
         # run select statement
         treatments = list(query)
@@ -364,19 +651,36 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         all_wells = {t.well for t in treatments}
         all_runs = {t.well.run for t in treatments}
         assert None not in all_runs, "'None' is a run ID"
-        for req in self._required_runs:
-            assert req in all_runs, r"Run r{req} was required but not found"
+        # a page (or limit) covers only some of the wells, so it can miss required runs and wells
+        if self._limit is None:
+            for req in self._required_runs:
+                assert req in all_runs, f"Run r{req} was required but not found"
         # map each well to its associated treatments
         well_to_treatments = {w: [] for w in all_wells}
         all_well_ids = {w.id for w in all_wells}
-        for well in self._required_wells:
-            assert well.id in all_well_ids, f"Well {well} was required but not found."
+        if self._limit is None:
+            for well in self._required_wells:
+                assert well.id in all_well_ids, f"Well {well} was required but not found."
         for t in treatments:
             if t.batch_id is not None:  # generally not needed
                 well_to_treatments[t.well].append(t)
+        return well_to_treatments
+
+    def _build_wells(self, well_to_treatments: Mapping[Wells, List[WellTreatments]]) -> WellFrame:
+        """
+        Fetches the features and builds the WellFrame for some already-queried wells.
+
+        Args:
+            well_to_treatments: A dict from ``_select_treatments``, or a subset of one
+
+        Returns:
+            The sorted WellFrame
+
+        """
         # now get the features
+        # the rows of the feature matrix are in the same order as well_to_treatments
         features = self._select_features(well_to_treatments)
-        # now merge the two into a dict from wells to columns
+        # now merge the two column-wise
         df = self._build_df(well_to_treatments, features)
         self._fix_df(df)
         df = self._transform_to_wf(df)
@@ -398,7 +702,7 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
 
         """
         if self._limit is not None:
-            df = df.sort_values(["run", "well_index"]).head(self._limit)
+            df = df.sort_values(["run", "well"]).head(self._limit)
         return df
 
     def _internal_restrict_to_gen(self, df: WellFrame) -> WellFrame:
@@ -454,106 +758,317 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         query = WellFrameQuery().build(WellFrameQuery.fields())
         for where in self._wheres:
             query = query.where(where)
-        query = query.order_by(*WellFrameQuery.sort_order())
         if self._limit is not None:
-            query = query.limit(self._limit)
+            query = query.where(Wells.id << self._select_page_well_ids())
+        query = query.order_by(*WellFrameQuery.sort_order())
         return query
 
-    def _select_features(self, well_to_treatments):
+    def _select_page_well_ids(self) -> List[int]:
+        """
+        Finds the IDs of the wells in the page set by ``page``.
+        This is a separate query because the main query has one row per treatment,
+        and MySQL doesn't support LIMIT inside an IN subquery.
         """
+        wheres = list(self._wheres)
+        if self._after is not None:
+            after_run, after_well = self._after
+            wheres.append(
+                (Wells.run_id > after_run) | ((Wells.run_id == after_run) & (Wells.id > after_well))
+            )
+        query = WellFrameQueryPlanner(wheres).build().limit(self._limit)
+        return [w for w, r in query]
 
+    def _select_features(self, well_to_treatments) -> Optional[pd.DataFrame]:
+        """
+        Fetches and decodes the features into a single matrix.
 
         Args:
-            well_to_treatments:
+            well_to_treatments: A dict mapping wells to their treatments; determines the row order
 
         Returns:
+            A DataFrame with one row per well and int-named columns, or None if no feature was requested
+
+        Raises:
+            NoFeaturesError: If the feature is not defined on one or more of the wells
 
         """
         if self._feature is None:
             return None
-        return {
-            f.well.id: self._calc(f)
-            for f in WellFeatures.select(
-                WellFeatures.id, WellFeatures.well_id, WellFeatures.type_id, WellFeatures.floats
+        wells = list(well_to_treatments.keys())
+        row_of = {w.id: i for i, w in enumerate(wells)}
+        frames = self._window_frames({w.run_id for w in wells})
+        width = self._feature_width(list(row_of.keys()), {w.run_id for w in wells}, frames)
+        matrix = _FeatureMatrix(len(row_of), width, self._matrix_dtype())
+        chunks = list(self._chunk_well_ids(list(row_of.keys())))
+        fetch = partial(self._fetch_chunk, wells=wells, row_of=row_of, frames=frames)
+        if self._n_jobs == 1:
+            for chunk in chunks:
+                if self._feature.is_interpolated:
+                    self._prefetch_timing({wells[row_of[w]].run_id for w in chunk})
+                for row, arr in fetch(chunk):
+                    matrix.put(row, arr)
+        else:
+            # at most n_jobs chunks are in flight, which bounds the memory
+            for i in range(0, len(chunks), self._n_jobs):
+                wave = chunks[i : i + self._n_jobs]
+                if self._feature.is_interpolated:
+                    self._prefetch_timing({wells[row_of[w]].run_id for c in wave for w in c})
+                results = valar_pool.map(lambda c: list(fetch(c)), wave, n_jobs=self._n_jobs)
+                for pairs in results:
+                    for row, arr in pairs:
+                        matrix.put(row, arr)
+        missing = [w for w, i in row_of.items() if not matrix.is_filled(i)]
+        if len(missing) > 0:
+            raise NoFeaturesError(
+                f"The feature {self._feature} is not defined on well(s) {Tools.join(missing, ',')}"
             )
-            .where(WellFeatures.type_id == self._feature.valar_feature.id)
-            .where(WellFeatures.well_id << [w.id for w in well_to_treatments.keys()])
-        }
+        values = matrix.values
+        if isinstance(self._feature, DerivedFeature):
+            values = self._derive(values, wells)
+        first = 0 if frames is None else frames[0]
+        columns = pd.RangeIndex(first, first + values.shape[1])
+        return pd.DataFrame(values, columns=columns, copy=False)
+
+    def _derive(self, values: np.array, wells: Sequence[Wells]) -> np.array:
+        """
+        Applies a derived feature to the matrix of each run at once (see ``DerivedFeature.transform``).
+        Each run's matrix is first trimmed of the NaN padding that only longer runs needed.
+        With a window, the derivation only sees the frames in the window.
 
-    def _calc(self, f: WellFeatures):
-        if self._sensor_cache is not None and self._feature.is_interpolated:
-            frame_timestamps = self._get_timestamps(
-                f.well.run, SensorNames.RAW_CAMERA_MILLIS, self._frame_timestamp_map
-            )
-            stim_timestamps = self._get_timestamps(
-                f.well.run, SensorNames.RAW_STIMULUS_MILLIS, self._stim_timestamp_map
+        Args:
+            values: The matrix of the base feature, with rows in the order of ``wells``
+            wells: The wells
+
+        Returns:
+            A NaN-padded matrix of the derived feature
+        """
+        run_ids = np.array([w.run_id for w in wells])
+        derived = {}
+        for run_id in np.unique(run_ids):
+            rows = np.flatnonzero(run_ids == run_id)
+            sub = values[rows]
+            present = np.flatnonzero(~np.all(np.isnan(sub), axis=0))
+            width = 0 if len(present) == 0 else present[-1] + 1
+            derived[run_id] = rows, self._feature.transform(sub[:, :width])
+        width = max([d.shape[1] for _, d in derived.values()], default=0)
+        results = np.full((len(wells), width), np.nan, dtype=values.dtype)
+        for rows, d in derived.values():
+            results[rows, : d.shape[1]] = d
+        return results
+
+    def _fetch_chunk(
+        self,
+        chunk: Sequence[int],
+        wells: Sequence[Wells],
+        row_of: Mapping[int, int],
+        frames: Optional[Tup[int, Optional[int]]],
+    ) -> Iterator[Tup[int, np.array]]:
+        """
+        Queries the features for a chunk of wells and decodes them.
+        The blobs of the whole chunk are decoded together (see ``FeatureType.decode_many``);
+        then, for interpolated features, each run's wells are interpolated together
+        (see ``FeatureInterpolation.interpolate_run``).
+
+        Args:
+            chunk: The well IDs
+            wells: The wells, in row order
+            row_of: A mapping from well IDs to rows
+            frames: The window in output frames, or None
+
+        Returns:
+            An iterator of (row, array) pairs
+
+        """
+        raw = None
+        if frames is not None:
+            raw = self._raw_range({wells[row_of[w]].run_id for w in chunk}, *frames)
+        fetched = list(self._select_feature_chunk(chunk, raw))
+        rows = [row_of[f.well_id] for f in fetched]
+        windows = [self._feature_window(f, raw, frames) for f in fetched]
+        matrix, lengths = self._feature.decode_many(
+            [f.floats for f in fetched], [wells[row] for row in rows], 0 if raw is None else raw[0]
+        )
+        del fetched
+        if not self._feature.is_interpolated:
+            for i, row in enumerate(rows):
+                yield row, matrix[i, : lengths[i]]
+            return
+        # the wells in a run share the timestamps, so group them by run first
+        grouped = defaultdict(list)
+        for i, row in enumerate(rows):
+            if lengths[i] == 0:
+                yield row, matrix[i, :0]
+                continue
+            window = windows[i]
+            grouped[wells[row].run_id, None if window is None else window.n_total].append(i)
+        interpolation = FeatureInterpolation(self._feature.valar_feature)
+        for (run_id, _), indices in grouped.items():
+            interpolated = interpolation.interpolate_run(
+                matrix[indices, : lengths[indices].max()],
+                run_timing_cache.frame_millis(run_id),
+                run_timing_cache.stimulus_millis(run_id),
+                run_id,
+                window=windows[indices[0]],
+                lengths=lengths[indices],
             )
+            yield from zip([rows[i] for i in indices], interpolated)
+
+    def _feature_width(
+        self, well_ids: Sequence[int], run_ids: Set[int], frames: Optional[Tup[int, Optional[int]]]
+    ) -> int:
+        """
+        Finds a width for the feature matrix that every row fits in, before fetching any features.
+        Interpolated features get one column per ideal frame, which is known from the runs' metadata
+        (with a column to spare for rounding); otherwise, one query finds the longest stored array.
+        """
+        if self._feature.is_interpolated:
+            n_total = 0
+            for r in run_ids:
+                n_ideal = (
+                    run_timing_cache.battery_length(r)
+                    * run_timing_cache.frames_per_second(r)
+                    / 1000
+                )
+                n_total = max(n_total, int(np.ceil(n_ideal)) + 1)
         else:
-            frame_timestamps = None
-            stim_timestamps = None
-        return self._feature.calc(f, frame_timestamps, stim_timestamps, f.well)
-
-    def _get_timestamps(
-        self, run: Runs, name: SensorNames, mapping: Dict[Runs, np.array]
-    ) -> Optional[np.array]:
-        generation = ValarTools.generation_of(run)
-        if run in mapping:
-            return mapping[run]
-        else:
-            sensor = ValarTools.standard_sensor(name, generation)
-            sensor_data: SensorData = (
-                SensorData.select()
-                .where(SensorData.sensor_id == sensor.id)
-                .where(SensorData.run_id == run.id)
-                .first()
+            n_bytes = (
+                WellFeatures.select(fn.MAX(fn.LENGTH(WellFeatures.floats)))
+                .where(WellFeatures.type_id == self._feature.valar_feature.id)
+                .where(WellFeatures.well_id << well_ids)
+                .scalar()
             )
-            return ValarTools.convert_sensor_data_from_bytes(sensor, sensor_data.floats)
+            n_total = 0 if n_bytes is None else n_bytes // self._feature.stride_in_bytes
+        if frames is None:
+            return n_total
+        start, end = frames
+        return max(0, (n_total if end is None else min(end, n_total)) - start)
 
-    def _build_df(self, well_to_treatments, features):
+    def _window_frames(self, run_ids: Set[int]) -> Optional[Tup[int, Optional[int]]]:
         """
+        Converts the window in milliseconds to output frames, exactly as ``WellFrame.slice_ms`` does.
+        """
+        if self._window_ms is None:
+            return None
+        start_ms, end_ms = self._window_ms
+        fps = Tools.only(
+            {run_timing_cache.frames_per_second(r) for r in run_ids}, name="framerates"
+        )
+        start = int(np.floor(start_ms * fps / 1000))
+        end = None if end_ms is None else int(np.ceil(end_ms * fps / 1000))
+        return start, end
 
+    def _raw_range(
+        self, run_ids: Set[int], start: int, end: Optional[int]
+    ) -> Tup[int, Optional[int]]:
+        """
+        Finds the part of the stored arrays to fetch for a chunk of wells.
+        Non-interpolated features are stored frame-for-frame,
+        but interpolated ones need the part of the raw frames that covers all of the runs.
+        """
+        if not self._feature.is_interpolated:
+            return start, end
+        interpolation = FeatureInterpolation(self._feature.valar_feature)
+        ranges = [
+            interpolation.raw_frame_range(
+                r, start, end, margin=run_timing_cache.frames_per_second(r)
+            )
+            for r in run_ids
+        ]
+        raw_start = min(r[0] for r in ranges)
+        raw_end = None if end is None else max(r[1] for r in ranges)
+        return raw_start, raw_end
+
+    def _feature_window(
+        self,
+        f: WellFeatures,
+        raw: Optional[Tup[int, Optional[int]]],
+        frames: Optional[Tup[int, Optional[int]]],
+    ) -> Optional[FeatureWindow]:
+        if raw is None:
+            return None
+        n_total = f.n_bytes // self._feature.stride_in_bytes
+        return FeatureWindow(raw[0], n_total, frames[0], frames[1])
+
+    def _chunk_well_ids(self, well_ids: Sequence[int]) -> Iterator[Sequence[int]]:
+        if self._chunk_size is None:
+            yield well_ids
+            return
+        for i in range(0, len(well_ids), self._chunk_size):
+            yield well_ids[i : i + self._chunk_size]
+
+    def _select_feature_chunk(
+        self, well_ids: Sequence[int], raw: Optional[Tup[int, Optional[int]]] = None
+    ) -> Iterator[WellFeatures]:
+        """
+        Streams the WellFeatures rows for some wells.
+        Uses ``peewee.Query.iterator``, which skips peewee's row cache,
+        so the chunk's blobs can be released as soon as they're decoded.
+        With a driver that supports unbuffered (server-side) cursors, rows are also not buffered client-side.
 
         Args:
-            well_to_treatments:
-            features:
+            well_ids: The IDs of wells in this chunk
+            raw: If set, the start and end (or None) indices to fetch;
+                 only those bytes of the blobs are sent, and the rows get an ``n_bytes`` attribute
 
         Returns:
+            An iterator over the rows
 
         """
+        if raw is None:
+            floats = [WellFeatures.floats]
+        else:
+            stride = self._feature.stride_in_bytes
+            start, end = raw
+            # SUBSTR is 1-indexed
+            if end is None:
+                floats = fn.SUBSTR(WellFeatures.floats, start * stride + 1)
+            else:
+                floats = fn.SUBSTR(WellFeatures.floats, start * stride + 1, (end - start) * stride)
+            floats = [floats.alias("floats"), fn.LENGTH(WellFeatures.floats).alias("n_bytes")]
+        query = (
+            WellFeatures.select(
+                WellFeatures.id, WellFeatures.well_id, WellFeatures.type_id, *floats
+            )
+            .where(WellFeatures.type_id == self._feature.valar_feature.id)
+            .where(WellFeatures.well_id << well_ids)
+        )
+        return query.iterator()
 
-        def capture(well: Wells, well_ts: Sequence[WellTreatments]) -> Mapping[int, np.array]:
-            """
+    def _matrix_dtype(self):
+        # the matrix is NaN-padded, so it needs a float type
+        # anything else is handled by the final astype in _build_inner
+        if self._dtype is not None and np.dtype(self._dtype).kind == "f":
+            return self._dtype
+        return np.float32
 
+    def _prefetch_timing(self, run_ids: Set[int]) -> None:
+        """
+        Fetches the timing data for the runs before decoding,
+        so that the worker threads don't race to fetch and save the same files.
+        """
+        for run_id in run_ids:
+            run_timing_cache.frame_millis(run_id)
+            run_timing_cache.stimulus_millis(run_id)
+            run_timing_cache.frames_per_second(run_id)
+            run_timing_cache.battery_length(run_id)
 
-            Args:
-              well: Wells:
-              well_ts: Sequence[WellTreatments]:
+    def _build_df(self, well_to_treatments, features: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Builds the DataFrame column-wise: each meta column is computed as a single vector
+        (see ``WellFrameMetaResolver``), and the feature matrix is attached once.
 
-            Returns:
+        Args:
+            well_to_treatments: A dict mapping wells to their treatments
+            features: A DataFrame with rows in the order of ``well_to_treatments``, or None
 
-            """
-            dct1 = OrderedDict()
-            for column_name, column_fn in self._columns.items():
-                dct1[column_name] = column_fn(well, well_ts)
-            if features is not None:
-                if well.id not in features:
-                    raise NoFeaturesError(
-                        f"The feature {self._feature} is not defined on well {well.id}"
-                    )
-                if self._dtype is None:
-                    dct2 = {i: mi for i, mi in enumerate(features[well.id])}
-                else:
-                    dct2 = {i: mi.astype(self._dtype) for i, mi in enumerate(features[well.id])}
-                dct1.update(dct2)
-            # noinspection PyTypeChecker
-            return dct1
+        Returns:
+            A plain DataFrame with str-named meta columns and int-named feature columns
 
-        return pd.DataFrame(
-            [
-                pd.Series(capture(well, treatments))
-                for well, treatments in well_to_treatments.items()
-            ]
-        )
+        """
+        meta = pd.DataFrame(WellFrameMetaResolver(self._columns).resolve(well_to_treatments))
+        if features is None:
+            return meta
+        return pd.concat([meta, features], axis=1)
 
     def _fix_df(self, df) -> None:
         """
@@ -578,4 +1093,42 @@ class WellFrameBuilder(AbstractWellFrameBuilder):
         return repr(self)
 
 
-__all__ = ["WellFrame", "WellFrameBuilder", "WellFrameQuery", "InvalidWellFrameError"]
+class _FeatureMatrix:
+    """
+    A preallocated, NaN-padded matrix of features with one row per well.
+    Allocated once at a width that every row should fit in (see ``WellFrameBuilder._feature_width``);
+    ``values`` is trimmed to the longest row that was put.
+    """
+
+    def __init__(self, n_rows: int, width: int, dtype):
+        self._values = np.full((n_rows, width), np.nan, dtype=dtype)
+        self._filled = np.zeros(n_rows, dtype=bool)
+        self._width = 0
+
+    @property
+    def values(self) -> np.array:
+        return self._values[:, : self._width]
+
+    def put(self, row: int, arr: np.array) -> None:
+        if len(arr) > self._values.shape[1]:
+            # only if the features were replaced with longer ones after the width was found
+            logger.debug(f"Widening the feature matrix from {self._values.shape[1]} to {len(arr)}")
+            n_more = len(arr) - self._values.shape[1]
+            self._values = np.pad(
+                self._values, ((0, 0), (0, n_more)), mode="constant", constant_values=np.nan
+            )
+        self._values[row, : len(arr)] = arr
+        self._filled[row] = True
+        self._width = max(self._width, len(arr))
+
+    def is_filled(self, row: int) -> bool:
+        return bool(self._filled[row])
+
+
+__all__ = [
+    "WellFrame",
+    "WellFrameBuilder",
+    "WellFrameQuery",
+    "WellFrameQueryPlanner",
+    "InvalidWellFrameError",
+]
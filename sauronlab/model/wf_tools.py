@@ -11,7 +11,12 @@ def _w(attrs: str):
 
 
 def _r(attrs: str):
-    return lambda w, ts: Tools.look(w, "run." + attrs)
+    def fn(w, ts):
+        return Tools.look(w, "run." + attrs)
+
+    # lets WellFrameMetaResolver compute this once per run
+    fn.of_run = lambda run: Tools.look(run, attrs)
+    return fn
 
 
 class WellFrameColumns:
@@ -19,8 +24,8 @@ class WellFrameColumns:
     The functions that are used to generate the WellFrame columns.
     """
 
-    experiment_id = "experiment_id", _w("run.experiment.id")
-    experiment_name = "experiment_name", _w("run.experiment.name")
+    experiment_id = "experiment_id", _r("experiment.id")
+    experiment_name = "experiment_name", _r("experiment.name")
     control_type = "control_type", _w("control_type.name")
     control_type_id = "control_type_id", _w("control_type.id")
     well = "well", _w("id")
@@ -201,6 +206,66 @@ class WellFrameColumnTools:
     _o_tuple_str_cols = ["compound_names"]
     _o_tuple_int_cols = ["c_ids", "b_ids"]
 
+    @classmethod
+    def encode_distinct(
+        cls,
+        series: pd.Series,
+        function: Callable[[Any], str],
+        key: Optional[Callable[[Any], Any]] = None,
+    ) -> pd.Categorical:
+        """
+        Serializes the values in a column, calling ``function`` only once per distinct value.
+        Returns a Categorical, which Arrow (Feather and Parquet) stores with dictionary encoding.
+
+        Args:
+            series: The values
+            function: A function that serializes one value
+            key: A function mapping a value to something hashable that identifies it; by default, the value itself
+
+        Returns:
+            A Categorical of strs with the same length
+        """
+        codes = np.empty(len(series), dtype=np.int32)
+        index_of = {}
+        uniques = []
+        for i, value in enumerate(series):
+            k = value if key is None else key(value)
+            j = index_of.get(k)
+            if j is None:
+                j = index_of[k] = len(uniques)
+                uniques.append(value)
+            codes[i] = j
+        encoded = np.empty(len(uniques), dtype=object)
+        for j, value in enumerate(uniques):
+            encoded[j] = function(value)
+        # different values could serialize the same way, but categories must be unique
+        categories, inverse = np.unique(encoded.astype(str), return_inverse=True)
+        return pd.Categorical.from_codes(inverse[codes], categories=categories)
+
+    @classmethod
+    def decode_distinct(cls, series: pd.Series, function: Callable[[str], Any]) -> pd.Series:
+        """
+        Deserializes the values in a column, calling ``function`` only once per distinct value.
+        Accepts either categorical columns (from ``encode_distinct``) or plain strs.
+
+        Args:
+            series: The serialized values
+            function: A function that deserializes one value
+
+        Returns:
+            An object-typed Series with the same index
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, uniques = series.cat.codes.values, series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series)
+        if (codes < 0).any():
+            raise ValueError(f"Column {series.name} contains null values")
+        decoded = np.empty(len(uniques), dtype=object)
+        for j, value in enumerate(uniques):
+            decoded[j] = function(value)
+        return pd.Series(decoded[codes], index=series.index, name=series.name, dtype=object)
+
     @classmethod
     def deserialize_oint_tuple(cls, st: str) -> Tup[Optional[int], ...]:
         if st == "":
@@ -274,4 +339,130 @@ class WellFrameColumnTools:
         return df
 
 
-__all__ = ["WellFrameColumnTools", "WellFrameColumns"]
+class WellFrameMetaResolver:
+    """
+    Computes the meta columns of a WellFrame using a number of queries that does not depend on the number of wells.
+
+    Before calling the column functions, fetches in bulk and attaches:
+        - the runs, with everything that the run-level columns in ``WellFrameColumns`` walk through
+        - the batches and their compounds
+        - the control types and genetic variants
+
+    Columns created with ``_r`` (which have an ``of_run`` attribute) are computed once per run and broadcast to the wells.
+    Other columns, including custom ones, are computed per well, but without lazy-loading.
+    """
+
+    def __init__(self, columns: Mapping[str, Callable[[Wells, Sequence[WellTreatments]], Any]]):
+        """
+
+        Args:
+            columns: A mapping from column names to functions of a Wells instance and its WellTreatments
+        """
+        self.columns = columns
+
+    def resolve(
+        self, well_to_treatments: Mapping[Wells, Sequence[WellTreatments]]
+    ) -> Dict[str, Sequence[Any]]:
+        """
+        Computes every column.
+
+        Args:
+            well_to_treatments: A mapping from wells to their treatments, in the desired row order.
+                                The instances are modified to reference the bulk-fetched rows.
+
+        Returns:
+            A dict mapping each column name to its list of values, in the order of ``well_to_treatments``
+
+        """
+        wells = list(well_to_treatments.keys())
+        if len(wells) == 0:
+            return {name: [] for name in self.columns.keys()}
+        runs = self._fetch_runs({w.run_id for w in wells})
+        control_types = self._fetch_by_id(ControlTypes, {w.control_type_id for w in wells})
+        variants = self._fetch_by_id(GeneticVariants, {w.variant_id for w in wells})
+        batches = self._fetch_batches(
+            {t.batch_id for ts in well_to_treatments.values() for t in ts}
+        )
+        for w in wells:
+            w.run = runs[w.run_id]
+            w.control_type = control_types.get(w.control_type_id)
+            w.variant = variants.get(w.variant_id)
+        for ts in well_to_treatments.values():
+            for t in ts:
+                if t.batch_id is not None:
+                    t.batch = batches[t.batch_id]
+        resolved = {}
+        for name, fn in self.columns.items():
+            of_run = getattr(fn, "of_run", None)
+            if of_run is None:
+                resolved[name] = [fn(w, ts) for w, ts in well_to_treatments.items()]
+            else:
+                per_run = {run_id: of_run(run) for run_id, run in runs.items()}
+                resolved[name] = [per_run[w.run_id] for w in wells]
+        return resolved
+
+    def _fetch_runs(self, run_ids: Set[int]) -> Mapping[int, Runs]:
+        person_plated = Users.alias()
+        query = (
+            Runs.select(
+                Runs,
+                Experiments,
+                Batteries,
+                TemplatePlates,
+                Plates,
+                PlateTypes,
+                person_plated,
+                Users,
+                Submissions,
+                SauronConfigs,
+                Saurons,
+            )
+            .join(Experiments)
+            .join(Batteries)
+            .switch(Experiments)
+            .join(TemplatePlates, JOIN.LEFT_OUTER)
+            .switch(Runs)
+            .join(Plates)
+            .join(PlateTypes, JOIN.LEFT_OUTER)
+            .switch(Plates)
+            .join(
+                person_plated,
+                JOIN.LEFT_OUTER,
+                on=(Plates.person_plated == person_plated.id),
+                attr="person_plated",
+            )
+            .switch(Runs)
+            .join(
+                Users,
+                JOIN.LEFT_OUTER,
+                on=(Runs.experimentalist == Users.id),
+                attr="experimentalist",
+            )
+            .switch(Runs)
+            .join(Submissions, JOIN.LEFT_OUTER)
+            .switch(Runs)
+            .join(SauronConfigs)
+            .join(Saurons)
+            .where(Runs.id << list(run_ids))
+        )
+        return {r.id: r for r in query}
+
+    def _fetch_batches(self, batch_ids: Set[Optional[int]]) -> Mapping[int, Batches]:
+        batch_ids = [b for b in batch_ids if b is not None]
+        if len(batch_ids) == 0:
+            return {}
+        query = (
+            Batches.select(Batches, Compounds)
+            .join(Compounds, JOIN.LEFT_OUTER)
+            .where(Batches.id << batch_ids)
+        )
+        return {b.id: b for b in query}
+
+    def _fetch_by_id(self, model: Type[BaseModel], ids: Set[Optional[int]]) -> Mapping[int, Any]:
+        ids = [i for i in ids if i is not None]
+        if len(ids) == 0:
+            return {}
+        return {x.id: x for x in model.select().where(model.id << ids)}
+
+
+__all__ = ["WellFrameColumnTools", "WellFrameColumns", "WellFrameMetaResolver"]
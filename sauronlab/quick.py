@@ -4,11 +4,14 @@ import dataclasses
 import traceback
 
 from sauronlab.caches.audio_caches import *
+from sauronlab.caches.cache_eviction import *
 from sauronlab.caches.caching_wfs import *
+from sauronlab.caches.frame_facades import *
 from sauronlab.caches.sensor_caches import *
 from sauronlab.caches.stim_caches import *
 from sauronlab.extras.video_caches import *
 from sauronlab.caches.wf_caches import *
+from sauronlab.calc.run_metadata import run_metadata
 
 from sauronlab.core.core_imports import *
 from sauronlab.ml import *
@@ -127,7 +130,7 @@ class Quick:
         generation: Generation permitted
         as_of: Enables additional methods by setting max datetime for those queries. This includes querying by flexible Peewee Expressions
         well_cache: A FrameCache for saving WellFrames on disk
-        facade: An optional FrameFacade for saving WellFrames into memory
+        facade: An optional FrameFacade over ``cache`` for holding recently used WellFrames in memory
         stim_cache: A StimCache for saving StimFrames objects on disk
         default_namer: By default, draw WellFrames with this Namer
         enable_checks: Warn about missing frames, 'concern' rows in the annotations table, suspicious batches, and more; see Concerns.warn_common_checks for full info
@@ -168,6 +171,7 @@ class Quick:
     audio_stimulus_cache: AudioStimulusCache
     sensor_cache: SensorCache
     video_cache: VideoCache
+    facade: Optional[FrameFacade] = None
     enable_checks: bool = True
     auto_fix: bool = True
     discard_controls: Set[ControlLike] = DEFAULT_TRASH_CONTROLS
@@ -198,6 +202,10 @@ class Quick:
     def _expanded_stim_cache(self) -> StimframeCache:
         return StimframeCache(waveform_loader=self.audio_stimulus_cache.load_waveform)
 
+    @property
+    def _well_cache(self) -> AWellCache:
+        return self.cache if self.facade is None else self.facade
+
     def _get_smoothing(self, fps: int) -> int:
         return int(round(self.smoothing_factor * fps))
 
@@ -751,7 +759,7 @@ class Quick:
             BatteryStimFrame
 
         """
-        battery = Batteries.fetch(battery)
+        battery = run_metadata.battery(battery)
         if audio_waveform is None:
             audio_waveform = not ValarTools.battery_is_legacy(battery)
         if audio_waveform:
@@ -790,6 +798,11 @@ class Quick:
             2) If `self.auto_fix` is True, will apply data standardization and fixes. These will happen after slicing (if applicable).
             2) If `self.discard_trash_controls` is not False, will discard those wells (if fresh).
 
+        Offline (``sauronlab_env.offline``):
+            Cached runs are served without querying Valar, using the run metadata the caches recorded.
+            Because they need Valar, the compound names aren't replaced (the cached ones are kept),
+            concerns aren't checked, and only control types given by name are discarded.
+
         Args:
             run: Any of the above
             start_ms: The milliseconds after the first frame to slice starting at, or None to mean 0; uses the ideal framerate
@@ -813,7 +826,7 @@ class Quick:
             MultipleGenerationsError: raises IncompatibleGenerationError
 
         """
-        used_generations = {ValarTools.generation_of(run) for run in df.unique_runs()}
+        used_generations = {run_metadata.generation(run) for run in df.unique_runs()}
         if len(used_generations) > 1:
             raise MultipleGenerationsError(
                 f"Got multiple generations in quick.df {used_generations}"
@@ -981,7 +994,14 @@ class Quick:
                 )
         n = len(df)
         if len(self.discard_controls) > 0:
-            df = df.without_controls(names=self.discard_controls)
+            if sauronlab_env.offline:
+                # matching IDs or attributes needs Valar
+                names = {
+                    c.name if isinstance(c, ControlTypes) else c for c in self.discard_controls
+                }
+                df = WellFrame.retype(df[~df["control_type"].isin(names)])
+            else:
+                df = df.without_controls(names=self.discard_controls)
             if len(df) != n:
                 logger.caution(f"Discarded {len(df) - n} trash controls")
         return df
@@ -1004,20 +1024,26 @@ class Quick:
 
         """
         try:
-            df, is_fresh = self._fetch_df(run)
+            # the checks need whole runs, so only read the window from disk if they're off
+            push = not self.enable_checks and not isinstance(run, pd.DataFrame)
+            if push:
+                df, is_fresh = self._fetch_df(run, start_ms, end_ms)
+            else:
+                df, is_fresh = self._fetch_df(run)
             if is_fresh:
                 # note that adding compound_names only when is_fresh can lead to unexpected results
                 # I don't see a better alternative though
-                if self.compound_namer is not None:
+                if self.compound_namer is not None and not sauronlab_env.offline:
                     df = df.with_new_compound_names(self.compound_namer)
                 # MAKE SURE to check for errors and warnings BEFORE slicing or fixing
                 self.errors(df)
-                if self.enable_checks:
+                if self.enable_checks and not sauronlab_env.offline:
                     self.log_concerns(df, min_severity=self.min_log_severity)
-                df = df.slice_ms(start_ms, end_ms)
+                if not push:
+                    df = df.slice_ms(start_ms, end_ms)
                 if self.auto_fix:
                     df = self.fix(df)
-            else:
+            elif not push:
                 # we still need to slice it if it's not fresh
                 df = df.slice_ms(start_ms, end_ms)
             df = df.with_new_names(self.well_namer)
@@ -1072,12 +1098,16 @@ class Quick:
                 feats_defined,
             )
 
-    def _fetch_df(self, run) -> Tup[WellFrame, bool]:
+    def _fetch_df(
+        self, run, start_ms: Optional[int] = None, end_ms: Optional[int] = None
+    ) -> Tup[WellFrame, bool]:
         """
-
+        Fetches, reading only the features between ``start_ms`` and ``end_ms`` if they're set.
 
         Args:
             run:
+            start_ms:
+            end_ms:
 
         Returns:
 
@@ -1099,17 +1129,23 @@ class Quick:
             raise RefusingRequestError(
                 "Will not fetch from flexible queries unless Quick.as_of is set."
             )
-        elif is_expression:
-            df = CachingWellFrameBuilder(self.cache, self.as_of).where(run).build()
+        is_windowed = start_ms is not None or end_ms is not None
+        if is_expression:
+            builder = CachingWellFrameBuilder(self._well_cache, self.as_of).where(run)
         elif self.cache is not None:
-            df = self.cache.load(run)
+            builder = None
         else:
-            df = (
+            builder = (
                 WellFrameBuilder.runs(run)
                 .with_sensor_cache(self.sensor_cache)
                 .with_feature(self.feature)
-                .build()
             )
+        if builder is None:
+            df = self._well_cache.load_ms(run, start_ms, end_ms)
+        elif is_windowed:
+            df = builder.with_window(0 if start_ms is None else start_ms, end_ms).build()
+        else:
+            df = builder.build()
         # instead, we'll build the names in Quick.df()
         df = df.with_new_names(self.well_namer)
         df = df.with_new("display_name", self.well_namer)
@@ -1134,7 +1170,7 @@ class Quick:
         battery = df.only("battery_name")
         stimframes = self.stimframes(battery, start_ms, end_ms, audio_waveform=True)
         control_names = self._control_names(df, control_names, control_types)
-        fps = Tools.only((ValarTools.frames_per_second(run) for run in df.unique_runs()))
+        fps = Tools.only((run_metadata.frames_per_second(run) for run in df.unique_runs()))
         weights = self._slice_weight_ms(df, weights, start_ms, end_ms)
         extra_gs, extra_fn = self._weighter(weights)
         stimplotter = StimframesPlotter(assay_labels=self.label_assays, audio_waveform=True)
@@ -1236,7 +1272,7 @@ class Quick:
         """
         if weights is None:
             return None
-        fpses = {ValarTools.frames_per_second(r) for r in df["run"].unique()}
+        fpses = {run_metadata.frames_per_second(r) for r in df["run"].unique()}
         assert len(fpses) == 1, str(len(fpses))
         fps = next(iter(fpses))
         return weights[
@@ -1262,7 +1298,8 @@ class Quick:
             raise XTypeError("Bad query type")
         for run in runs:
             if self.cache is not None:
-                self.cache.delete(run)
+                # the facade deletes from the cache too
+                self._well_cache.delete(run)
         logger.notice(f"Deleted {len(runs)} run(s) from the cache(s)")
 
     def __repr__(self):
@@ -1378,11 +1415,14 @@ class Quicks:
             del kwargs["namer"]  # it's ok -- this is already a copy
         sensor_cache = SensorCache()
         audio_stimulus_cache = AudioStimulusCache()
+        cache = WellCache(feature).with_sensor_cache(sensor_cache)
+        if "facade" not in kwargs:
+            kwargs["facade"] = FrameFacade(cache)
         return Quick(
             feature,
             generation,
             as_of,
-            cache=WellCache(feature).with_sensor_cache(sensor_cache),
+            cache=cache,
             stim_cache=StimframeCache(),
             sensor_cache=sensor_cache,
             video_cache=VideoCache(),
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from sauronlab.caches.cache_eviction import CacheEvictor, EvictionPolicy, EvictionResult
+from sauronlab.model.cache_locks import CacheLock
+from sauronlab.model.cache_manifests import CacheManifest
+from tests import TestResources
+
+
+def _write(cache_dir: Path, name: str, accessed: float, hits: int = 0) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / name).write_bytes(b"\0" * 100)
+    manifest = CacheManifest.of(cache_dir)
+    manifest.add(name, sha1=False)
+    # set the access history directly so that the order doesn't depend on the clock
+    with manifest._lock:
+        manifest._conn.execute(
+            "UPDATE entries SET accessed = ?, hits = ? WHERE path = ?", (accessed, hits, name)
+        )
+
+
+def _names(cache_dir: Path) -> set:
+    return {p.name for p in cache_dir.iterdir() if p.is_file() and not p.name.startswith(".")}
+
+
+class TestCacheEvictor:
+    def test_lru(self):
+        with TestResources.temp_dir() as root:
+            wells = root / "wells" / "cd10"
+            _write(wells, "1.bin", 1, hits=9)
+            _write(wells, "2.bin", 3)
+            _write(wells, "3.bin", 2)
+            evictor = CacheEvictor(root, None, {"wells": 200}, EvictionPolicy.LRU)
+            assert evictor.usage() == {"wells": 300}
+            assert evictor.evict() == EvictionResult(1, 1, 100)
+            assert _names(wells) == {"2.bin", "3.bin"}
+            assert [p.name for p in CacheManifest.of(wells).paths()] == ["2.bin", "3.bin"]
+
+    def test_lfu(self):
+        with TestResources.temp_dir() as root:
+            wells = root / "wells" / "cd10"
+            _write(wells, "1.bin", 1, hits=5)
+            _write(wells, "2.bin", 3, hits=0)
+            _write(wells, "3.bin", 2, hits=0)
+            evictor = CacheEvictor(root, None, {"wells": 100}, "lfu")
+            assert evictor.evict() == EvictionResult(2, 2, 200)
+            assert _names(wells) == {"1.bin"}
+
+    def test_budgets_then_global(self):
+        with TestResources.temp_dir() as root:
+            wells, audio = root / "wells" / "cd10", root / "audio"
+            _write(wells, "1.bin", 1)
+            _write(wells, "2.bin", 4)
+            _write(wells, "3.bin", 5)
+            _write(audio, "a.bin", 2)
+            _write(audio, "b.bin", 3)
+            evictor = CacheEvictor(root, 300, {"wells": 200}, EvictionPolicy.LRU)
+            # wells drops 1.bin to fit its budget; then a.bin is the oldest of everything left
+            assert evictor.evict() == EvictionResult(2, 2, 200)
+            assert _names(wells) == {"2.bin", "3.bin"}
+            assert _names(audio) == {"b.bin"}
+            assert evictor.usage() == {"wells": 200, "audio": 100}
+
+    def test_dry_run(self):
+        with TestResources.temp_dir() as root:
+            wells = root / "wells" / "cd10"
+            _write(wells, "1.bin", 1)
+            _write(wells, "2.bin", 2)
+            evictor = CacheEvictor(root, 100, {}, EvictionPolicy.LRU)
+            assert evictor.evict(dry_run=True) == EvictionResult(1, 1, 100)
+            assert _names(wells) == {"1.bin", "2.bin"}
+            assert len(CacheManifest.of(wells)) == 2
+
+    def test_pinned(self):
+        with TestResources.temp_dir() as root:
+            wells = root / "wells" / "cd10"
+            _write(wells, "1.bin", 1)
+            _write(wells, "2.bin", 2)
+            _write(wells, "3.bin", 3)
+            CacheManifest.of(wells).pin("1.bin")
+            evictor = CacheEvictor(root, 100, {}, EvictionPolicy.LRU)
+            assert evictor.evict() == EvictionResult(2, 2, 200)
+            assert _names(wells) == {"1.bin"}
+
+    def test_locked(self):
+        with TestResources.temp_dir() as root:
+            wells = root / "wells" / "cd10"
+            _write(wells, "1.bin", 1)
+            _write(wells, "2.bin", 2)
+            _write(wells, "3.bin", 3)
+            evictor = CacheEvictor(root, 200, {}, EvictionPolicy.LRU)
+            with CacheLock.of(wells, "1.bin"):
+                assert evictor.evict() == EvictionResult(1, 1, 100)
+            assert _names(wells) == {"1.bin", "3.bin"}
+            # the lock is free again
+            assert evictor.evict() == EvictionResult(1, 1, 100)
+            assert _names(wells) == {"3.bin"}
+
+    def test_missing_root(self):
+        with TestResources.temp_dir() as root:
+            evictor = CacheEvictor(root / "nope", 0, {"wells": 0}, EvictionPolicy.LRU)
+            assert evictor.manifests() == []
+            assert evictor.usage() == {}
+            assert evictor.evict() == EvictionResult(0, 0, 0)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,154 @@
+import os
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sauronlab.caches.frame_facades import FrameFacade
+from sauronlab.model.cache_interfaces import AWellCache
+from sauronlab.model.well_frames import WellFrame
+from tests import TestResources
+
+
+def _frame(run: int) -> WellFrame:
+    values = np.full((4, 100), run, dtype=np.float32)
+    return WellFrame(pd.DataFrame(values, index=pd.Index([1, 2, 3, 4], name="well")))
+
+
+N_BYTES = int(_frame(1).memory_usage(index=True, deep=True).sum())
+
+
+class _Cache(AWellCache):
+    """Writes a placeholder file per run and counts loads."""
+
+    def __init__(self, cache_dir: Path):
+        self._cache_dir = cache_dir
+        self.loads = Counter()
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir
+
+    def path_of(self, run: int) -> Path:
+        return self._cache_dir / f"{run}.bin"
+
+    def download(self, *runs: int) -> None:
+        for run in runs:
+            if not self.path_of(run).exists():
+                self.path_of(run).write_bytes(b"\0" * 100)
+
+    def load(self, run: int, start=None, end=None) -> WellFrame:
+        self.download(run)
+        self.loads[run] += 1
+        return _frame(run)
+
+
+class TestFrameFacade:
+    def test_lru(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=2 * N_BYTES)
+            facade.load(1)
+            facade.load(2)
+            assert facade.memory_bytes == 2 * N_BYTES
+            # 1 is now the most recently used, so 3 evicts 2
+            facade.load(1)
+            facade.load(3)
+            assert cache.loads == {1: 1, 2: 1, 3: 1}
+            assert facade.memory_bytes == 2 * N_BYTES
+            facade.load(1)
+            facade.load(2)
+            assert cache.loads == {1: 1, 2: 2, 3: 1}
+            assert facade.memory_bytes <= facade.max_bytes
+
+    def test_too_big(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=N_BYTES - 1)
+            facade.load(1)
+            facade.load(1)
+            assert cache.loads == {1: 2}
+            assert facade.memory_bytes == 0
+
+    def test_stale_mtime(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            facade.load(1)
+            facade.load(1)
+            assert cache.loads == {1: 1}
+            stat = cache.path_of(1).stat()
+            os.utime(cache.path_of(1), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            facade.load(1)
+            assert cache.loads == {1: 2}
+            assert facade.memory_bytes == N_BYTES
+
+    def test_stale_size(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            facade.load(1)
+            stat = cache.path_of(1).stat()
+            cache.path_of(1).write_bytes(b"\0" * 200)
+            # same modification time, so only the size differs
+            os.utime(cache.path_of(1), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            facade.load(1)
+            assert cache.loads == {1: 2}
+
+    def test_deleted(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            facade.load(1)
+            cache.path_of(1).unlink()
+            facade.load(1)
+            assert cache.loads == {1: 2}
+            # the stub wrote it again while loading
+            facade.load(1)
+            assert cache.loads == {1: 2}
+
+    def test_invalidate(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            facade.load(1)
+            facade.load(2)
+            facade.invalidate(1)
+            assert facade.memory_bytes == N_BYTES
+            facade.load(1)
+            facade.load(2)
+            assert cache.loads == {1: 2, 2: 1}
+            facade.clear()
+            assert facade.memory_bytes == 0
+
+    def test_load_copies(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            df = facade.load(1)
+            assert df.values.flags.writeable
+            df.values[0, 0] = -1
+            assert df.values[0, 0] == -1
+            assert facade.load(1).values[0, 0] == 1
+            assert facade.view(1).values[0, 0] == 1
+            assert cache.loads == {1: 1}
+
+    def test_view(self):
+        with TestResources.temp_dir() as path:
+            cache = _Cache(path)
+            facade = FrameFacade(cache, max_bytes=10 * N_BYTES)
+            view = facade.view(1)
+            assert not view.values.flags.writeable
+            with pytest.raises(ValueError):
+                view.values[0, 0] = -1
+            # no copy
+            assert np.shares_memory(view.values, facade.view(1).values)
+            assert not np.shares_memory(view.values, facade.load(1).values)
+            assert facade.view(1).values[0, 0] == 1
+            assert cache.loads == {1: 1}
+
+
+if __name__ == "__main__":
+    pytest.main()
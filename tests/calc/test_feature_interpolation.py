@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from sauronlab.calc.feature_interpolation import (
+    FeatureInterpolation,
+    FeatureTimestampMismatchError,
+    FeatureWindow,
+)
+from sauronlab.calc.run_timing import run_timing_cache
+
+# 10 frames per second over a 2-second battery starting at 1000 ms
+FPS, START, LENGTH = 10, 1000, 2000
+
+
+@pytest.fixture
+def timing(monkeypatch):
+    monkeypatch.setattr(run_timing_cache, "frames_per_second", lambda run: FPS)
+    monkeypatch.setattr(run_timing_cache, "battery_length", lambda run: LENGTH)
+    return np.array([START, START + LENGTH])
+
+
+def _frames() -> np.array:
+    rng = np.random.default_rng(0)
+    jittered = rng.uniform(START + 30, START + 1500, 30)
+    # exactly on ideal frames, and a repeated timestamp
+    exact = [START + 500, START + 1200, START + 1200]
+    return np.sort(np.concatenate([jittered, exact]))
+
+
+def _previous(frames_ms: np.array, arr: np.array) -> np.array:
+    # what FeatureInterpolation did per well before interpolating whole runs
+    ideal = np.arange(start=START, stop=START + LENGTH, step=1000 / FPS)
+    f = interp1d(
+        frames_ms[: len(arr)],
+        arr,
+        kind="previous",
+        fill_value=(np.NaN, np.NaN),
+        bounds_error=False,
+        assume_sorted=True,
+    )
+    return f(ideal)
+
+
+class TestFeatureInterpolation:
+    def test_matches_interp1d(self, timing):
+        frames = _frames()
+        rng = np.random.default_rng(1)
+        lengths = [len(frames), len(frames) - 4, len(frames) - 20, 0]
+        rows = [rng.normal(size=n).astype(np.float32) for n in lengths]
+        # the padding doesn't need to be NaN, since the lengths are given
+        matrix = np.zeros((len(rows), len(frames)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            matrix[i, : len(row)] = row
+        interpolation = FeatureInterpolation("cd(10)")
+        got = interpolation.interpolate_run(matrix, frames, timing, 1, lengths=lengths)
+        assert got.dtype == np.float32
+        assert got.shape == (4, FPS * LENGTH // 1000)
+        for i, row in enumerate(rows[:3]):
+            np.testing.assert_array_equal(got[i], _previous(frames, row).astype(np.float32))
+        # a row with no values
+        assert np.isnan(got[3]).all()
+        # before the first raw frame, and after the last one
+        assert np.isnan(got[:, 0]).all()
+        assert np.isnan(got[:, -1]).all()
+        # a raw frame exactly on an ideal frame is used for it
+        exact = np.searchsorted(frames, START + 500)
+        np.testing.assert_array_equal(got[:3, 5], matrix[:3, exact])
+        # the input isn't affected
+        for i, row in enumerate(rows):
+            np.testing.assert_array_equal(matrix[i, : len(row)], row)
+
+    def test_trailing_nan(self, timing):
+        # real NaNs at the end of a row are values, not padding
+        frames = _frames()
+        rng = np.random.default_rng(2)
+        matrix = rng.normal(size=(3, len(frames))).astype(np.float32)
+        matrix[0, -3:] = np.NaN
+        matrix[1, -1] = np.NaN
+        matrix[2, 10:] = np.NaN
+        interpolation = FeatureInterpolation("cd(10)")
+        got = interpolation.interpolate_run(matrix, frames, timing, 1)
+        for i in range(len(matrix)):
+            np.testing.assert_array_equal(got[i], _previous(frames, matrix[i]).astype(np.float32))
+        # the same, as a shorter row padded with NaN
+        got = interpolation.interpolate_run(
+            matrix[:, :-1], frames, timing, 1, lengths=[len(frames) - 1] * 3
+        )
+        for i in range(len(matrix)):
+            expected = _previous(frames, matrix[i, :-1]).astype(np.float32)
+            np.testing.assert_array_equal(got[i], expected)
+
+    def test_mismatch(self, timing):
+        # each row's own length is checked against the timestamps, not the padded width
+        frames = _frames()
+        matrix = np.zeros((2, len(frames)), dtype=np.float32)
+        interpolation = FeatureInterpolation("cd(10)")
+        with pytest.raises(FeatureTimestampMismatchError):
+            interpolation.interpolate_run(
+                matrix, frames, timing, 1, stringent=True, lengths=[len(frames), 5]
+            )
+        interpolation.interpolate_run(matrix, frames, timing, 1, stringent=True)
+
+    def test_window(self, timing):
+        frames = _frames()
+        arr = np.arange(len(frames), dtype=np.float32)
+        interpolation = FeatureInterpolation("cd(10)")
+        full = interpolation.interpolate_run(arr, frames, timing, 1)[0]
+        start, end = 3, 12
+        # as raw_frame_range finds it, with a margin of 1 frame
+        raw_start = int(np.searchsorted(frames, START + start * 100, side="right")) - 2
+        raw_end = int(np.searchsorted(frames, START + (end - 1) * 100, side="right")) + 1
+        window = FeatureWindow(raw_start, len(frames), start, end)
+        got = interpolation.interpolate_run(
+            arr[raw_start:raw_end], frames, timing, 1, window=window
+        )[0]
+        np.testing.assert_array_equal(got, full[start:end])
+
+
+if __name__ == "__main__":
+    pytest.main()
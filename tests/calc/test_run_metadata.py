@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+from pocketutils.core.exceptions import CacheLoadError
+
+from sauronlab.calc.run_metadata import RunMetadata, RunMetadataCache
+from sauronlab.core.environment import sauronlab_env
+from tests import TestResources
+
+
+def _meta(run_id: int) -> RunMetadata:
+    return RunMetadata(
+        run_id=run_id,
+        name=f"run:{run_id}",
+        tag=f"20120101.{run_id}.Elephant",
+        submission=f"{run_id:012d}",
+        datetime_run=datetime(2012, 1, 1, 11, 11, 11),
+        experiment_id=1,
+        plate_id=1,
+        sauron_config_id=1,
+        config_file_id=None,
+        generation="PIKE_SAURONX",
+        fps=100,
+        battery_id=run_id + 10,
+        battery_name=f"battery-{run_id}",
+        battery_length=1000,
+        plate_type_id=1,
+    )
+
+
+class TestRunMetadata:
+    def test_json(self):
+        meta = _meta(1)
+        assert RunMetadata.from_json(meta.to_json()) == meta
+
+    def test_offline_lookup(self):
+        was_offline = sauronlab_env.offline
+        with TestResources.temp_dir() as path:
+            cache = RunMetadataCache(path)
+            for run_id in [1, 2]:
+                cache.path_of(run_id).write_text(_meta(run_id).to_json(), encoding="utf8")
+            # a temp file from a writer in another process (or one that crashed)
+            (path / ".123-456.3.json").write_text("{", encoding="utf8")
+            sauronlab_env.offline = True
+            try:
+                assert cache.run_id(2) == 2
+                assert cache.run_id("run:2") == 2
+                assert cache.run_id("20120101.1.Elephant") == 1
+                assert cache.run_id("000000000002") == 2
+                assert cache.get("run:1") == _meta(1)
+                assert cache.battery("battery-2").id == 12
+                assert cache.battery(11).name == "battery-1"
+                assert cache.frames_per_second(1) == 100
+                assert cache.run("run:2").experiment.battery.length == 1000
+                with pytest.raises(CacheLoadError):
+                    cache.run_id("run:3")
+                with pytest.raises(CacheLoadError):
+                    cache.get(3)
+                with pytest.raises(CacheLoadError):
+                    cache.battery("battery-3")
+            finally:
+                sauronlab_env.offline = was_offline
+
+
+if __name__ == "__main__":
+    pytest.main()
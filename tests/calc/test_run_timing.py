@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from sauronlab.calc.run_timing import RunTimingCache
+from tests import TestResources
+
+
+class TestRunTimingCache:
+    def test_from_disk(self):
+        with TestResources.temp_dir() as path:
+            arr = np.arange(10, dtype=np.int64)
+            (path / "1").mkdir()
+            np.save(str(path / "1" / "raw_camera_millis.npy"), arr)
+            cache = RunTimingCache()
+            cache.register_dir(path)
+            got = cache.frame_millis(1)
+            assert got.dtype == arr.dtype
+            np.testing.assert_array_equal(got, arr)
+            assert cache.n_bytes == arr.nbytes
+
+    def test_register_dir(self):
+        with TestResources.temp_dir() as path:
+            cache = RunTimingCache()
+            written = []
+            cache.register_dir(path, on_write=written.append)
+            # registering again without a callback keeps the first
+            cache.register_dir(path)
+            assert list(cache._dirs.items()) == [(path, written.append)]
+            cache.register_dir(path, on_write=print)
+            assert list(cache._dirs.items()) == [(path, print)]
+
+    def test_put(self):
+        arr = np.arange(100, dtype=np.int32)
+        cache = RunTimingCache(max_bytes=2 * arr.nbytes)
+        cache.put(1, "camera_millis", arr)
+        cache.put(2, "camera_millis", arr)
+        assert cache.n_bytes == 2 * arr.nbytes
+        # the least-recently used is evicted
+        assert cache.get(1, "camera_millis") is arr
+        cache.put(3, "camera_millis", arr)
+        assert cache.n_bytes == 2 * arr.nbytes
+        assert cache.get(1, "camera_millis") is arr
+        assert (2, "camera_millis") not in cache._arrays
+        cache.clear()
+        assert cache.n_bytes == 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,52 @@
+import struct
+
+import numpy as np
+import pytest
+from pocketutils.core.exceptions import LengthMismatchError
+
+from sauronlab.core.tools import Tools
+
+
+def _blob(values) -> bytes:
+    return struct.pack(f">{len(values)}f", *values)
+
+
+class TestTools:
+    def test_blob_round_trip(self):
+        arr = np.array([0, 1.5, -2.25, np.inf, 3e-8], dtype=np.float32)
+        blob = Tools.signed_floats_to_blob(arr)
+        assert blob == _blob(arr)
+        got = Tools.blob_to_signed_floats(blob)
+        assert got.dtype == np.float32
+        assert got.dtype.isnative
+        assert got.flags.writeable
+        np.testing.assert_array_equal(got, arr)
+
+    def test_blobs_to_signed_floats(self):
+        rng = np.random.default_rng(0)
+        blobs = [_blob(rng.normal(size=n).astype(np.float32)) for n in [5, 0, 8, 1, 8]]
+        matrix, lengths = Tools.blobs_to_signed_floats(blobs)
+        assert matrix.shape == (5, 8)
+        assert matrix.dtype == np.float32
+        assert matrix.dtype.isnative
+        assert lengths.tolist() == [5, 0, 8, 1, 8]
+        for i, blob in enumerate(blobs):
+            expected = Tools.blob_to_signed_floats(blob)
+            np.testing.assert_array_equal(matrix[i, : lengths[i]], expected)
+            assert np.isnan(matrix[i, lengths[i] :]).all()
+
+    def test_blobs_to_signed_floats_empty(self):
+        matrix, lengths = Tools.blobs_to_signed_floats([])
+        assert matrix.shape == (0, 0)
+        assert len(lengths) == 0
+        matrix, lengths = Tools.blobs_to_signed_floats([b"", b""])
+        assert matrix.shape == (2, 0)
+        assert lengths.tolist() == [0, 0]
+
+    def test_blobs_to_signed_floats_bad_length(self):
+        with pytest.raises(LengthMismatchError):
+            Tools.blobs_to_signed_floats([_blob([1.0]), b"\0\0\0"])
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from sauronlab.core.valar_pool import ValarPool
+from sauronlab.core.valar_singleton import Runs
+
+
+class _Database:
+    """Tracks a connection per thread, like peewee, and records which threads closed theirs."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self.opened = []
+        self.closed = []
+        self._lock = threading.Lock()
+
+    def is_closed(self) -> bool:
+        return not getattr(self._local, "open", False)
+
+    def connect(self) -> None:
+        if self.is_closed():
+            self._local.open = True
+            with self._lock:
+                self.opened.append(threading.get_ident())
+
+    def close(self) -> None:
+        self._local.open = False
+        with self._lock:
+            self.closed.append(threading.get_ident())
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = _Database()
+    monkeypatch.setattr(Runs._meta, "database", database)
+    return database
+
+
+class TestValarPool:
+    def test_closes_worker_connections(self, database):
+        def query(i):
+            database.connect()
+            return i * 2
+
+        pool = ValarPool({}, 2)
+        assert pool.map(query, range(6), n_jobs=2) == [0, 2, 4, 6, 8, 10]
+        # every task opened a connection (again, if its thread had run one before) and closed it
+        assert len(database.opened) == 6
+        assert sorted(database.closed) == sorted(database.opened)
+        assert threading.get_ident() not in database.closed
+        assert database.is_closed()
+
+    def test_leaves_open_connections(self, database):
+        pool = ValarPool({}, 2)
+        database.connect()
+        assert pool._call(lambda i: database.connect(), 1) is None
+        assert not database.is_closed()
+        assert database.closed == []
+
+    def test_no_query(self, database):
+        pool = ValarPool({}, 2)
+        assert pool.map(lambda i: i, range(4), n_jobs=2) == [0, 1, 2, 3]
+        assert database.opened == []
+        assert database.closed == []
+
+    def test_closes_on_error(self, database):
+        def fail(i):
+            database.connect()
+            raise ValueError(str(i))
+
+        pool = ValarPool({}, 2)
+        with pytest.raises(ValueError):
+            pool._call(fail, 1)
+        assert database.is_closed()
+        assert database.closed == [threading.get_ident()]
+
+    def test_one_job(self, database):
+        # without workers, the caller's connection is left as it is
+        pool = ValarPool({}, 2)
+        assert pool.map(lambda i: database.connect(), [1], n_jobs=4) == [None]
+        assert not database.is_closed()
+        assert database.closed == []
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,54 @@
+import pytest
+from pocketutils.core.exceptions import AlreadyUsedError
+
+from sauronlab.model.cache_locks import CacheLock
+from tests import TestResources
+
+
+class TestCacheLock:
+    def test_of(self):
+        with TestResources.temp_dir() as path:
+            lock = CacheLock.of(path, "wells--1.feather")
+            assert lock.path == path / ".locks" / "wells--1.feather.lock"
+            assert not lock.is_held
+
+    def test_exclusive(self):
+        with TestResources.temp_dir() as path:
+            first, second = CacheLock.of(path, "1"), CacheLock.of(path, "1")
+            assert first.acquire(blocking=False)
+            assert first.is_held
+            assert not second.acquire(blocking=False)
+            assert not second.acquire(timeout=0.2)
+            assert not second.is_held
+            # a different key isn't affected
+            other = CacheLock.of(path, "2")
+            assert other.acquire(blocking=False)
+            other.release()
+            first.release()
+            assert second.acquire(blocking=False)
+            second.release()
+
+    def test_release(self):
+        with TestResources.temp_dir() as path:
+            lock = CacheLock.of(path, "1")
+            lock.release()
+            assert lock.acquire()
+            lock.release()
+            lock.release()
+            assert not lock.is_held
+            # the lock file is kept
+            assert lock.path.exists()
+            with lock:
+                assert lock.is_held
+            assert not lock.is_held
+
+    def test_reacquire(self):
+        with TestResources.temp_dir() as path:
+            with CacheLock.of(path, "1") as lock:
+                with pytest.raises(AlreadyUsedError):
+                    lock.acquire()
+                assert lock.is_held
+
+
+if __name__ == "__main__":
+    pytest.main()
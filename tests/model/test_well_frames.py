@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sauronlab.model.treatments import Treatment, Treatments
+from sauronlab.model.well_frames import WellFrame
+from sauronlab.model.wf_tools import WellFrameColumns, WellFrameColumnTools
+from tests import TestResources
+
+
+def _treatment(bid: int, dose: float) -> Treatment:
+    return Treatment(
+        cid=bid + 100,
+        bid=bid,
+        bhash=f"{bid:014x}",
+        btag=None,
+        dose=dose,
+        inchikey=None,
+        chembl=None,
+    )
+
+
+def _wf() -> WellFrame:
+    treatments = [
+        Treatments([]),
+        Treatments([_treatment(1, 0.5)]),
+        Treatments([_treatment(1, 0.5)]),
+        Treatments([_treatment(2, 1.0), _treatment(1, 0.5)]),
+    ]
+    df = pd.DataFrame({c: ["x"] * len(treatments) for c in WellFrameColumns.required_names})
+    df["well"] = [1, 2, 3, 4]
+    df["run"] = 1
+    df["datetime_run"] = pd.Timestamp("2012-01-01 11:11:11")
+    df["treatments"] = treatments
+    df["b_ids"] = [tuple(t.bid for t in ts.treatments) for ts in treatments]
+    df["c_ids"] = [(), (101,), (101,), (None, 101)]
+    df["compound_names"] = [(), ("one",), ("one",), (None, "one")]
+    for i in range(3):
+        df[i] = np.arange(len(treatments), dtype=np.float32) + i
+    return WellFrame.of(df)
+
+
+class TestWellFrameColumnTools:
+    def test_encode_distinct(self):
+        calls = []
+
+        def fn(value):
+            calls.append(value)
+            return str(value)
+
+        series = pd.Series([(1, 2), (3,), (1, 2), (), (3,)])
+        encoded = WellFrameColumnTools.encode_distinct(series, fn)
+        assert isinstance(encoded, pd.Categorical)
+        assert list(encoded) == ["(1, 2)", "(3,)", "(1, 2)", "()", "(3,)"]
+        assert list(encoded.categories) == ["()", "(1, 2)", "(3,)"]
+        assert calls == [(1, 2), (3,), ()]
+
+    def test_encode_distinct_key(self):
+        # equal keys are serialized once; distinct keys that serialize the same share a category
+        series = pd.Series(["a", "A", "b", "B"])
+        encoded = WellFrameColumnTools.encode_distinct(series, str.upper, key=str.lower)
+        assert list(encoded) == ["A", "A", "B", "B"]
+        encoded = WellFrameColumnTools.encode_distinct(series, lambda s: "same")
+        assert list(encoded) == ["same"] * 4
+        assert list(encoded.categories) == ["same"]
+
+    def test_decode_distinct(self):
+        calls = []
+
+        def fn(value):
+            calls.append(value)
+            return tuple(value)
+
+        plain = pd.Series(["ab", "c", "ab"], index=[5, 6, 7], name="col")
+        categorical = pd.Series(pd.Categorical(plain), index=plain.index, name="col")
+        for series in [plain, categorical]:
+            calls.clear()
+            decoded = WellFrameColumnTools.decode_distinct(series, fn)
+            assert decoded.dtype == object
+            assert decoded.name == "col"
+            assert list(decoded.index) == [5, 6, 7]
+            assert list(decoded) == [("a", "b"), ("c",), ("a", "b")]
+            assert sorted(calls) == ["ab", "c"]
+
+    def test_decode_distinct_null(self):
+        with pytest.raises(ValueError):
+            WellFrameColumnTools.decode_distinct(pd.Series(["a", None]), str)
+        with pytest.raises(ValueError):
+            WellFrameColumnTools.decode_distinct(pd.Series(pd.Categorical(["a", None])), str)
+
+    def test_tuples(self):
+        tools = WellFrameColumnTools
+        for tup in [(), (1,), (None, 3)]:
+            assert tools.deserialize_oint_tuple(tools.serialize_oint_tuple(tup)) == tup
+        for tup in [(), ("a",), (None, "b c")]:
+            assert tools.deserialize_ostr_tuple(tools.serialize_ostr_tuple(tup)) == tup
+
+
+class TestWellFrame:
+    def test_serialize(self):
+        wf = _wf()
+        df = wf.serialize()
+        for c in ["treatments", "b_ids", "c_ids", "compound_names"]:
+            assert isinstance(df[c].dtype, pd.CategoricalDtype), c
+        assert len(df["treatments"].cat.categories) == 3
+        assert list(df["c_ids"]) == ["", "101", "101", "▯｜101"]
+        # the WellFrame isn't affected
+        assert isinstance(wf["treatments"][0], Treatments)
+
+    def test_round_trip(self):
+        wf = _wf()
+        with TestResources.temp_dir() as path:
+            wf.serialize().to_feather(path / "wf.feather")
+            df = pd.read_feather(path / "wf.feather")
+        assert isinstance(df["treatments"].dtype, pd.CategoricalDtype)
+        self._check(wf, WellFrame.deseralize(df))
+
+    def test_old_format(self):
+        # before dictionary encoding, these were plain str columns
+        wf = _wf()
+        df = wf.serialize()
+        for c in ["treatments", "b_ids", "c_ids", "compound_names"]:
+            df[c] = df[c].astype(str).astype(object)
+        with TestResources.temp_dir() as path:
+            df.to_feather(path / "wf.feather")
+            df = pd.read_feather(path / "wf.feather")
+        assert not isinstance(df["treatments"].dtype, pd.CategoricalDtype)
+        self._check(wf, WellFrame.deseralize(df))
+
+    def _check(self, wf: WellFrame, got: WellFrame) -> None:
+        assert isinstance(got, WellFrame)
+        assert list(got.columns) == [0, 1, 2]
+        np.testing.assert_array_equal(got.values, wf.values)
+        assert list(got["well"]) == [1, 2, 3, 4]
+        assert list(got["treatments"]) == list(wf["treatments"])
+        assert list(got["b_ids"]) == [(), (1,), (1,), (1, 2)]
+        assert list(got["c_ids"]) == [(), (101,), (101,), (None, 101)]
+        assert list(got["compound_names"]) == [(), ("one",), ("one",), (None, "one")]
+
+
+if __name__ == "__main__":
+    pytest.main()